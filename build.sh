@@ -18,6 +18,10 @@ python manage.py collectstatic --noinput
 echo "🗄️ Aplicando migrações do banco de dados..."
 python manage.py migrate --noinput
 
+# Tabela do cache compartilhado entre os workers (DatabaseCache)
+echo "🗃️ Criando tabela de cache..."
+python manage.py createcachetable
+
 # Criar superusuário (apenas se não existir)
 echo "👤 Verificando superusuário..."
 python manage.py shell << EOF
@@ -1,12 +1,16 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from .models import (
     Planta, Comentario, Categoria, UserProfile,
     LikePlanta, FavoritoPlanta, Seguir, Denuncia,
     Badge, UserBadge, Notificacao, Colecao, DiarioPlanta,
     Lembrete, Mensagem, Enquete, OpcaoEnquete, VotoEnquete,
-    Conquista, UsuarioConquista
+    Conquista, UsuarioConquista, PontuacaoJardineiro,
+    PontuacaoSemanal, PontuacaoMensal, Tarefa
 )
+from django.utils import timezone
 from django.utils.html import format_html
+from .notificacoes import marcar_como_lidas
+from .conquistas import compilar_conquistas
 
 admin.site.site_header = "🌿 Pai do Verde - Administração"
 admin.site.site_title = "Pai do Verde Admin"
@@ -97,8 +101,8 @@ class NotificacaoAdmin(admin.ModelAdmin):
     mensagem_resumida.short_description = 'Mensagem'
 
     def marcar_como_lida(self, request, queryset):
-        queryset.update(lida=True)
-        self.message_user(request, f'{queryset.count()} notificações marcadas como lidas.')
+        total = marcar_como_lidas(queryset)
+        self.message_user(request, f'{total} notificações marcadas como lidas.')
     marcar_como_lida.short_description = "✅ Marcar como lida"
 
 @admin.register(Colecao)
@@ -177,8 +181,14 @@ class ConquistaAdmin(admin.ModelAdmin):
     list_filter = ('tipo', 'rara')
     search_fields = ('nome', 'descricao')
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        _, invalidas = compilar_conquistas([obj])
+        if invalidas:
+            self.message_user(request, f'⚠️ Critério ignorado na avaliação: {invalidas[0][1]}', level=messages.WARNING)
+
     def total_desbloqueadas(self, obj):
-        return obj.usuarioconquista_set.count()
+        return obj.total_desbloqueios
     total_desbloqueadas.short_description = '🎯 Desbloques'
 
 @admin.register(UsuarioConquista)
@@ -186,3 +196,30 @@ class UsuarioConquistaAdmin(admin.ModelAdmin):
     list_display = ('usuario', 'conquista', 'desbloqueada_em')
     list_filter = ('conquista__tipo', 'desbloqueada_em')
     search_fields = ('usuario__username', 'conquista__nome')
+
+@admin.register(PontuacaoJardineiro)
+class PontuacaoJardineiroAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'pontos', 'total_plantas', 'total_likes', 'total_seguidores', 'atualizado_em')
+    search_fields = ('usuario__username',)
+    readonly_fields = ('atualizado_em',)
+
+@admin.register(PontuacaoSemanal, PontuacaoMensal)
+class PontuacaoPeriodoAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'inicio', 'pontos', 'total_plantas', 'total_likes', 'total_seguidores')
+    list_filter = ('inicio',)
+    search_fields = ('usuario__username',)
+    readonly_fields = ('atualizado_em',)
+
+@admin.register(Tarefa)
+class TarefaAdmin(admin.ModelAdmin):
+    list_display = ('nome', 'status', 'tentativas', 'max_tentativas', 'executar_em', 'trabalhador', 'criada_em')
+    list_filter = ('status', 'nome')
+    readonly_fields = ('erro', 'trabalhador', 'criada_em', 'iniciada_em', 'concluida_em')
+    actions = ['tentar_novamente']
+
+    def tentar_novamente(self, request, queryset):
+        total = queryset.exclude(status='EXECUTANDO').update(
+            status='PENDENTE', tentativas=0, executar_em=timezone.now(), erro=''
+        )
+        self.message_user(request, f'{total} tarefa(s) de volta na fila.')
+    tentar_novamente.short_description = 'Tentar novamente agora'
@@ -0,0 +1,207 @@
+"""
+Fluxo único de atividades de quem o usuário segue.
+
+Cada fonte (plantas, comentários, likes, seguidores, conquistas) é lida por um
+iterador preguiçoso que percorre o índice ``(ator, -data, -id)`` em blocos;
+``heapq.merge`` intercala as fontes em ordem cronológica decrescente e só
+consome de cada uma o necessário para preencher a página. O cursor guarda
+``(data, índice da fonte, id)`` do último item, que desempata itens com a
+mesma data entre fontes diferentes.
+
+``atividades_desde`` faz o caminho inverso para o polling do feed: só as
+linhas mais novas que o topo que o cliente já tem, uma faixa curta por fonte.
+"""
+import hashlib
+import heapq
+
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
+
+from .models import Planta, Comentario, LikePlanta, Seguir, UserBadge
+from .paginacao import PaginaKeyset, codificar_cursor, decodificar_cursor
+
+TAMANHO_BLOCO = 50
+NOVIDADES_TIMEOUT = 10
+
+# (tipo, modelo, campo do ator, campo de data, select_related)
+FONTES = (
+    ('PLANTA', Planta, 'autor', 'criado_em', ('autor',)),
+    ('COMENTARIO', Comentario, 'autor', 'criado_em', ('autor', 'planta')),
+    ('LIKE', LikePlanta, 'usuario', 'criado_em', ('usuario', 'planta')),
+    ('SEGUIR', Seguir, 'seguidor', 'criado_em', ('seguidor', 'seguindo')),
+    ('BADGE', UserBadge, 'usuario', 'concedida_em', ('usuario', 'badge')),
+)
+
+
+def _filtro_apos(indice, campo_data, cursor):
+    """Linhas da fonte ``indice`` que vêm depois do cursor ``(data, fonte, id)``"""
+    data, indice_cursor, pk = cursor
+    if indice < indice_cursor:
+        return {f'{campo_data}__lte': data}, {}
+    if indice > indice_cursor:
+        return {f'{campo_data}__lt': data}, {}
+    # Mesma fonte: data menor, ou mesma data e id menor
+    return {f'{campo_data}__lte': data}, {campo_data: data, 'pk__gte': pk}
+
+
+def _filtro_antes(indice, campo_data, topo):
+    """Linhas da fonte ``indice`` mais novas que o cursor ``(data, fonte, id)``"""
+    data, indice_topo, pk = topo
+    if indice > indice_topo:
+        return {f'{campo_data}__gte': data}, {}
+    if indice < indice_topo:
+        return {f'{campo_data}__gt': data}, {}
+    return {f'{campo_data}__gte': data}, {campo_data: data, 'pk__lte': pk}
+
+
+def _iterar_fonte(indice, seguidos, cursor=None):
+    """Gera ``(data, indice, pk, objeto)`` da fonte em ordem decrescente, bloco a bloco"""
+    tipo, modelo, campo_ator, campo_data, relacionados = FONTES[indice]
+    consulta = modelo.objects.filter(**{f'{campo_ator}_id__in': seguidos}).select_related(*relacionados)
+    consulta = consulta.order_by(f'-{campo_data}', '-pk')
+
+    if cursor is not None:
+        filtro, exclusao = _filtro_apos(indice, campo_data, cursor)
+        consulta = consulta.filter(**filtro)
+        if exclusao:
+            consulta = consulta.exclude(**exclusao)
+
+    ultimo = None
+    while True:
+        bloco = consulta
+        if ultimo is not None:
+            data, pk = ultimo
+            bloco = bloco.filter(**{f'{campo_data}__lte': data}).exclude(**{campo_data: data, 'pk__gte': pk})
+        bloco = list(bloco[:TAMANHO_BLOCO])
+        for objeto in bloco:
+            yield getattr(objeto, campo_data), indice, objeto.pk, objeto
+        if len(bloco) < TAMANHO_BLOCO:
+            return
+        ultimo = (getattr(bloco[-1], campo_data), bloco[-1].pk)
+
+
+def _decodificar(cursor):
+    valores = decodificar_cursor(cursor) if cursor else None
+    if not valores or len(valores) != 3:
+        return None
+    data = parse_datetime(str(valores[0]))
+    if data is None or not all(isinstance(v, int) for v in valores[1:]):
+        return None
+    return data, valores[1], valores[2]
+
+
+def _atividade(data, indice, pk, objeto):
+    tipo = FONTES[indice][0]
+    if tipo == 'PLANTA':
+        ator, texto, planta = objeto.autor, f'publicou {objeto.nome}', objeto
+    elif tipo == 'COMENTARIO':
+        ator, texto, planta = objeto.autor, f'comentou em {objeto.planta.nome}', objeto.planta
+    elif tipo == 'LIKE':
+        ator, texto, planta = objeto.usuario, f'curtiu {objeto.planta.nome}', objeto.planta
+    elif tipo == 'SEGUIR':
+        ator, texto, planta = objeto.seguidor, f'começou a seguir {objeto.seguindo.username}', None
+    else:
+        ator, texto, planta = objeto.usuario, f'ganhou a conquista {objeto.badge.icone} {objeto.badge.nome}', None
+    return {
+        'tipo': tipo,
+        'chave': (data, indice, pk),
+        'criado_em': data,
+        'ator': ator,
+        'texto': texto,
+        'planta': planta,
+        'objeto': objeto,
+    }
+
+
+def stream_atividades(usuario, cursor=None, por_pagina=20):
+    """Uma página do fluxo de atividades de quem ``usuario`` segue"""
+    seguidos = list(usuario.seguindo.values_list('seguindo_id', flat=True))
+    valores = _decodificar(cursor)
+    if valores is None:
+        cursor = None
+    if not seguidos:
+        return PaginaKeyset([], cursor, valores, None)
+
+    intercalados = heapq.merge(
+        *(_iterar_fonte(indice, seguidos, valores) for indice in range(len(FONTES))),
+        key=lambda linha: linha[:3], reverse=True,
+    )
+
+    itens = []
+    for data, indice, pk, objeto in intercalados:
+        itens.append((data, indice, pk, objeto))
+        if len(itens) > por_pagina:
+            break
+
+    proximo = None
+    if len(itens) > por_pagina:
+        itens = itens[:por_pagina]
+        proximo = codificar_cursor(itens[-1][:3])
+    return PaginaKeyset(
+        [_atividade(*linha) for linha in itens],
+        cursor, valores, proximo,
+    )
+
+
+def topo_do_fluxo(pagina):
+    """Cursor do item mais novo da página (para buscar só o que vier depois)"""
+    return codificar_cursor(pagina[0]['chave']) if pagina else None
+
+
+def atividades_desde(usuario, topo, limite=50):
+    """
+    Atividades mais novas que o cursor ``topo``, da mais nova para a mais antiga.
+    Retorna ``(atividades, novo topo, mais)``; ``mais`` indica que passou de
+    ``limite`` e o cliente deve recarregar a página inteira.
+    """
+    valores = _decodificar(topo)
+    if valores is None:
+        pagina = stream_atividades(usuario, por_pagina=limite)
+        return list(pagina), topo_do_fluxo(pagina), False
+
+    seguidos = list(usuario.seguindo.values_list('seguindo_id', flat=True))
+    if not seguidos:
+        return [], topo, False
+
+    linhas = []
+    for indice, (tipo, modelo, campo_ator, campo_data, relacionados) in enumerate(FONTES):
+        filtro, exclusao = _filtro_antes(indice, campo_data, valores)
+        consulta = modelo.objects.filter(**{f'{campo_ator}_id__in': seguidos}, **filtro)
+        if exclusao:
+            consulta = consulta.exclude(**exclusao)
+        consulta = consulta.select_related(*relacionados).order_by(f'-{campo_data}', '-pk')
+        linhas.append([
+            (getattr(objeto, campo_data), indice, objeto.pk, objeto)
+            for objeto in consulta[:limite + 1]
+        ])
+
+    itens = list(heapq.merge(*linhas, key=lambda linha: linha[:3], reverse=True))
+    mais = len(itens) > limite
+    atividades = [_atividade(*linha) for linha in itens[:limite]]
+    return atividades, topo_do_fluxo(atividades) or topo, mais
+
+
+def atividade_json(atividade):
+    return {
+        'tipo': atividade['tipo'],
+        'criado_em': atividade['criado_em'].isoformat(),
+        'usuario': atividade['ator'].username,
+        'texto': atividade['texto'],
+        'url': reverse('detalhe_planta', args=[atividade['planta'].pk]) if atividade['planta'] else None,
+    }
+
+
+def novidades_json(usuario, desde):
+    """Resposta do polling; várias abas do mesmo usuário no mesmo intervalo reaproveitam o cache"""
+    chave = f'novidades:{usuario.pk}:{hashlib.md5(desde.encode()).hexdigest()}'
+    dados = cache.get(chave)
+    if dados is None:
+        atividades, topo, mais = atividades_desde(usuario, desde)
+        dados = {
+            'atividades': [atividade_json(atividade) for atividade in atividades],
+            'topo': topo,
+            'mais': mais,
+        }
+        cache.set(chave, dados, NOVIDADES_TIMEOUT)
+    return dados
@@ -0,0 +1,223 @@
+"""
+Regras das badges avaliadas em um único despacho por evento.
+
+``Badge.regra`` é ``<limite>_<métrica>`` (``5_postagens``, ``10_likes_recebidos``)
+ou um apelido (``primeira_planta``, ``primeiro_comentario``). Cada métrica aponta
+para um contador do ``UserProfile``, já mantido pelos sinais, então avaliar um
+evento custa uma leitura do perfil em vez de um ``COUNT`` por regra.
+
+O índice ``coluna -> [(limite, badge)]`` fica no cache e é descartado quando uma
+``Badge`` muda. As concessões entram com um ``bulk_create``; como ele não
+dispara ``post_save``, a notificação e os pontos do ranking são aplicados aqui
+(``registrar_concessoes``), só para as linhas que de fato foram inseridas.
+Uma badge concedida com ``save()`` (ex.: pelo admin) chega pelo sinal e passa
+pelo mesmo ``registrar_concessoes``.
+"""
+import re
+from operator import attrgetter
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Badge, Comentario, LikePlanta, Notificacao, Planta, Seguir, UserBadge, UserProfile
+from .contadores import CONTADORES_PERFIL, contagens_reais
+from .notificacoes import ajustar_nao_lidas_em_lote, publicar_nao_lidas
+from .pubsub import publicar_depois_do_commit
+from .ranking import atualizar_pontuacoes_em_lote
+
+CHAVE_INDICE = 'badges:indice'
+INDICE_TIMEOUT = 60 * 60
+TAMANHO_LOTE = 1000
+
+# métrica da regra -> coluna do UserProfile
+METRICAS = {
+    'postagens': 'total_posts',
+    'plantas': 'total_posts',
+    'comentarios': 'total_comentarios',
+    'likes': 'total_likes_recebidos',
+    'likes_recebidos': 'total_likes_recebidos',
+    'likes_dados': 'total_likes_dados',
+    'seguidores': 'total_seguidores',
+    'seguindo': 'total_seguindo',
+}
+
+APELIDOS = {
+    'primeira_planta': '1_postagens',
+    'primeiro_comentario': '1_comentarios',
+    'primeiro_like': '1_likes_dados',
+    'primeiro_seguidor': '1_seguidores',
+}
+
+# modelo criado -> (usuário afetado, coluna do perfil que mudou)
+GATILHOS = {
+    Planta: (('autor_id', 'total_posts'),),
+    Comentario: (('autor_id', 'total_comentarios'),),
+    LikePlanta: (('planta.autor_id', 'total_likes_recebidos'), ('usuario_id', 'total_likes_dados')),
+    Seguir: (('seguindo_id', 'total_seguidores'), ('seguidor_id', 'total_seguindo')),
+}
+
+REGRA = re.compile(r'^(?P<limite>\d+)_(?P<metrica>[a-z_]+)$')
+
+
+def interpretar_regra(regra):
+    """``'5_postagens'`` -> ``('total_posts', 5)``; ``None`` se a regra não for reconhecida"""
+    regra = (regra or '').strip().lower()
+    partes = REGRA.match(APELIDOS.get(regra, regra))
+    if not partes or partes['metrica'] not in METRICAS:
+        return None
+    return METRICAS[partes['metrica']], int(partes['limite'])
+
+
+def indice_regras():
+    """``{coluna: [(limite, badge_id, nome, pontos), ...]}`` de todas as badges com regra válida"""
+    indice = cache.get(CHAVE_INDICE)
+    if indice is None:
+        indice = {}
+        for pk, regra, nome, pontos in Badge.objects.values_list('pk', 'regra', 'nome', 'pontos'):
+            interpretada = interpretar_regra(regra)
+            if interpretada:
+                campo, limite = interpretada
+                indice.setdefault(campo, []).append((limite, pk, nome, pontos))
+        cache.set(CHAVE_INDICE, indice, INDICE_TIMEOUT)
+    return indice
+
+
+def invalidar_indice():
+    cache.delete(CHAVE_INDICE)
+
+
+def registrar_concessoes(concessoes, momento=None):
+    """
+    Efeitos das badges inseridas em massa: notificação, contador de não lidas
+    e pontos do ranking. ``concessoes`` é uma lista de ``(usuario_id, badge_id, nome, pontos)``.
+    Serve tanto para um usuário (sinais) quanto para milhares (``reavaliar_badges``).
+    """
+    if not concessoes:
+        return
+    momento = momento or timezone.now()
+    Notificacao.objects.bulk_create([
+        Notificacao(
+            usuario_id=usuario_id, tipo='BADGE',
+            mensagem=f"Você ganhou a conquista: {nome}!",
+            dados_json={'badge_id': badge_id},
+        )
+        for usuario_id, badge_id, nome, pontos in concessoes
+    ], batch_size=TAMANHO_LOTE)
+
+    quantidades, somas = {}, {}
+    for usuario_id, badge_id, nome, pontos in concessoes:
+        quantidades[usuario_id] = quantidades.get(usuario_id, 0) + 1
+        somas[usuario_id] = somas.get(usuario_id, 0) + pontos
+    ajustar_nao_lidas_em_lote(quantidades)
+    atualizar_pontuacoes_em_lote('pontos_badges', somas, momento)
+    for usuario_id in quantidades:
+        publicar_depois_do_commit(lambda usuario_id=usuario_id: publicar_nao_lidas(usuario_id))
+
+
+def avaliar_usuarios(campos_por_usuario):
+    """
+    Confere as regras de vários usuários de uma vez (``{usuario_id: colunas}``):
+    uma leitura dos perfis, uma das badges que eles já têm e um ``bulk_create``.
+    """
+    indice = indice_regras()
+    campos_por_usuario = {
+        usuario_id: [campo for campo in campos if campo in indice]
+        for usuario_id, campos in campos_por_usuario.items()
+    }
+    campos_por_usuario = {usuario_id: campos for usuario_id, campos in campos_por_usuario.items() if campos}
+    if not campos_por_usuario:
+        return []
+
+    colunas = sorted({campo for campos in campos_por_usuario.values() for campo in campos})
+    perfis = {
+        valores['user_id']: valores
+        for valores in UserProfile.objects.filter(user_id__in=campos_por_usuario).values('user_id', *colunas)
+    }
+    atingidas = [
+        (usuario_id, badge)
+        for usuario_id, campos in campos_por_usuario.items() if usuario_id in perfis
+        for campo in campos
+        for badge in indice[campo]
+        if perfis[usuario_id][campo] >= badge[0]
+    ]
+    if not atingidas:
+        return []
+
+    ja_tem = set(
+        UserBadge.objects.filter(
+            usuario_id__in={usuario_id for usuario_id, _ in atingidas},
+            badge_id__in={badge[1] for _, badge in atingidas},
+        ).values_list('usuario_id', 'badge_id')
+    )
+    novas = [
+        (usuario_id, *badge[1:])
+        for usuario_id, badge in atingidas
+        if (usuario_id, badge[1]) not in ja_tem
+    ]
+    if novas:
+        conceder_em_lote(novas)
+    return novas
+
+
+def campos_do_evento(instancia):
+    """``{usuario_id: [colunas do perfil]}`` afetados pela criação de ``instancia``"""
+    por_usuario = {}
+    for caminho, campo in GATILHOS.get(type(instancia), ()):
+        por_usuario.setdefault(attrgetter(caminho)(instancia), []).append(campo)
+    return por_usuario
+
+
+def reavaliar_faixa(usuario_inicial, usuario_final):
+    """
+    Badges que faltam aos usuários da faixa de ids, recontando as métricas nas
+    tabelas de origem (uma consulta agrupada por métrica usada nas regras).
+    Retorna a lista de concessões ``(usuario_id, badge_id, nome, pontos)``.
+    """
+    indice = indice_regras()
+    if not indice:
+        return []
+    faixa = (usuario_inicial, usuario_final)
+    reais = contagens_reais({campo: CONTADORES_PERFIL[campo] for campo in indice}, faixa)
+    existentes = set(
+        UserBadge.objects.filter(usuario_id__gte=usuario_inicial, usuario_id__lte=usuario_final)
+        .values_list('usuario_id', 'badge_id')
+    )
+    return [
+        (usuario_id, badge_id, nome, pontos)
+        for usuario_id, valores in reais.items()
+        for campo, regras in indice.items()
+        for limite, badge_id, nome, pontos in regras
+        if valores.get(campo, 0) >= limite and (usuario_id, badge_id) not in existentes
+    ]
+
+
+def _inserir(concessoes):
+    with transaction.atomic():  # savepoint: um conflito não derruba a transação de fora
+        UserBadge.objects.bulk_create(
+            [UserBadge(usuario_id=usuario_id, badge_id=badge_id) for usuario_id, badge_id, *_ in concessoes],
+            batch_size=TAMANHO_LOTE,
+        )
+
+
+def conceder_em_lote(concessoes):
+    """
+    Insere as concessões e aplica os efeitos em lote; retorna quantas foram gravadas.
+    Outra avaliação do mesmo usuário (worker, ``reavaliar_badges``) pode ter
+    gravado alguma antes: os efeitos valem só para as linhas que entraram aqui.
+    """
+    concessoes = list({(c[0], c[1]): c for c in concessoes}.values())
+    try:
+        _inserir(concessoes)
+        inseridas = concessoes
+    except IntegrityError:
+        # Caminho raro: repete uma a uma para descobrir quais já existiam
+        inseridas = []
+        for concessao in concessoes:
+            try:
+                _inserir([concessao])
+            except IntegrityError:
+                continue
+            inseridas.append(concessao)
+    registrar_concessoes(inseridas)
+    return len(inseridas)
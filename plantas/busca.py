@@ -0,0 +1,176 @@
+"""
+Busca de plantas em texto completo, com relevância.
+
+O índice fica numa tabela à parte (criada pela migração 0019), mantida pelos
+sinais da ``Planta``:
+
+- SQLite: tabela virtual FTS5 ``plantas_planta_fts`` (tokenizador
+  ``unicode61 remove_diacritics 2``), ordenada por ``bm25``;
+- PostgreSQL: ``plantas_planta_busca`` com um ``tsvector`` (configuração
+  ``portuguese``) e índice GIN, ordenada por ``ts_rank_cd``.
+
+O texto é normalizado aqui antes de ir para o banco (minúsculas, sem acentos),
+então "samambáia" e "Samambaia" são o mesmo termo nos dois bancos. O FTS5 não
+tem radicalizador para português, por isso no SQLite os termos já são gravados
+reduzidos ao radical (``radical``); no PostgreSQL quem reduz é o ``portuguese``.
+Cada termo da consulta casa por prefixo e todos precisam aparecer.
+"""
+import re
+import unicodedata
+
+from django.db import connection
+
+from .models import Planta
+from .paginacao import PaginaKeyset, codificar_cursor, decodificar_cursor
+
+TABELA_FTS = 'plantas_planta_fts'
+TABELA_PG = 'plantas_planta_busca'
+
+# Peso de cada campo na relevância, na ordem (nome, espécie, autor, descrição)
+PESOS_BM25 = (10.0, 5.0, 3.0, 1.0)
+PESOS_PG = ('A', 'B', 'B', 'C')
+
+TAMANHO_MINIMO_RADICAL = 3
+
+# Sufixos (já sem acento) do mais longo ao mais curto; só o primeiro que casar sai
+SUFIXOS = (
+    'amentos', 'imentos', 'amento', 'imento', 'adoras', 'adores', 'amente', 'idades',
+    'acoes', 'icoes', 'mente', 'idade', 'adora', 'ismos', 'istas', 'aveis', 'iveis',
+    'ador', 'acao', 'icao', 'ismo', 'ista', 'avel', 'ivel', 'ezas', 'osos', 'osas',
+    'eza', 'oso', 'osa', 'oes', 'aes', 'ais', 'eis', 'ar', 'er', 'ir',
+    'as', 'os', 'es', 'a', 'o', 'e', 's',
+)
+
+PALAVRA = re.compile(r'\w+')
+
+
+def sem_acentos(texto):
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def termos(texto):
+    """Palavras do texto em minúsculas e sem acentos"""
+    return PALAVRA.findall(sem_acentos(texto))
+
+
+def radical(palavra):
+    """Radicalização leve para português: ``'samambaias'`` -> ``'samambai'``, ``'regar'`` -> ``'reg'``"""
+    for sufixo in SUFIXOS:
+        if palavra.endswith(sufixo) and len(palavra) - len(sufixo) >= TAMANHO_MINIMO_RADICAL:
+            return palavra[:-len(sufixo)]
+    return palavra
+
+
+def indice_disponivel():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+# ===== Manutenção =====
+
+def _documento(campos):
+    if connection.vendor == 'sqlite':
+        return [' '.join(radical(termo) for termo in termos(campo)) for campo in campos]
+    return [' '.join(termos(campo)) for campo in campos]
+
+
+def indexar(linhas):
+    """Grava/atualiza o índice para ``(planta_id, nome, especie, autor, descricao)``; retorna quantas"""
+    linhas = [(pk, *_documento(campos)) for pk, *campos in linhas]
+    if not linhas or not indice_disponivel():
+        return 0
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.executemany(f'DELETE FROM {TABELA_FTS} WHERE rowid = %s', [(linha[0],) for linha in linhas])
+            cursor.executemany(
+                f'INSERT INTO {TABELA_FTS} (rowid, nome, especie, autor, descricao) VALUES (%s, %s, %s, %s, %s)',
+                linhas,
+            )
+        else:
+            documento = ' || '.join(
+                f"setweight(to_tsvector('portuguese', %s), '{peso}')" for peso in PESOS_PG
+            )
+            cursor.executemany(
+                f'INSERT INTO {TABELA_PG} (planta_id, documento) VALUES (%s, {documento}) '
+                f'ON CONFLICT (planta_id) DO UPDATE SET documento = EXCLUDED.documento',
+                linhas,
+            )
+    return len(linhas)
+
+
+def reindexar(planta_ids):
+    """Atualiza o índice de ``planta_ids`` com uma consulta; as que não existem mais saem dele"""
+    if not planta_ids or not indice_disponivel():
+        return 0
+    linhas = list(
+        Planta.objects.filter(pk__in=planta_ids)
+        .values_list('pk', 'nome', 'especie', 'autor__username', 'descricao')
+    )
+    excluidas = [(pk,) for pk in set(planta_ids) - {linha[0] for linha in linhas}]
+    if excluidas:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.executemany(f'DELETE FROM {TABELA_FTS} WHERE rowid = %s', excluidas)
+            else:
+                cursor.executemany(f'DELETE FROM {TABELA_PG} WHERE planta_id = %s', excluidas)
+    return indexar(linhas)
+
+
+def limpar_indice():
+    if not indice_disponivel():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABELA_FTS if connection.vendor == "sqlite" else TABELA_PG}')
+
+
+# ===== Consulta =====
+
+def _consulta(texto):
+    """Termos da busca já no formato do banco (prefixo em cada um); ``None`` se não sobrar nada"""
+    palavras = termos(texto)
+    if not palavras:
+        return None
+    if connection.vendor == 'sqlite':
+        return ' '.join(f'"{radical(palavra)}"*' for palavra in palavras)
+    return ' & '.join(f'{palavra}:*' for palavra in palavras)
+
+
+def buscar_ids(texto, deslocamento=0, limite=20):
+    """Ids das plantas que casam com ``texto``, da mais para a menos relevante"""
+    consulta = _consulta(texto)
+    if consulta is None:
+        return []
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            pesos = ', '.join(str(peso) for peso in PESOS_BM25)
+            cursor.execute(
+                f'SELECT rowid FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s '
+                f'ORDER BY bm25({TABELA_FTS}, {pesos}), rowid DESC LIMIT %s OFFSET %s',
+                [consulta, limite, deslocamento],
+            )
+        else:
+            cursor.execute(
+                f"SELECT planta_id FROM {TABELA_PG}, to_tsquery('portuguese', %s) AS consulta "
+                f'WHERE documento @@ consulta '
+                f'ORDER BY ts_rank_cd(documento, consulta) DESC, planta_id DESC LIMIT %s OFFSET %s',
+                [consulta, limite, deslocamento],
+            )
+        return [pk for pk, in cursor.fetchall()]
+
+
+def paginar_busca(request, queryset, texto, por_pagina=20):
+    """
+    Página de resultados por relevância. O ``?cursor=`` guarda o deslocamento:
+    a ordem vem do ranking, não de uma coluna, então não dá para usar keyset.
+    """
+    cursor = request.GET.get('cursor')
+    valores = decodificar_cursor(cursor) if cursor else None
+    if not (valores and isinstance(valores[0], int) and valores[0] > 0):
+        cursor, valores = None, [0]
+    deslocamento = valores[0]
+
+    ids = buscar_ids(texto, deslocamento, por_pagina + 1)
+    proximo = codificar_cursor([deslocamento + por_pagina]) if len(ids) > por_pagina else None
+    ids = ids[:por_pagina]
+    plantas = queryset.in_bulk(ids)
+    return PaginaKeyset([plantas[pk] for pk in ids if pk in plantas], cursor, valores, proximo)
@@ -0,0 +1,146 @@
+"""
+Cache de fragmentos dos cards de planta e de páginas para visitantes anônimos.
+
+A parte do card que é igual para todo visitante (imagem, textos, contadores)
+fica em cache com ``{% cache %}``, numa chave que inclui a versão da planta.
+A versão mora no próprio cache e é buscada para a página inteira com um único
+``get_many``; os sinais apagam a versão quando a planta muda, e a próxima
+leitura gera uma nova, o que torna órfãos os fragmentos antigos.
+O estado dos botões (curtiu / favoritou) fica fora do fragmento. Os fragmentos
+usam o alias ``cards``, desligado quando o cache é o banco
+(``settings.CACHE_EM_MEMORIA``): aí nem as versões são buscadas.
+
+As páginas públicas (catálogo e detalhe) usam a mesma ideia para visitantes
+sem sessão: a chave inclui a versão do catálogo ou da planta, então qualquer
+alteração invalida a página na hora, sem depender do tempo de expiração. O
+resto da chave vem só dos parâmetros que a view lê; uma URL com qualquer outro
+parâmetro é renderizada sem cache, para que ``?x=1``, ``?x=2``... não encham o
+cache de cópias da mesma página.
+
+Isso exige um cache compartilhado por todos os processos: com ``LocMemCache``
+e vários workers, só o worker que atendeu a escrita veria a versão nova. Por
+isso a produção usa Redis (``CACHE_URL``) ou, sem ele, ``DatabaseCache`` (veja
+``CACHES`` em settings).
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import urlencode
+
+from .paginacao import decodificar_cursor
+
+CARD_TIMEOUT = 60 * 60
+PAGINA_TIMEOUT = 60 * 60
+CHAVE_VERSAO_CATALOGO = 'catalogo:versao'
+
+
+def _chave_versao(planta_pk):
+    return f'planta:{planta_pk}:versao_card'
+
+
+def _versao(chave):
+    """Versão guardada em ``chave``; cria uma nova e única se não existir"""
+    versao = cache.get(chave)
+    if versao is None:
+        versao = time.time_ns()
+        if not cache.add(chave, versao, timeout=None):
+            versao = cache.get(chave, versao)
+    return versao
+
+
+def anotar_versoes_cards(plantas):
+    """Define ``planta.versao_card`` em cada planta e devolve a lista"""
+    plantas = list(plantas)
+    if not settings.CACHE_EM_MEMORIA:
+        for planta in plantas:
+            planta.versao_card = None
+        return plantas
+    chaves = {_chave_versao(planta.pk): planta for planta in plantas}
+    versoes = cache.get_many(chaves)
+
+    novas = {}
+    for chave, planta in chaves.items():
+        if chave not in versoes:
+            # Versão nova e única: nunca reaproveita um fragmento antigo
+            versoes[chave] = novas[chave] = time.time_ns()
+        planta.versao_card = versoes[chave]
+    if novas:
+        cache.set_many(novas, timeout=None)
+    return plantas
+
+
+def invalidar_card(planta_pk):
+    """Descarta a versão do card e do catálogo; os fragmentos antigos expiram sozinhos"""
+    invalidar_cards([planta_pk])
+
+
+def invalidar_cards(planta_pks):
+    cache.delete_many([_chave_versao(pk) for pk in planta_pks] + [CHAVE_VERSAO_CATALOGO])
+
+
+def versao_catalogo(request, **kwargs):
+    return _versao(CHAVE_VERSAO_CATALOGO)
+
+
+def versao_planta(request, pk, **kwargs):
+    return _versao(_chave_versao(pk))
+
+
+def _pode_usar_cache(request):
+    """Só GET/HEAD de quem não tem sessão nem mensagens pendentes"""
+    return (
+        request.method in ('GET', 'HEAD')
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and 'messages' not in request.COOKIES
+    )
+
+
+def _parametros_da_chave(request, parametros):
+    """
+    Parâmetros de ``request.GET`` que a view lê, já normalizados; ``None`` se a
+    URL tiver qualquer outro parâmetro (ou o mesmo repetido). Um ``cursor``
+    que não decodifica mostra a primeira página, então fica fora da chave.
+    """
+    if any(nome not in parametros or len(request.GET.getlist(nome)) > 1 for nome in request.GET):
+        return None
+    valores = {nome: request.GET[nome] for nome in parametros if request.GET.get(nome)}
+    if 'cursor' in valores and decodificar_cursor(valores['cursor']) is None:
+        del valores['cursor']
+    return sorted(valores.items())
+
+
+def cache_pagina_anonima(obter_versao, parametros=()):
+    """
+    Guarda a página inteira para visitantes anônimos. ``obter_versao(request,
+    **kwargs)`` devolve a versão dos dados exibidos; ela entra na chave junto
+    com os ``parametros`` da query string que a view usa (ex.: ``('cursor',)``).
+    """
+    def decorator(view):
+        @wraps(view)
+        def _view(request, *args, **kwargs):
+            consulta = _parametros_da_chave(request, parametros)
+            if consulta is None or not _pode_usar_cache(request):
+                return view(request, *args, **kwargs)
+
+            caminho = hashlib.md5(f'{request.path}?{urlencode(consulta)}'.encode()).hexdigest()
+            chave = f'pagina:{view.__name__}:{obter_versao(request, **kwargs)}:{caminho}'
+            guardada = cache.get(chave)
+            if guardada is not None:
+                conteudo, tipo = guardada
+                response = HttpResponse(conteudo, content_type=tipo)
+            else:
+                response = view(request, *args, **kwargs)
+                # Não guarda páginas que gravaram cookies ou usaram o token CSRF
+                if (response.status_code == 200 and not response.cookies
+                        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+                        and not getattr(response, 'streaming', False)):
+                    cache.set(chave, (response.content, response['Content-Type']), PAGINA_TIMEOUT)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return _view
+    return decorator
@@ -0,0 +1,189 @@
+"""
+Avaliação em lote das conquistas (``Conquista.criterio``).
+
+Cada usuário vira um vetor de métricas (postagens, likes, seguidores, badges,
+atividade...) montado para um lote inteiro com uma consulta aos contadores do
+perfil e uma agrupada nas badges. Cada critério é compilado uma vez em um
+predicado sobre esse vetor, e todos os predicados rodam sobre o lote.
+
+Gramática do critério (sem ``eval``)::
+
+    criterio := grupo ("ou" grupo)*
+    grupo    := termo ("e" termo)*
+    termo    := <N>_<métrica>          (ex.: 10_postagens  ==  postagens >= 10)
+              | <métrica> <op> <N>     (op: >=, >, <=, <, =)
+
+Ex.: ``"10_postagens e 50_likes"``, ``"seguidores >= 100 ou 20_badges"``.
+"""
+import operator
+import re
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+
+from .contadores import ajustar_contadores
+from .models import Conquista, UserBadge, UserProfile, UsuarioConquista
+
+TAMANHO_LOTE = 1000
+
+# Posições do vetor de métricas
+METRICAS = (
+    'postagens',
+    'likes',
+    'likes_dados',
+    'comentarios',
+    'seguidores',
+    'seguindo',
+    'badges',
+    'atividade',  # postagens + comentários + likes dados
+)
+POSICAO = {metrica: indice for indice, metrica in enumerate(METRICAS)}
+SINONIMOS = {
+    'plantas': 'postagens',
+    'posts': 'postagens',
+    'likes_recebidos': 'likes',
+    'conquistas_badges': 'badges',
+}
+
+# coluna do UserProfile para cada métrica que vem direto do perfil
+COLUNAS_PERFIL = (
+    ('postagens', 'total_posts'),
+    ('likes', 'total_likes_recebidos'),
+    ('likes_dados', 'total_likes_dados'),
+    ('comentarios', 'total_comentarios'),
+    ('seguidores', 'total_seguidores'),
+    ('seguindo', 'total_seguindo'),
+)
+
+OPERADORES = {
+    '>=': operator.ge,
+    '>': operator.gt,
+    '<=': operator.le,
+    '<': operator.lt,
+    '=': operator.eq,
+    '==': operator.eq,
+}
+
+LIMIAR = re.compile(r'^(?P<limite>\d+)_(?P<metrica>[a-z_]+)$')
+COMPARACAO = re.compile(r'^(?P<metrica>[a-z_]+)\s*(?P<op>>=|<=|==|=|>|<)\s*(?P<limite>\d+)$')
+
+
+class CriterioInvalido(ValueError):
+    pass
+
+
+def _termo(texto):
+    """``'10_postagens'`` / ``'likes >= 50'`` -> ``(posição, operador, limite)``"""
+    partes = LIMIAR.match(texto) or COMPARACAO.match(texto)
+    if not partes:
+        raise CriterioInvalido(f'Termo não reconhecido: {texto!r}')
+    metrica = SINONIMOS.get(partes['metrica'], partes['metrica'])
+    if metrica not in POSICAO:
+        raise CriterioInvalido(f'Métrica desconhecida: {partes["metrica"]!r}')
+    op = OPERADORES[partes.groupdict().get('op') or '>=']
+    return POSICAO[metrica], op, int(partes['limite'])
+
+
+def compilar_criterio(criterio):
+    """Compila o critério em uma função ``vetor -> bool``; ``CriterioInvalido`` se não fizer sentido"""
+    texto = (criterio or '').strip().lower()
+    if not texto:
+        raise CriterioInvalido('Critério vazio')
+    grupos = [
+        tuple(_termo(termo.strip()) for termo in re.split(r'\s+e\s+', grupo))
+        for grupo in re.split(r'\s+ou\s+', texto)
+    ]
+
+    def predicado(vetor):
+        return any(all(op(vetor[posicao], limite) for posicao, op, limite in grupo) for grupo in grupos)
+    return predicado
+
+
+def compilar_conquistas(conquistas=None):
+    """``([(conquista, predicado)], [(conquista, erro)])`` para as conquistas informadas (ou todas)"""
+    validas, invalidas = [], []
+    for conquista in conquistas if conquistas is not None else Conquista.objects.all():
+        try:
+            validas.append((conquista, compilar_criterio(conquista.criterio)))
+        except CriterioInvalido as erro:
+            invalidas.append((conquista, erro))
+    return validas, invalidas
+
+
+def vetores_de_metricas(usuario_ids):
+    """``{usuario_id: vetor}`` para um lote de usuários (duas consultas)"""
+    vazio = [0] * len(METRICAS)
+    vetores = {usuario_id: list(vazio) for usuario_id in usuario_ids}
+
+    colunas = [coluna for _, coluna in COLUNAS_PERFIL]
+    for usuario_id, *valores in UserProfile.objects.filter(user_id__in=usuario_ids).values_list('user_id', *colunas):
+        vetor = vetores[usuario_id]
+        for (metrica, _), valor in zip(COLUNAS_PERFIL, valores):
+            vetor[POSICAO[metrica]] = valor
+
+    badges = (
+        UserBadge.objects.order_by().filter(usuario_id__in=usuario_ids)
+        .values_list('usuario_id').annotate(total=Count('pk'))
+    )
+    for usuario_id, total in badges:
+        vetores[usuario_id][POSICAO['badges']] = total
+
+    for vetor in vetores.values():
+        vetor[POSICAO['atividade']] = (
+            vetor[POSICAO['postagens']] + vetor[POSICAO['comentarios']] + vetor[POSICAO['likes_dados']]
+        )
+    return {usuario_id: tuple(vetor) for usuario_id, vetor in vetores.items()}
+
+
+def avaliar_lote(usuario_ids, compiladas):
+    """Conquistas ``(usuario_id, conquista)`` que o lote atinge e ainda não tem"""
+    if not compiladas:
+        return []
+    vetores = vetores_de_metricas(usuario_ids)
+    existentes = set(
+        UsuarioConquista.objects.filter(usuario_id__in=usuario_ids)
+        .values_list('usuario_id', 'conquista_id')
+    )
+    return [
+        (usuario_id, conquista)
+        for conquista, predicado in compiladas
+        for usuario_id, vetor in vetores.items()
+        if (usuario_id, conquista.pk) not in existentes and predicado(vetor)
+    ]
+
+
+def _inserir(desbloqueios):
+    with transaction.atomic():  # savepoint: um conflito não derruba a transação de fora
+        UsuarioConquista.objects.bulk_create(
+            [UsuarioConquista(usuario_id=usuario_id, conquista=conquista) for usuario_id, conquista in desbloqueios],
+            batch_size=TAMANHO_LOTE,
+        )
+
+
+def desbloquear_em_lote(desbloqueios):
+    """
+    Grava os desbloqueios e soma no contador de cada conquista; retorna quantos foram gravados.
+    Outra execução sobreposta pode ter gravado algum antes: só as linhas que
+    entraram aqui contam em ``total_desbloqueios``.
+    """
+    desbloqueios = list({(usuario_id, conquista.pk): (usuario_id, conquista)
+                         for usuario_id, conquista in desbloqueios}.values())
+    try:
+        _inserir(desbloqueios)
+        inseridos = desbloqueios
+    except IntegrityError:
+        # Caminho raro: repete um a um para descobrir quais já existiam
+        inseridos = []
+        for desbloqueio in desbloqueios:
+            try:
+                _inserir([desbloqueio])
+            except IntegrityError:
+                continue
+            inseridos.append(desbloqueio)
+
+    por_conquista = {}
+    for _, conquista in inseridos:
+        por_conquista[conquista.pk] = por_conquista.get(conquista.pk, 0) + 1
+    for conquista_id, total in por_conquista.items():
+        ajustar_contadores(Conquista, conquista_id, total_desbloqueios=total)
+    return len(inseridos)
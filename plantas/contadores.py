@@ -0,0 +1,120 @@
+"""
+Contadores desnormalizados.
+
+Os sinais ajustam as colunas de contagem com ``F()`` (uma única instrução
+UPDATE, sem corrida entre requisições). O comando ``reconciliar_contadores``
+corrige eventuais desvios percorrendo as tabelas em faixas de chave primária.
+"""
+from django.db.models import Case, Count, F, IntegerField, Value, When
+
+from .models import Planta, LikePlanta, FavoritoPlanta, Comentario, Seguir, UserProfile, Notificacao
+from .models import UsuarioConquista
+
+# coluna em Planta -> (modelo filho, campo que aponta para a planta)
+CONTADORES_PLANTA = {
+    'total_likes': (LikePlanta, 'planta'),
+    'total_favoritos': (FavoritoPlanta, 'planta'),
+    'total_comentarios': (Comentario, 'planta'),
+}
+
+# coluna em UserProfile -> (modelo de origem, campo que aponta para o usuário[, filtro])
+CONTADORES_PERFIL = {
+    'total_posts': (Planta, 'autor'),
+    'total_seguidores': (Seguir, 'seguindo'),
+    'total_seguindo': (Seguir, 'seguidor'),
+    'total_likes_recebidos': (LikePlanta, 'planta__autor'),
+    'total_likes_dados': (LikePlanta, 'usuario'),
+    'total_comentarios': (Comentario, 'autor'),
+    'notificacoes_nao_lidas': (Notificacao, 'usuario', {'lida': False}),
+}
+
+# coluna em Conquista -> (modelo de origem, campo que aponta para a conquista)
+CONTADORES_CONQUISTA = {
+    'total_desbloqueios': (UsuarioConquista, 'conquista'),
+}
+
+
+def ajustar_contadores(modelo, pk, **deltas):
+    """Soma os deltas (ex.: total_likes=1) nas colunas da linha, atomicamente"""
+    return modelo.objects.filter(pk=pk).update(
+        **{campo: F(campo) + delta for campo, delta in deltas.items()}
+    )
+
+
+def ajustar_contadores_perfil(usuario_id, **deltas):
+    """Soma os deltas nas estatísticas do perfil do usuário"""
+    return UserProfile.objects.filter(user_id=usuario_id).update(
+        **{campo: F(campo) + delta for campo, delta in deltas.items()}
+    )
+
+
+def somar_em_lote(modelo, linhas, chave='pk', tamanho_lote=500):
+    """
+    Aplica ``{valor da chave: {campo: delta}}`` com um UPDATE por lote de linhas
+    (um ``CASE`` por coluna), em vez de um UPDATE por evento.
+    """
+    valores = list(linhas.items())
+    for inicio in range(0, len(valores), tamanho_lote):
+        lote = dict(valores[inicio:inicio + tamanho_lote])
+        campos = {campo for deltas in lote.values() for campo in deltas}
+        modelo.objects.filter(**{f'{chave}__in': lote}).update(**{
+            campo: F(campo) + Case(
+                *(When(**{chave: valor}, then=Value(deltas[campo]))
+                  for valor, deltas in lote.items() if deltas.get(campo)),
+                default=Value(0), output_field=IntegerField(),
+            )
+            for campo in campos
+        })
+
+
+def contagens_reais(contadores, faixa):
+    """
+    Conta os filhos de uma faixa ``(primeira, última)`` de chaves com uma
+    consulta agrupada por contador; devolve ``{chave: {campo: total}}``.
+    ``contadores`` é ``{campo: (modelo filho, campo do pai[, filtro])}``,
+    como ``CONTADORES_PERFIL``.
+    """
+    reais = {}
+    for campo, (modelo, campo_pai, *filtro) in contadores.items():
+        linhas = modelo.objects.order_by().filter(
+            **{f'{campo_pai}__gte': faixa[0], f'{campo_pai}__lte': faixa[1]}, **(filtro[0] if filtro else {})
+        ).values_list(campo_pai).annotate(total=Count('pk'))
+        for pk, total in linhas:
+            reais.setdefault(pk, {})[campo] = total
+    return reais
+
+
+def reconciliar(modelo, contadores, chave='pk', tamanho_lote=1000):
+    """
+    Recalcula os contadores de ``modelo`` em lotes de ``tamanho_lote`` linhas,
+    percorrendo a coluna ``chave`` (a que os filhos referenciam).
+    Retorna ``(linhas verificadas, linhas corrigidas)``.
+    """
+    campos = list(contadores)
+    verificadas = corrigidas = 0
+    ultima_chave = 0
+
+    while True:
+        lote = list(
+            modelo.objects.filter(**{f'{chave}__gt': ultima_chave})
+            .order_by(chave).only('pk', chave, *campos)[:tamanho_lote]
+        )
+        if not lote:
+            break
+        ultima_chave = getattr(lote[-1], chave)
+        reais = contagens_reais(contadores, (getattr(lote[0], chave), ultima_chave))
+
+        divergentes = []
+        for objeto in lote:
+            valores = reais.get(getattr(objeto, chave), {})
+            if any(getattr(objeto, campo) != valores.get(campo, 0) for campo in campos):
+                for campo in campos:
+                    setattr(objeto, campo, valores.get(campo, 0))
+                divergentes.append(objeto)
+
+        if divergentes:
+            modelo.objects.bulk_update(divergentes, campos)
+        verificadas += len(lote)
+        corrigidas += len(divergentes)
+
+    return verificadas, corrigidas
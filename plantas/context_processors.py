@@ -1,4 +1,12 @@
+from django.conf import settings
+
+from .notificacoes import contar_nao_lidas
+
+
 def notificacoes_nao_lidas(request):
+    contexto = {'tempo_real_ativo': settings.TEMPO_REAL_ATIVO}
     if request.user.is_authenticated:
-        return {'notificacoes_nao_lidas': request.user.notificacoes.filter(lida=False).count()}
-    return {'notificacoes_nao_lidas': 0}
\ No newline at end of file
+        contexto['notificacoes_nao_lidas'] = contar_nao_lidas(request.user)
+    else:
+        contexto['notificacoes_nao_lidas'] = 0
+    return contexto
@@ -0,0 +1,225 @@
+"""
+Coletor dos efeitos colaterais dos sinais.
+
+Fora de um coletor, cada efeito roda na hora, dentro do ``post_save`` (como
+sempre foi). Dentro de ``with coletando():`` os sinais só enfileiram:
+
+- deltas de contadores, somados por linha (``Planta``, ``UserProfile``, ``Conquista``);
+- pontos do ranking, somados por usuário e período;
+- plantas novas para o feed e notificações agrupadas;
+- usuários cujas badges precisam ser conferidas e badges concedidas uma a
+  uma (ex.: pelo admin), registradas juntas com ``registrar_concessoes``;
+- plantas a reindexar na busca (uma consulta para todas);
+- cards de planta a invalidar (depois dos contadores, para que ninguém
+  guarde o card novo com os números antigos);
+- eventos de tempo real (SSE do sino, WebSocket das plantas), só com
+  ``settings.TEMPO_REAL_ATIVO`` ligado.
+
+Cada item entra no coletor no commit da transação em que o sinal rodou (um
+rollback descarta o efeito junto com a linha) e, ao sair do bloco, tudo é
+gravado em ``transaction.on_commit`` com um punhado de UPDATEs em lote e
+``bulk_create``. O ``ColetorEfeitosMiddleware`` abre um coletor por requisição;
+importações em massa usam o bloco diretamente::
+
+    with coletando():
+        for linha in planilha:
+            Planta.objects.create(...)
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from .badges import avaliar_usuarios, campos_do_evento, registrar_concessoes
+from .busca import reindexar
+from .caches import invalidar_cards
+from .contadores import ajustar_contadores, ajustar_contadores_perfil, somar_em_lote
+from .feed import distribuir_em_lote
+from .models import UserProfile
+from .notificacoes import notificar_agrupados
+from .pubsub import publicar_depois_do_commit
+from .ranking import PERIODOS, atualizar_pontuacao, atualizar_pontuacoes_em_lote, inicio_periodo
+from .tarefas import enfileirar
+
+_coletor_atual = ContextVar('coletor_de_efeitos', default=None)
+
+
+class Coletor:
+    def __init__(self):
+        self.contadores = {}    # (modelo, coluna da chave) -> {chave: {campo: delta}}
+        self.pontos = {}        # (componente, baldes do período) -> (momento, {usuario_id: delta})
+        self.publicacoes = []   # itens para o fan-out do feed
+        self.notificacoes = []  # eventos para notificar_agrupados
+        self.badges = {}        # usuario_id -> colunas do perfil que mudaram
+        self.concessoes = {}    # baldes do período -> (momento, [(usuario_id, badge_id, nome, pontos)])
+        self.cards = set()      # plantas com card/página em cache desatualizados
+        self.busca = set()      # plantas criadas, editadas ou excluídas (índice da busca)
+        self.tempo_real = []    # publicações do pubsub, na ordem dos sinais
+
+    def somar(self, modelo, valor, deltas, chave='pk'):
+        linhas = self.contadores.setdefault((modelo, chave), {})
+        atuais = linhas.setdefault(valor, {})
+        for campo, delta in deltas.items():
+            atuais[campo] = atuais.get(campo, 0) + delta
+
+    def pontuar(self, usuario_id, momento, deltas):
+        baldes = tuple(inicio_periodo(periodo, momento) for periodo in PERIODOS)
+        for campo, delta in deltas.items():
+            _, por_usuario = self.pontos.setdefault((campo, baldes), (momento, {}))
+            por_usuario[usuario_id] = por_usuario.get(usuario_id, 0) + delta
+
+    def avaliar_badges(self, campos_por_usuario):
+        for usuario_id, campos in campos_por_usuario.items():
+            self.badges.setdefault(usuario_id, set()).update(campos)
+
+    def conceder(self, concessao, momento):
+        baldes = tuple(inicio_periodo(periodo, momento) for periodo in PERIODOS)
+        self.concessoes.setdefault(baldes, (momento, []))[1].append(concessao)
+
+    def gravar(self):
+        """Grava tudo o que foi coletado; os contadores vão antes das badges, que os leem"""
+        for (modelo, chave), linhas in self.contadores.items():
+            somar_em_lote(modelo, linhas, chave=chave)
+        for (campo, _), (momento, por_usuario) in self.pontos.items():
+            atualizar_pontuacoes_em_lote(campo, {u: d for u, d in por_usuario.items() if d}, momento)
+        for momento, concessoes in self.concessoes.values():
+            registrar_concessoes(concessoes, momento)
+        if self.busca:
+            reindexar(self.busca)
+        if self.cards:
+            invalidar_cards(self.cards)
+        for publicacao in self.tempo_real:
+            publicar_depois_do_commit(publicacao)
+        # O resto é o que pesa: com a fila ligada, vai para o worker (plantas.tarefas)
+        if self.publicacoes:
+            enfileirar('feed.distribuir', publicacoes=self.publicacoes)
+        if self.notificacoes:
+            enfileirar('notificacoes.agrupar', eventos=self.notificacoes)
+        if self.badges:
+            enfileirar('badges.avaliar', campos_por_usuario=[
+                (usuario_id, sorted(campos)) for usuario_id, campos in self.badges.items()
+            ])
+
+
+def _abrir():
+    if _coletor_atual.get() is not None:
+        return None, None  # aninhado: o coletor de fora grava
+    coletor = Coletor()
+    return coletor, _coletor_atual.set(coletor)
+
+
+def _fechar(coletor, token):
+    _coletor_atual.reset(token)
+    # Em autocommit roda agora; dentro de um atomic, depois do commit (e nunca após um rollback)
+    transaction.on_commit(coletor.gravar)
+
+
+@contextmanager
+def coletando():
+    """Adia e agrupa os efeitos dos sinais disparados dentro do bloco"""
+    coletor, token = _abrir()
+    try:
+        yield coletor or _coletor_atual.get()
+    finally:
+        if coletor is not None:
+            _fechar(coletor, token)
+
+
+def _enfileirar(adicionar, imediato):
+    coletor = _coletor_atual.get()
+    if coletor is None:
+        imediato()
+    else:
+        transaction.on_commit(lambda: adicionar(coletor))
+
+
+# ===== Efeitos usados pelos sinais =====
+
+def somar(modelo, pk, **deltas):
+    _enfileirar(lambda c: c.somar(modelo, pk, deltas), lambda: ajustar_contadores(modelo, pk, **deltas))
+
+
+def somar_perfil(usuario_id, **deltas):
+    _enfileirar(
+        lambda c: c.somar(UserProfile, usuario_id, deltas, chave='user_id'),
+        lambda: ajustar_contadores_perfil(usuario_id, **deltas),
+    )
+
+
+def pontuar(usuario_id, momento=None, **deltas):
+    _enfileirar(
+        lambda c: c.pontuar(usuario_id, momento, deltas),
+        lambda: atualizar_pontuacao(usuario_id, momento, **deltas),
+    )
+
+
+def distribuir(autor_id, planta_id, criado_em):
+    publicacao = {'autor_id': autor_id, 'planta_id': planta_id, 'criado_em': criado_em}
+    _enfileirar(lambda c: c.publicacoes.append(publicacao), lambda: distribuir_em_lote([publicacao]))
+
+
+def notificar_agrupado(usuario_id, tipo, agrupamento, ator, singular, plural, dados_json=None):
+    evento = (usuario_id, tipo, agrupamento, ator.username, singular, plural, dados_json)
+    _enfileirar(lambda c: c.notificacoes.append(evento), lambda: notificar_agrupados([evento]))
+
+
+def avaliar_badges(instancia):
+    campos = campos_do_evento(instancia)
+    _enfileirar(lambda c: c.avaliar_badges(campos), lambda: avaliar_usuarios(campos))
+
+
+def registrar_badge(user_badge):
+    """Badge concedida com ``save()``: notificação e pontos pelo mesmo caminho das concessões em lote"""
+    badge = user_badge.badge
+    concessao = (user_badge.usuario_id, badge.pk, badge.nome, badge.pontos)
+    momento = user_badge.concedida_em
+    _enfileirar(lambda c: c.conceder(concessao, momento), lambda: registrar_concessoes([concessao], momento))
+
+
+def invalidar_card(planta_pk):
+    # Sem coletor, o contador já foi gravado: basta esperar o commit
+    _enfileirar(
+        lambda c: c.cards.add(planta_pk),
+        lambda: transaction.on_commit(lambda: invalidar_cards([planta_pk])),
+    )
+
+
+def reindexar_busca(planta_pk):
+    _enfileirar(lambda c: c.busca.add(planta_pk), lambda: reindexar([planta_pk]))
+
+
+def publicar_tempo_real(publicacao):
+    """``publicacao()`` manda um evento pelo ``pubsub``; desligado, nem entra no coletor"""
+    if not settings.TEMPO_REAL_ATIVO:
+        return
+    _enfileirar(lambda c: c.tempo_real.append(publicacao), lambda: publicar_depois_do_commit(publicacao))
+
+
+class ColetorEfeitosMiddleware:
+    """Um coletor por requisição: os efeitos dos sinais são gravados juntos no fim"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        with coletando():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        coletor, token = _abrir()
+        try:
+            return await self.get_response(request)
+        finally:
+            if coletor is not None:
+                _coletor_atual.reset(token)
+                await sync_to_async(transaction.on_commit)(coletor.gravar)
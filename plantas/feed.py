@@ -0,0 +1,149 @@
+"""
+Feed híbrido (fan-out na escrita + leitura na consulta).
+
+Cada usuário tem uma caixa de entrada em ``ItemFeed``. Ao publicar uma planta,
+o item é copiado em lote para a caixa de cada seguidor; ao seguir alguém, as
+plantas recentes dessa pessoa são copiadas, e ao deixar de seguir, removidas.
+Comentários não entram na caixa: o painel lateral do feed lê o fluxo de
+atividades (``plantas.atividades``).
+
+Autores populares (``settings.FEED_LIMITE_SEGUIDORES`` seguidores ou mais)
+não são copiados: copiar para dezenas de milhares de caixas a cada
+publicação custa mais do que ler as publicações deles na hora. ``feed_hibrido``
+junta a caixa de entrada com uma faixa do índice ``(autor, -criado_em, -id)``
+de cada autor popular seguido, num merge k-way por ``criado_em``.
+"""
+import heapq
+
+from django.conf import settings
+
+from .models import Planta, Seguir, UserProfile, ItemFeed
+from .paginacao import PaginadorKeyset, PaginaKeyset
+
+TAMANHO_LOTE = 1000
+ITENS_AO_SEGUIR = 50  # plantas recentes copiadas ao seguir alguém
+
+
+def limite_seguidores():
+    return getattr(settings, 'FEED_LIMITE_SEGUIDORES', 1000)
+
+
+def autor_popular(usuario_id):
+    """Autores populares são lidos na consulta em vez de distribuídos"""
+    return UserProfile.objects.filter(
+        user_id=usuario_id, total_seguidores__gte=limite_seguidores()
+    ).exists()
+
+
+def _seguidores(usuario_id):
+    return Seguir.objects.filter(seguindo_id=usuario_id).values_list('seguidor_id', flat=True)
+
+
+def distribuir_em_lote(publicacoes):
+    """
+    Entrega as plantas novas no feed dos seguidores e no do próprio autor:
+    ``publicacoes`` são dicts com ``autor_id``, ``planta_id`` e ``criado_em``.
+    Consulta os seguidores uma vez por autor e grava tudo com ``bulk_create``
+    em lotes.
+    """
+    por_autor = {}
+    for publicacao in publicacoes:
+        por_autor.setdefault(publicacao['autor_id'], []).append(publicacao)
+
+    lote = []
+    for autor_id, itens in por_autor.items():
+        seguidores = [] if autor_popular(autor_id) else list(_seguidores(autor_id))
+        for publicacao in itens:
+            lote.extend(
+                ItemFeed(usuario_id=usuario_id, autor_id=autor_id,
+                         planta_id=publicacao['planta_id'], criado_em=publicacao['criado_em'])
+                for usuario_id in seguidores + [autor_id]
+            )
+            if len(lote) >= TAMANHO_LOTE:
+                ItemFeed.objects.bulk_create(lote, batch_size=TAMANHO_LOTE)
+                lote = []
+    if lote:
+        ItemFeed.objects.bulk_create(lote, batch_size=TAMANHO_LOTE)
+
+
+def preencher_feed(seguidor_id, seguindo_id, limite=ITENS_AO_SEGUIR):
+    """Copia as plantas recentes de ``seguindo`` para o feed de ``seguidor``"""
+    if autor_popular(seguindo_id):
+        return
+    plantas = Planta.objects.filter(autor_id=seguindo_id).order_by('-criado_em', '-id')
+    ItemFeed.objects.bulk_create([
+        ItemFeed(usuario_id=seguidor_id, autor_id=seguindo_id,
+                 planta_id=pk, criado_em=criado_em)
+        for pk, criado_em in plantas.values_list('pk', 'criado_em')[:limite]
+    ], batch_size=TAMANHO_LOTE)
+
+
+def podar_feed(seguidor_id, seguindo_id):
+    """Remove do feed de ``seguidor`` tudo o que veio de ``seguindo``"""
+    return ItemFeed.objects.filter(usuario_id=seguidor_id, autor_id=seguindo_id).delete()
+
+
+def itens_do_feed(usuario):
+    """Itens da caixa de entrada do usuário, na ordem do índice ``(usuario, -criado_em, -planta)``"""
+    return ItemFeed.objects.filter(usuario=usuario).order_by('-criado_em', '-planta_id')
+
+
+def autores_populares_seguidos(usuario):
+    return list(Seguir.objects.filter(
+        seguidor=usuario, seguindo__profile__total_seguidores__gte=limite_seguidores()
+    ).values_list('seguindo_id', flat=True))
+
+
+def _itens_puxados(usuario, autor_id, valores, limite):
+    """Plantas de um autor popular, como ``ItemFeed`` não salvos"""
+    consulta = Planta.objects.filter(autor_id=autor_id).order_by('-criado_em', '-id')
+    if valores is not None:
+        consulta = consulta.filter(PaginadorKeyset(consulta, ordenacao=('-criado_em', '-id')).filtro_apos(valores))
+    consulta = consulta.select_related('autor', 'autor__profile')
+    return [
+        ItemFeed(usuario=usuario, autor_id=autor_id, planta=planta,
+                 criado_em=planta.criado_em)
+        for planta in consulta[:limite]
+    ]
+
+
+def feed_hibrido(usuario, cursor=None, por_pagina=20):
+    """
+    Uma página do feed: caixa de entrada + autores populares seguidos,
+    intercalados por ``(criado_em, id da planta)`` em ordem decrescente.
+    """
+    caixa = itens_do_feed(usuario)
+    paginador = PaginadorKeyset(caixa, ordenacao=('-criado_em', '-planta_id'), por_pagina=por_pagina)
+    valores = paginador.decodificar(cursor) if cursor else None
+    if valores is None:
+        cursor = None
+    else:
+        caixa = caixa.filter(paginador.filtro_apos(valores))
+
+    caixa = caixa.select_related('planta__autor', 'planta__autor__profile')
+
+    # Cada fonte já vem ordenada; cada uma contribui no máximo com uma página
+    fontes = [caixa[:por_pagina + 1].iterator()]
+    fontes.extend(
+        _itens_puxados(usuario, autor_id, valores, por_pagina + 1)
+        for autor_id in autores_populares_seguidos(usuario)
+    )
+    intercalados = heapq.merge(
+        *fontes, key=lambda item: (item.criado_em, item.planta_id), reverse=True
+    )
+
+    # Um autor que virou popular pode ter itens antigos também na caixa
+    itens, vistos = [], set()
+    for item in intercalados:
+        if item.planta_id in vistos:
+            continue
+        vistos.add(item.planta_id)
+        itens.append(item)
+        if len(itens) > por_pagina:
+            break
+
+    proximo = None
+    if len(itens) > por_pagina:
+        itens = itens[:por_pagina]
+        proximo = paginador.codificar(itens[-1])
+    return PaginaKeyset(itens, cursor, valores, proximo)
@@ -0,0 +1,28 @@
+"""
+Estado das interações do usuário logado (curtiu / favoritou) em listas de plantas.
+
+Em vez de ``request.user in planta.likes.all`` (que carrega todos os likes de
+cada planta), busca só os ids das plantas da página que o usuário curtiu ou
+favoritou: uma consulta por tipo, qualquer que seja o tamanho da página.
+"""
+from .models import LikePlanta, FavoritoPlanta
+
+
+def anotar_interacoes(plantas, usuario):
+    """Define ``planta.curtida`` e ``planta.favoritada`` e devolve a lista de plantas"""
+    plantas = list(plantas)
+    ids = [planta.pk for planta in plantas]
+    curtidas = favoritadas = set()
+
+    if usuario.is_authenticated and ids:
+        curtidas = set(LikePlanta.objects.filter(
+            usuario=usuario, planta_id__in=ids
+        ).values_list('planta_id', flat=True))
+        favoritadas = set(FavoritoPlanta.objects.filter(
+            usuario=usuario, planta_id__in=ids
+        ).values_list('planta_id', flat=True))
+
+    for planta in plantas:
+        planta.curtida = planta.pk in curtidas
+        planta.favoritada = planta.pk in favoritadas
+    return plantas
@@ -0,0 +1,54 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from plantas.conquistas import avaliar_lote, compilar_conquistas, desbloquear_em_lote
+
+
+class Command(BaseCommand):
+    help = (
+        'Avalia o critério de todas as conquistas para todos os usuários, em lotes, '
+        'e grava os desbloqueios novos (agendar no cron)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Usuários por lote')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas conta o que seria desbloqueado')
+
+    def handle(self, *args, **options):
+        compiladas, invalidas = compilar_conquistas()
+        for conquista, erro in invalidas:
+            self.stdout.write(self.style.WARNING(f'⚠️ {conquista.nome}: {erro} (ignorada)'))
+        if not compiladas:
+            self.stdout.write(self.style.WARNING('⚠️ Nenhuma conquista com critério válido'))
+            return
+
+        usuarios = desbloqueadas = 0
+        ultimo = 0
+        comeco = time.perf_counter()
+        while True:
+            ids = list(
+                User.objects.filter(pk__gt=ultimo).order_by('pk')
+                .values_list('pk', flat=True)[:options['lote']]
+            )
+            if not ids:
+                break
+            ultimo = ids[-1]
+            usuarios += len(ids)
+
+            desbloqueios = avaliar_lote(ids, compiladas)
+            total = len(desbloqueios)
+            if desbloqueios and not options['dry_run']:
+                with transaction.atomic():
+                    total = desbloquear_em_lote(desbloqueios)  # sem os que outra execução gravou no meio tempo
+            desbloqueadas += total
+
+        duracao = time.perf_counter() - comeco
+        taxa = usuarios / duracao if duracao else 0
+        acao = 'seriam desbloqueadas' if options['dry_run'] else 'desbloqueadas'
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {desbloqueadas} conquistas {acao} para {usuarios} usuários '
+            f'em {duracao:.1f}s — {taxa:.0f} usuários/s'
+        ))
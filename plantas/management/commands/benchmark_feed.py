@@ -0,0 +1,90 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from plantas.feed import _itens_puxados, distribuir_em_lote, itens_do_feed
+from plantas.models import Planta, Seguir
+
+
+def _medir(funcao, repeticoes):
+    """Menor tempo (ms) entre as repetições"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return min(tempos)
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede o custo de distribuir uma publicação (push) e de ler um autor na hora (pull) '
+        'para vários números de seguidores, e sugere FEED_LIMITE_SEGUIDORES. '
+        'Os dados sintéticos são descartados ao final (rollback).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seguidores', type=int, nargs='+', default=[10, 100, 1000, 5000, 20000])
+        parser.add_argument('--repeticoes', type=int, default=3)
+        parser.add_argument(
+            '--orcamento-ms', type=float, default=200,
+            help='Tempo máximo aceitável para distribuir uma publicação ao publicar'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"seguidores":>10} {"push (ms)":>10} {"pull (ms)":>10} {"caixa (ms)":>10}')
+        sugestao = None
+
+        for total in sorted(options['seguidores']):
+            push, pull, caixa = self._medir_cenario(total, options['repeticoes'])
+            self.stdout.write(f'{total:>10} {push:>10.1f} {pull:>10.2f} {caixa:>10.2f}')
+            if sugestao is None and push > options['orcamento_ms']:
+                sugestao = total
+
+        if sugestao is None:
+            self.stdout.write(self.style.SUCCESS(
+                '✅ Push ficou dentro do orçamento em todos os cenários; o limite pode ficar acima do maior testado'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Sugestão: FEED_LIMITE_SEGUIDORES abaixo de {sugestao} '
+                f'(push passou de {options["orcamento_ms"]:.0f} ms). '
+                f'Cada autor popular seguido acrescenta ~pull ms a cada leitura do feed.'
+            ))
+
+    def _medir_cenario(self, total, repeticoes):
+        with transaction.atomic():
+            sufixo = time.time_ns()
+            autor = User.objects.create_user(username=f'bench_autor_{sufixo}')
+            # bulk_create não dispara sinais: monta os seguidores sem efeitos colaterais
+            User.objects.bulk_create(
+                User(username=f'bench_{sufixo}_{i}') for i in range(total)
+            )
+            seguidores = User.objects.filter(username__startswith=f'bench_{sufixo}_')
+            Seguir.objects.bulk_create(
+                Seguir(seguidor_id=pk, seguindo=autor)
+                for pk in seguidores.values_list('pk', flat=True).iterator()
+            )
+            leitor = seguidores.first()
+            agora = timezone.now()
+            plantas = Planta.objects.bulk_create(
+                Planta(nome=f'Bench {i}', especie='-', dificuldade='F', necessidade_agua='-',
+                       necessidade_luz='-', descricao='-', autor=autor,
+                       criado_em=agora - timedelta(minutes=i))
+                for i in range(50)
+            )
+
+            def distribuir():
+                distribuir_em_lote([
+                    {'autor_id': autor.pk, 'planta_id': plantas[0].pk, 'criado_em': plantas[0].criado_em}
+                ])
+
+            push = _medir(distribuir, repeticoes)
+            pull = _medir(lambda: _itens_puxados(leitor, autor.pk, None, 21), repeticoes)
+            caixa = _medir(lambda: list(itens_do_feed(leitor)[:21]), repeticoes)
+            transaction.set_rollback(True)
+        return push, pull, caixa
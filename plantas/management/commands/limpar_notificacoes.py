@@ -0,0 +1,57 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from plantas.models import Notificacao
+
+
+class Command(BaseCommand):
+    help = (
+        'Remove notificações lidas mais antigas que NOTIFICATION_RETENTION_DAYS, '
+        'em faixas de chave primária (transações curtas; seguro para o cron)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=settings.NOTIFICATION_RETENTION_DAYS,
+                            help='Idade mínima (em dias) das notificações removidas')
+        parser.add_argument('--lote', type=int, default=5000, help='Tamanho da faixa de ids por lote')
+        parser.add_argument('--pausa', type=float, default=0, help='Segundos de espera entre os lotes')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas conta o que seria removido')
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - timedelta(days=options['dias'])
+        faixa = Notificacao.objects.aggregate(inicio=Min('pk'), fim=Max('pk'))
+        if faixa['inicio'] is None:
+            self.stdout.write(self.style.SUCCESS('✅ Nenhuma notificação para verificar'))
+            return
+
+        total = 0
+        comeco = time.perf_counter()
+        for inicio in range(faixa['inicio'], faixa['fim'] + 1, options['lote']):
+            antigas = Notificacao.objects.filter(
+                pk__gte=inicio, pk__lt=inicio + options['lote'],
+                lida=True, criada_em__lt=limite,
+            )
+            if options['dry_run']:
+                removidas = antigas.count()
+            else:
+                # Um DELETE só, sem carregar as linhas: o único post_delete da Notificacao
+                # (contador de não lidas) não faz nada para as lidas e nada aponta para ela
+                removidas = antigas._raw_delete(antigas.db)
+            total += removidas
+            if removidas and options['verbosity'] > 1:
+                self.stdout.write(f'  ids {inicio}–{inicio + options["lote"] - 1}: {removidas}')
+            if options['pausa']:
+                time.sleep(options['pausa'])
+
+        duracao = time.perf_counter() - comeco
+        taxa = total / duracao if duracao else 0
+        acao = 'seriam removidas' if options['dry_run'] else 'removidas'
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {total} notificações {acao} (mais de {options["dias"]} dias) '
+            f'em {duracao:.1f}s — {taxa:.0f} linhas/s'
+        ))
@@ -0,0 +1,81 @@
+import os
+import signal
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from plantas.tarefas import executar, limpar_concluidas, recuperar_abandonadas, reservar
+
+
+def _executar_na_thread(tarefa):
+    # Cada thread abre a própria conexão; fecha ao terminar para não vazar conexões
+    try:
+        return executar(tarefa)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Worker da fila de tarefas (plantas.Tarefa): reserva as tarefas vencidas e as executa '
+        'em um pool de threads, com novas tentativas e espera exponencial'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Tarefas executadas em paralelo')
+        parser.add_argument('--lote', type=int, default=20, help='Tarefas reservadas por vez')
+        parser.add_argument('--intervalo', type=float, default=1.0, help='Espera (s) quando a fila está vazia')
+        parser.add_argument(
+            '--manter-concluidas', type=int, default=24, help='Horas que as tarefas concluídas ficam na tabela'
+        )
+        parser.add_argument('--uma-vez', action='store_true', help='Esvazia a fila e sai (cron, testes)')
+
+    def handle(self, *args, **options):
+        trabalhador = f'{socket.gethostname()}:{os.getpid()}'
+        self.parar = False
+        signal.signal(signal.SIGTERM, self._pedir_parada)  # deploy do Render: termina o lote atual e sai
+
+        ok = falhas = 0
+        ultima_limpeza = 0
+        pool = ThreadPoolExecutor(max_workers=options['threads']) if options['threads'] > 1 else None
+        self.stdout.write(f'🧵 Worker {trabalhador} com {options["threads"]} thread(s)')
+        try:
+            while not self.parar:
+                close_old_connections()
+                if time.monotonic() - ultima_limpeza > 60 * 60:
+                    recuperadas = recuperar_abandonadas()
+                    apagadas = limpar_concluidas(options['manter_concluidas'])
+                    if recuperadas or apagadas:
+                        self.stdout.write(f'🧹 {recuperadas} tarefas recuperadas, {apagadas} concluídas apagadas')
+                    ultima_limpeza = time.monotonic()
+
+                tarefas = reservar(trabalhador, options['lote'])
+                if not tarefas:
+                    if options['uma_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+
+                # Com 1 thread roda no próprio processo (e na conexão dele)
+                resultados = pool.map(_executar_na_thread, tarefas) if pool else map(executar, tarefas)
+                for tarefa, resultado in zip(tarefas, resultados):
+                    if resultado:
+                        ok += 1
+                    else:
+                        falhas += 1
+                        self.stdout.write(self.style.WARNING(
+                            f'⚠️ {tarefa.nome} #{tarefa.pk} falhou (tentativa {tarefa.tentativas}/{tarefa.max_tentativas})'
+                        ))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if pool:
+                pool.shutdown(wait=True)
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {ok} tarefas concluídas, {falhas} falhas'))
+
+    def _pedir_parada(self, *args):
+        self.parar = True
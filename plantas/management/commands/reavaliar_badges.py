@@ -0,0 +1,53 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from plantas.badges import conceder_em_lote, indice_regras, reavaliar_faixa
+
+
+class Command(BaseCommand):
+    help = (
+        'Concede as badges que faltam (importações, exclusões e badges criadas depois) '
+        'recontando as métricas de todos os usuários com consultas agrupadas, em lotes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Usuários por lote')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas conta o que seria concedido')
+
+    def handle(self, *args, **options):
+        if not indice_regras():
+            self.stdout.write(self.style.WARNING('⚠️ Nenhuma badge com regra reconhecida'))
+            return
+
+        usuarios = concedidas = 0
+        ultimo = 0
+        comeco = time.perf_counter()
+        while True:
+            ids = list(
+                User.objects.filter(pk__gt=ultimo).order_by('pk')
+                .values_list('pk', flat=True)[:options['lote']]
+            )
+            if not ids:
+                break
+            ultimo = ids[-1]
+            usuarios += len(ids)
+
+            concessoes = reavaliar_faixa(ids[0], ids[-1])
+            total = len(concessoes)
+            if concessoes and not options['dry_run']:
+                with transaction.atomic():
+                    total = conceder_em_lote(concessoes)  # sem as que o tráfego concedeu no meio tempo
+            concedidas += total
+            if total and options['verbosity'] > 1:
+                self.stdout.write(f'  usuários {ids[0]}–{ids[-1]}: {total} badges')
+
+        duracao = time.perf_counter() - comeco
+        taxa = usuarios / duracao if duracao else 0
+        acao = 'seriam concedidas' if options['dry_run'] else 'concedidas'
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {concedidas} badges {acao} para {usuarios} usuários '
+            f'em {duracao:.1f}s — {taxa:.0f} usuários/s'
+        ))
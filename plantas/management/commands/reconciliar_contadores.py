@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from plantas.contadores import CONTADORES_CONQUISTA, CONTADORES_PERFIL, CONTADORES_PLANTA, reconciliar
+from plantas.models import Conquista, Planta, UserProfile
+from plantas.tarefas import enfileirar
+
+
+class Command(BaseCommand):
+    help = 'Corrige desvios dos contadores desnormalizados, percorrendo as tabelas em lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Quantidade de linhas por lote')
+        parser.add_argument(
+            '--enfileirar', action='store_true', help='Só agenda a reconciliação para o worker (processar_tarefas)'
+        )
+
+    def handle(self, *args, **options):
+        if options['enfileirar']:
+            enfileirar('contadores.reconciliar', tamanho_lote=options['lote'])
+            self.stdout.write(self.style.SUCCESS('✅ Reconciliação enviada para a fila'))
+            return
+
+        verificadas, corrigidas = reconciliar(Planta, CONTADORES_PLANTA, tamanho_lote=options['lote'])
+        self.stdout.write(f'🌱 Plantas: {verificadas} verificadas, {corrigidas} corrigidas')
+
+        verificadas, corrigidas = reconciliar(
+            UserProfile, CONTADORES_PERFIL, chave='user_id', tamanho_lote=options['lote']
+        )
+        self.stdout.write(f'👤 Perfis: {verificadas} verificados, {corrigidas} corrigidos')
+
+        verificadas, corrigidas = reconciliar(Conquista, CONTADORES_CONQUISTA, tamanho_lote=options['lote'])
+        self.stdout.write(f'🏅 Conquistas: {verificadas} verificadas, {corrigidas} corrigidas')
+        self.stdout.write(self.style.SUCCESS('✅ Contadores reconciliados'))
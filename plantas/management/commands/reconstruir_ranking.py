@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from plantas.ranking import reconstruir_ranking
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói do zero a tabela materializada do ranking de jardineiros'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Tamanho do lote de inserção')
+
+    def handle(self, *args, **options):
+        total = reconstruir_ranking(tamanho_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Ranking reconstruído: {total} jardineiros'))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from plantas.busca import indexar, indice_disponivel, limpar_indice
+from plantas.models import Planta
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o índice de texto completo da busca de plantas, em lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Plantas por lote')
+
+    def handle(self, *args, **options):
+        if not indice_disponivel():
+            self.stdout.write(self.style.WARNING('⚠️ Banco sem índice de texto completo; a busca usa LIKE'))
+            return
+
+        comeco = time.perf_counter()
+        total = 0
+        ultimo = 0
+        with transaction.atomic():
+            limpar_indice()
+            while True:
+                lote = list(
+                    Planta.objects.filter(pk__gt=ultimo).order_by('pk')
+                    .values_list('pk', 'nome', 'especie', 'autor__username', 'descricao')[:options['lote']]
+                )
+                if not lote:
+                    break
+                ultimo = lote[-1][0]
+                total += indexar(lote)
+
+        duracao = time.perf_counter() - comeco
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} plantas indexadas em {duracao:.1f}s'))
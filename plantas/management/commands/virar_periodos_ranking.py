@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from plantas.ranking import PERIODOS, descartar_periodos_vencidos, reconstruir_periodo
+
+
+class Command(BaseCommand):
+    help = 'Vira os rankings semanal/mensal: descarta baldes vencidos e, opcionalmente, reconstrói os atuais'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--manter', type=int, default=1,
+                            help='Quantos períodos anteriores ao atual manter (padrão: 1)')
+        parser.add_argument('--reconstruir', action='store_true',
+                            help='Recalcula os baldes do período atual a partir das tabelas de origem')
+
+    def handle(self, *args, **options):
+        if options['reconstruir']:
+            for periodo in PERIODOS:
+                total = reconstruir_periodo(periodo)
+                self.stdout.write(f'🔄 Balde atual de "{periodo}" reconstruído: {total} jardineiros')
+
+        removidos = descartar_periodos_vencidos(manter=options['manter'])
+        for periodo, total in removidos.items():
+            self.stdout.write(f'🗑️ {total} pontuações vencidas removidas de "{periodo}"')
+
+        self.stdout.write(self.style.SUCCESS('✅ Rankings por período atualizados'))
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+# Cópia dos pesos de plantas.ranking na data desta migração
+PESOS = {
+    'total_plantas': 10,
+    'total_likes': 5,
+    'total_comentarios': 3,
+    'total_seguidores': 15,
+    'pontos_badges': 1,
+}
+FONTES = (
+    ('total_plantas', 'Planta', 'autor', Count('id')),
+    ('total_likes', 'LikePlanta', 'planta__autor', Count('id')),
+    ('total_comentarios', 'Comentario', 'autor', Count('id')),
+    ('total_seguidores', 'Seguir', 'seguindo', Count('id')),
+    ('pontos_badges', 'UserBadge', 'usuario', Sum('badge__pontos')),
+)
+TAMANHO_LOTE = 1000
+
+
+def preencher_pontuacoes(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    PontuacaoJardineiro = apps.get_model('plantas', 'PontuacaoJardineiro')
+
+    componentes = {}
+    for campo, nome_modelo, campo_usuario, agregacao in FONTES:
+        linhas = apps.get_model('plantas', nome_modelo).objects.order_by().values_list(
+            campo_usuario
+        ).annotate(total=agregacao)
+        for usuario_id, total in linhas:
+            componentes.setdefault(usuario_id, {})[campo] = total or 0
+
+    lote = []
+    for usuario_id in User.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=TAMANHO_LOTE):
+        valores = {campo: componentes.get(usuario_id, {}).get(campo, 0) for campo in PESOS}
+        pontos = sum(peso * valores[campo] for campo, peso in PESOS.items())
+        lote.append(PontuacaoJardineiro(usuario_id=usuario_id, pontos=pontos, **valores))
+        if len(lote) >= TAMANHO_LOTE:
+            PontuacaoJardineiro.objects.bulk_create(lote)
+            lote = []
+    PontuacaoJardineiro.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plantas', '0006_conquista_enquete_lembrete_mensagem_opcaoenquete_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PontuacaoJardineiro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pontos', models.IntegerField(default=0)),
+                ('total_plantas', models.IntegerField(default=0)),
+                ('total_likes', models.IntegerField(default=0)),
+                ('total_comentarios', models.IntegerField(default=0)),
+                ('total_seguidores', models.IntegerField(default=0)),
+                ('pontos_badges', models.IntegerField(default=0)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pontuacao', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Pontuação do Jardineiro',
+                'verbose_name_plural': 'Pontuações dos Jardineiros',
+                'ordering': ['-pontos', 'usuario_id'],
+                'indexes': [models.Index(fields=['-pontos', 'usuario'], name='ranking_pontos_idx')],
+            },
+        ),
+        migrations.RunPython(preencher_pontuacoes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:24
+
+from datetime import datetime, time, timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+# Cópia dos pesos e das fontes de plantas.ranking na data desta migração
+PESOS = {
+    'total_plantas': 10,
+    'total_likes': 5,
+    'total_comentarios': 3,
+    'total_seguidores': 15,
+    'pontos_badges': 1,
+}
+FONTES = (
+    ('total_plantas', 'Planta', 'autor', 'criado_em', Count('id')),
+    ('total_likes', 'LikePlanta', 'planta__autor', 'criado_em', Count('id')),
+    ('total_comentarios', 'Comentario', 'autor', 'criado_em', Count('id')),
+    ('total_seguidores', 'Seguir', 'seguindo', 'criado_em', Count('id')),
+    ('pontos_badges', 'UserBadge', 'usuario', 'concedida_em', Sum('badge__pontos')),
+)
+
+
+def _inicio_do_dia(data):
+    return timezone.make_aware(datetime.combine(data, time.min))
+
+
+def preencher_periodos_atuais(apps, schema_editor):
+    """Baldes da semana e do mês atuais, para os rankings não começarem vazios"""
+    hoje = timezone.localdate()
+    semana = hoje - timedelta(days=hoje.weekday())
+    mes = hoje.replace(day=1)
+    baldes = (
+        ('PontuacaoSemanal', semana, semana + timedelta(days=7)),
+        ('PontuacaoMensal', mes, (mes + timedelta(days=32)).replace(day=1)),
+    )
+    for nome_modelo, inicio, fim in baldes:
+        modelo = apps.get_model('plantas', nome_modelo)
+        componentes = {}
+        for campo, nome_origem, campo_usuario, campo_data, agregacao in FONTES:
+            linhas = apps.get_model('plantas', nome_origem).objects.order_by().filter(**{
+                f'{campo_data}__gte': _inicio_do_dia(inicio),
+                f'{campo_data}__lt': _inicio_do_dia(fim),
+            }).values_list(campo_usuario).annotate(total=agregacao)
+            for usuario_id, total in linhas:
+                componentes.setdefault(usuario_id, {})[campo] = total or 0
+
+        pontuacoes = []
+        for usuario_id, encontrados in sorted(componentes.items()):
+            valores = {campo: encontrados.get(campo, 0) for campo in PESOS}
+            pontos = sum(peso * valores[campo] for campo, peso in PESOS.items())
+            pontuacoes.append(modelo(usuario_id=usuario_id, inicio=inicio, pontos=pontos, **valores))
+        modelo.objects.bulk_create(pontuacoes, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plantas', '0007_pontuacaojardineiro'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PontuacaoMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pontos', models.IntegerField(default=0)),
+                ('total_plantas', models.IntegerField(default=0)),
+                ('total_likes', models.IntegerField(default=0)),
+                ('total_comentarios', models.IntegerField(default=0)),
+                ('total_seguidores', models.IntegerField(default=0)),
+                ('pontos_badges', models.IntegerField(default=0)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('inicio', models.DateField(help_text='Primeiro dia do mês')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pontuacoes_mensais', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Pontuação Mensal',
+                'verbose_name_plural': 'Pontuações Mensais',
+                'indexes': [models.Index(fields=['inicio', '-pontos', 'usuario'], name='ranking_mensal_idx')],
+                'unique_together': {('usuario', 'inicio')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PontuacaoSemanal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pontos', models.IntegerField(default=0)),
+                ('total_plantas', models.IntegerField(default=0)),
+                ('total_likes', models.IntegerField(default=0)),
+                ('total_comentarios', models.IntegerField(default=0)),
+                ('total_seguidores', models.IntegerField(default=0)),
+                ('pontos_badges', models.IntegerField(default=0)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('inicio', models.DateField(help_text='Segunda-feira da semana')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pontuacoes_semanais', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Pontuação Semanal',
+                'verbose_name_plural': 'Pontuações Semanais',
+                'indexes': [models.Index(fields=['inicio', '-pontos', 'usuario'], name='ranking_semanal_idx')],
+                'unique_together': {('usuario', 'inicio')},
+            },
+        ),
+        migrations.RunPython(preencher_periodos_atuais, migrations.RunPython.noop),
+    ]
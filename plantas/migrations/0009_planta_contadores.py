@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:25
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def preencher_contadores(apps, schema_editor):
+    Planta = apps.get_model('plantas', 'Planta')
+
+    def contagem(nome_modelo):
+        filhos = apps.get_model('plantas', nome_modelo).objects.filter(planta=OuterRef('pk'))
+        return Coalesce(Subquery(
+            filhos.order_by().values('planta').annotate(total=Count('pk')).values('total')
+        ), 0)
+
+    Planta.objects.update(
+        total_likes=contagem('LikePlanta'),
+        total_favoritos=contagem('FavoritoPlanta'),
+        total_comentarios=contagem('Comentario'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plantas', '0008_pontuacaomensal_pontuacaosemanal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planta',
+            name='total_comentarios',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='planta',
+            name='total_favoritos',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='planta',
+            name='total_likes',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(preencher_contadores, migrations.RunPython.noop),
+    ]
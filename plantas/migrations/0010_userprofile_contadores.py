@@ -0,0 +1,65 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:27
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def preencher_contadores(apps, schema_editor):
+    UserProfile = apps.get_model('plantas', 'UserProfile')
+
+    def contagem(nome_modelo, campo_usuario):
+        origem = apps.get_model('plantas', nome_modelo).objects.filter(**{campo_usuario: OuterRef('user')})
+        return Coalesce(Subquery(
+            origem.order_by().values(campo_usuario).annotate(total=Count('pk')).values('total')
+        ), 0)
+
+    UserProfile.objects.update(
+        total_posts=contagem('Planta', 'autor'),
+        total_seguidores=contagem('Seguir', 'seguindo'),
+        total_seguindo=contagem('Seguir', 'seguidor'),
+        total_likes_recebidos=contagem('LikePlanta', 'planta__autor'),
+        total_likes_dados=contagem('LikePlanta', 'usuario'),
+        total_comentarios=contagem('Comentario', 'autor'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plantas', '0009_planta_contadores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='total_comentarios',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='total_likes_dados',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='total_likes_recebidos',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='total_posts',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='total_seguidores',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='total_seguindo',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(preencher_contadores, migrations.RunPython.noop),
+    ]
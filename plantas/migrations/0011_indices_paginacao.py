@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plantas', '0010_userprofile_contadores'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='diarioplanta',
+            index=models.Index(fields=['planta', '-data', '-id'], name='diario_recentes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enquete',
+            index=models.Index(fields=['ativa', '-criada_em', '-id'], name='enquete_recentes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lembrete',
+            index=models.Index(fields=['usuario', 'ativo', 'proxima_data', 'id'], name='lembrete_proximos_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensagem',
+            index=models.Index(fields=['destinatario', '-criada_em', '-id'], name='mensagem_recebidas_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacao',
+            index=models.Index(fields=['usuario', '-criada_em', '-id'], name='notificacao_recentes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='planta',
+            index=models.Index(fields=['-criado_em', '-id'], name='planta_recentes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='planta',
+            index=models.Index(fields=['autor', '-criado_em', '-id'], name='planta_autor_recentes_idx'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+ITENS_POR_AUTOR = 50
+
+
+def preencher_feeds(apps, schema_editor):
+    Planta = apps.get_model('plantas', 'Planta')
+    Seguir = apps.get_model('plantas', 'Seguir')
+    ItemFeed = apps.get_model('plantas', 'ItemFeed')
+
+    def recentes(autor_id):
+        plantas = Planta.objects.filter(autor_id=autor_id).order_by('-criado_em', '-id')
+        return list(plantas.values_list('pk', 'criado_em')[:ITENS_POR_AUTOR])
+
+    cache = {}
+    itens = []
+    # Plantas próprias
+    for autor_id in Planta.objects.order_by().values_list('autor_id', flat=True).distinct():
+        cache[autor_id] = recentes(autor_id)
+        itens.extend(
+            ItemFeed(usuario_id=autor_id, autor_id=autor_id, planta_id=pk, criado_em=criado_em)
+            for pk, criado_em in cache[autor_id]
+        )
+    # Publicações de quem cada usuário segue
+    for seguidor_id, seguindo_id in Seguir.objects.values_list('seguidor_id', 'seguindo_id').iterator():
+        if seguindo_id not in cache:
+            cache[seguindo_id] = recentes(seguindo_id)
+        itens.extend(
+            ItemFeed(usuario_id=seguidor_id, autor_id=seguindo_id, planta_id=pk, criado_em=criado_em)
+            for pk, criado_em in cache[seguindo_id]
+        )
+        if len(itens) >= 1000:
+            ItemFeed.objects.bulk_create(itens)
+            itens = []
+    ItemFeed.objects.bulk_create(itens, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plantas', '0011_indices_paginacao'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemFeed',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('criado_em', models.DateTimeField()),
+                ('autor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('planta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='plantas.planta')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='itens_feed', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Item do Feed',
+                'verbose_name_plural': 'Itens do Feed',
+                'indexes': [models.Index(fields=['usuario', '-criado_em', '-planta'], name='feed_usuario_idx'), models.Index(fields=['usuario', 'autor'], name='feed_usuario_autor_idx')],
+            },
+        ),
+        migrations.RunPython(preencher_feeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plantas', '0012_itemfeed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comentario',
+            index=models.Index(fields=['autor', '-criado_em', '-id'], name='comentario_autor_recentes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='likeplanta',
+            index=models.Index(fields=['usuario', '-criado_em', '-id'], name='like_usuario_recentes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='seguir',
+            index=models.Index(fields=['seguidor', '-criado_em', '-id'], name='seguir_recentes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userbadge',
+            index=models.Index(fields=['usuario', '-concedida_em', '-id'], name='badge_usuario_recentes_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plantas', '0013_indices_atividades'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificacao',
+            name='agrupamento',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='notificacao',
+            name='total_atores',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notificacao',
+            name='ultimos_atores',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddIndex(
+            model_name='notificacao',
+            index=models.Index(fields=['usuario', 'agrupamento', '-criada_em'], name='notificacao_agrupamento_idx'),
+        ),
+    ]
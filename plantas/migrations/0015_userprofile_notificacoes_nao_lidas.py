@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:47
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def preencher_nao_lidas(apps, schema_editor):
+    UserProfile = apps.get_model('plantas', 'UserProfile')
+    Notificacao = apps.get_model('plantas', 'Notificacao')
+    nao_lidas = Notificacao.objects.filter(usuario=OuterRef('user'), lida=False)
+    UserProfile.objects.update(notificacoes_nao_lidas=Coalesce(Subquery(
+        nao_lidas.order_by().values('usuario').annotate(total=Count('pk')).values('total')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plantas', '0014_notificacao_agrupamento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='notificacoes_nao_lidas',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(preencher_nao_lidas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plantas', '0015_userprofile_notificacoes_nao_lidas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notificacao',
+            index=models.Index(fields=['usuario', 'lida', '-criada_em', '-id'], name='notificacao_caixa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacao',
+            index=models.Index(fields=['usuario', 'tipo', '-criada_em', '-id'], name='notificacao_tipo_idx'),
+        ),
+    ]
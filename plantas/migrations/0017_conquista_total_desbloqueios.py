@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:03
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def preencher_desbloqueios(apps, schema_editor):
+    Conquista = apps.get_model('plantas', 'Conquista')
+    UsuarioConquista = apps.get_model('plantas', 'UsuarioConquista')
+    desbloqueios = UsuarioConquista.objects.filter(conquista=OuterRef('pk'))
+    Conquista.objects.update(total_desbloqueios=Coalesce(Subquery(
+        desbloqueios.order_by().values('conquista').annotate(total=Count('pk')).values('total')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plantas', '0016_notificacao_caixa_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conquista',
+            name='total_desbloqueios',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='conquista',
+            name='criterio',
+            field=models.CharField(help_text="Ex: '5_postagens', '10_postagens e 50_likes', 'seguidores >= 100 ou 20_badges'", max_length=100),
+        ),
+        migrations.RunPython(preencher_desbloqueios, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,94 @@
+import re
+import unicodedata
+
+from django.db import migrations
+
+TABELA_FTS = 'plantas_planta_fts'
+TABELA_PG = 'plantas_planta_busca'
+PESOS_PG = ('A', 'B', 'B', 'C')
+
+# Cópia da normalização de plantas/busca.py na data desta migração: o índice
+# criado aqui não muda se o módulo mudar depois (``reindexar_busca`` refaz)
+TAMANHO_MINIMO_RADICAL = 3
+SUFIXOS = (
+    'amentos', 'imentos', 'amento', 'imento', 'adoras', 'adores', 'amente', 'idades',
+    'acoes', 'icoes', 'mente', 'idade', 'adora', 'ismos', 'istas', 'aveis', 'iveis',
+    'ador', 'acao', 'icao', 'ismo', 'ista', 'avel', 'ivel', 'ezas', 'osos', 'osas',
+    'eza', 'oso', 'osa', 'oes', 'aes', 'ais', 'eis', 'ar', 'er', 'ir',
+    'as', 'os', 'es', 'a', 'o', 'e', 's',
+)
+PALAVRA = re.compile(r'\w+')
+
+
+def termos(texto):
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    return PALAVRA.findall(''.join(c for c in decomposto if not unicodedata.combining(c)).lower())
+
+
+def radical(palavra):
+    for sufixo in SUFIXOS:
+        if palavra.endswith(sufixo) and len(palavra) - len(sufixo) >= TAMANHO_MINIMO_RADICAL:
+            return palavra[:-len(sufixo)]
+    return palavra
+
+
+def criar_e_preencher(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_FTS} USING fts5('
+            f'nome, especie, autor, descricao, tokenize="unicode61 remove_diacritics 2")'
+        )
+        inserir = f'INSERT INTO {TABELA_FTS} (rowid, nome, especie, autor, descricao) VALUES (%s, %s, %s, %s, %s)'
+
+        def documento(campo):
+            return ' '.join(radical(termo) for termo in termos(campo))
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE TABLE IF NOT EXISTS {TABELA_PG} ('
+            f'planta_id bigint PRIMARY KEY REFERENCES plantas_planta (id) ON DELETE CASCADE, '
+            f'documento tsvector NOT NULL)'
+        )
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {TABELA_PG}_gin ON {TABELA_PG} USING GIN (documento)'
+        )
+        pesos = ' || '.join(f"setweight(to_tsvector('portuguese', %s), '{peso}')" for peso in PESOS_PG)
+        inserir = f'INSERT INTO {TABELA_PG} (planta_id, documento) VALUES (%s, {pesos}) ON CONFLICT (planta_id) DO NOTHING'
+
+        def documento(campo):
+            return ' '.join(termos(campo))
+    else:
+        return
+
+    Planta = apps.get_model('plantas', 'Planta')
+    plantas = Planta.objects.using(schema_editor.connection.alias).order_by('pk').values_list(
+        'pk', 'nome', 'especie', 'autor__username', 'descricao'
+    )
+    with schema_editor.connection.cursor() as cursor:
+        lote = []
+        for pk, *campos in plantas.iterator(chunk_size=1000):
+            lote.append((pk, *(documento(campo) for campo in campos)))
+            if len(lote) == 1000:
+                cursor.executemany(inserir, lote)
+                lote = []
+        if lote:
+            cursor.executemany(inserir, lote)
+
+
+def desfazer(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABELA_FTS}')
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABELA_PG}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plantas', '0018_tarefa'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_e_preencher, desfazer),
+    ]
@@ -1,8 +1,23 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
+class ContadoresMixin:
+    """Protege colunas de contagem mantidas com F() de serem sobrescritas por save()"""
+    CAMPOS_CONTADORES = ()
+
+    def save(self, *args, **kwargs):
+        # Ao editar, não sobrescreve os contadores com valores carregados antes do F()
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name not in self.CAMPOS_CONTADORES
+            ]
+        super().save(*args, **kwargs)
+
 class Categoria(models.Model):
     nome = models.CharField(max_length=50)
     descricao = models.TextField()
@@ -10,7 +25,7 @@ class Categoria(models.Model):
     def __str__(self):
         return self.nome
 
-class Planta(models.Model):
+class Planta(ContadoresMixin, models.Model):
     DIFICULDADE_CHOICES = [
         ('F', 'Fácil'), ('M', 'Média'), ('D', 'Difícil'),
     ]
@@ -26,6 +41,20 @@ class Planta(models.Model):
     atualizado_em = models.DateTimeField(auto_now=True)
     autor = models.ForeignKey(User, on_delete=models.CASCADE)
 
+    # Contadores desnormalizados (mantidos com F() pelos sinais)
+    total_likes = models.IntegerField(default=0, editable=False)
+    total_favoritos = models.IntegerField(default=0, editable=False)
+    total_comentarios = models.IntegerField(default=0, editable=False)
+
+    CAMPOS_CONTADORES = ('total_likes', 'total_favoritos', 'total_comentarios')
+
+    class Meta:
+        indexes = [
+            # Paginação por cursor do catálogo, da busca e do perfil
+            models.Index(fields=['-criado_em', '-id'], name='planta_recentes_idx'),
+            models.Index(fields=['autor', '-criado_em', '-id'], name='planta_autor_recentes_idx'),
+        ]
+
     def __str__(self):
         return f"{self.nome} ({self.especie})"
 
@@ -37,6 +66,9 @@ class Comentario(models.Model):
 
     class Meta:
         ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['autor', '-criado_em', '-id'], name='comentario_autor_recentes_idx'),
+        ]
         verbose_name = 'Comentário'
         verbose_name_plural = 'Comentários'
 
@@ -44,7 +76,7 @@ class Comentario(models.Model):
         return f"Comentário de {self.autor.username} em {self.planta.nome}"
 
 # PERFIL DO USUÁRIO
-class UserProfile(models.Model):
+class UserProfile(ContadoresMixin, models.Model):
     EXPERIENCIA_CHOICES = [
         ('INICIANTE', '🌱 Iniciante'),
         ('INTERMEDIARIO', '🌿 Intermediário'),
@@ -57,15 +89,30 @@ class UserProfile(models.Model):
     localizacao = models.CharField(max_length=100, blank=True, verbose_name='Cidade/Estado')
     nivel_experiencia = models.CharField(max_length=15, choices=EXPERIENCIA_CHOICES, default='INICIANTE')
     criado_em = models.DateTimeField(auto_now_add=True)
+
+    # Estatísticas desnormalizadas (mantidas com F() por plantas/signals.py)
+    total_posts = models.IntegerField(default=0, editable=False)
+    total_seguidores = models.IntegerField(default=0, editable=False)
+    total_seguindo = models.IntegerField(default=0, editable=False)
+    total_likes_recebidos = models.IntegerField(default=0, editable=False)
+    total_likes_dados = models.IntegerField(default=0, editable=False)
+    total_comentarios = models.IntegerField(default=0, editable=False)
+    notificacoes_nao_lidas = models.IntegerField(default=0, editable=False)
+
+    CAMPOS_CONTADORES = (
+        'total_posts', 'total_seguidores', 'total_seguindo',
+        'total_likes_recebidos', 'total_likes_dados', 'total_comentarios',
+        'notificacoes_nao_lidas',
+    )
     
     def __str__(self):
         return f'Perfil de {self.user.username}'
     
     def get_total_posts(self):
-        return self.user.planta_set.count()
+        return self.total_posts
     
     def get_total_likes_recebidos(self):
-        return LikePlanta.objects.filter(planta__autor=self.user).count()
+        return self.total_likes_recebidos
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -86,6 +133,9 @@ class LikePlanta(models.Model):
         unique_together = ('planta', 'usuario')
         verbose_name = 'Like'
         verbose_name_plural = 'Likes'
+        indexes = [
+            models.Index(fields=['usuario', '-criado_em', '-id'], name='like_usuario_recentes_idx'),
+        ]
     
     def __str__(self):
         return f'{self.usuario.username} curtiu {self.planta.nome}'
@@ -114,6 +164,9 @@ class Seguir(models.Model):
         unique_together = ('seguidor', 'seguindo')
         verbose_name = 'Seguir'
         verbose_name_plural = 'Seguidores'
+        indexes = [
+            models.Index(fields=['seguidor', '-criado_em', '-id'], name='seguir_recentes_idx'),
+        ]
     
     def __str__(self):
         return f'{self.seguidor.username} segue {self.seguindo.username}'
@@ -169,6 +222,9 @@ class UserBadge(models.Model):
     
     class Meta:
         unique_together = ('usuario', 'badge')
+        indexes = [
+            models.Index(fields=['usuario', '-concedida_em', '-id'], name='badge_usuario_recentes_idx'),
+        ]
     
     def __str__(self):
         return f'{self.usuario.username} - {self.badge.nome}'
@@ -188,10 +244,22 @@ class Notificacao(models.Model):
     lida = models.BooleanField(default=False)
     criada_em = models.DateTimeField(auto_now_add=True)
 
+    # Agrupamento: eventos repetidos no mesmo alvo atualizam a mesma notificação
+    agrupamento = models.CharField(max_length=100, blank=True, default='')  # Ex: "LIKE:planta:12"
+    total_atores = models.PositiveIntegerField(default=1)
+    ultimos_atores = models.JSONField(default=list, blank=True)  # usernames, do mais recente ao mais antigo
+
     class Meta:
         ordering = ['-lida', '-criada_em']
         verbose_name = 'Notificação'
         verbose_name_plural = 'Notificações'
+        indexes = [
+            models.Index(fields=['usuario', '-criada_em', '-id'], name='notificacao_recentes_idx'),
+            models.Index(fields=['usuario', 'agrupamento', '-criada_em'], name='notificacao_agrupamento_idx'),
+            # Caixa de entrada: só não lidas / por tipo
+            models.Index(fields=['usuario', 'lida', '-criada_em', '-id'], name='notificacao_caixa_idx'),
+            models.Index(fields=['usuario', 'tipo', '-criada_em', '-id'], name='notificacao_tipo_idx'),
+        ]
 
     def __str__(self):
         return f"{self.tipo} para {self.usuario.username}"
@@ -235,6 +303,9 @@ class DiarioPlanta(models.Model):
         verbose_name_plural = 'Diários de Plantas'
         ordering = ['-data']
         unique_together = ('planta', 'usuario', 'data')
+        indexes = [
+            models.Index(fields=['planta', '-data', '-id'], name='diario_recentes_idx'),
+        ]
 
     def __str__(self):
         return f'{self.planta.nome} - {self.data}'
@@ -275,6 +346,9 @@ class Lembrete(models.Model):
         verbose_name = 'Lembrete'
         verbose_name_plural = 'Lembretes'
         ordering = ['proxima_data']
+        indexes = [
+            models.Index(fields=['usuario', 'ativo', 'proxima_data', 'id'], name='lembrete_proximos_idx'),
+        ]
 
     def __str__(self):
         return f'{self.tipo} - {self.planta.nome}'
@@ -295,6 +369,9 @@ class Mensagem(models.Model):
         verbose_name = 'Mensagem'
         verbose_name_plural = 'Mensagens'
         ordering = ['-criada_em']
+        indexes = [
+            models.Index(fields=['destinatario', '-criada_em', '-id'], name='mensagem_recebidas_idx'),
+        ]
 
     def __str__(self):
         return f'De {self.remetente.username} para {self.destinatario.username}'
@@ -316,6 +393,9 @@ class Enquete(models.Model):
         verbose_name = 'Enquete'
         verbose_name_plural = 'Enquetes'
         ordering = ['-criada_em']
+        indexes = [
+            models.Index(fields=['ativa', '-criada_em', '-id'], name='enquete_recentes_idx'),
+        ]
 
     def __str__(self):
         return self.pergunta
@@ -355,7 +435,7 @@ class VotoEnquete(models.Model):
 # CONQUISTAS
 # ============================================
 
-class Conquista(models.Model):
+class Conquista(ContadoresMixin, models.Model):
     TIPO_CHOICES = [
         ('POSTAGENS', 'Postagens'),
         ('LIKES', 'Likes'),
@@ -378,9 +458,17 @@ class Conquista(models.Model):
     tipo = models.CharField(max_length=15, choices=TIPO_CHOICES)
     pontos = models.IntegerField(default=10)
     rara = models.CharField(max_length=10, choices=RARA_CHOICES, default='COMUM')
-    criterio = models.CharField(max_length=100, help_text="Ex: '5_postagens', '10_likes'")
+    criterio = models.CharField(
+        max_length=100,
+        help_text="Ex: '5_postagens', '10_postagens e 50_likes', 'seguidores >= 100 ou 20_badges'"
+    )
     criada_em = models.DateTimeField(auto_now_add=True)
 
+    # Contador desnormalizado (ajustado pelos sinais e pelo comando avaliar_conquistas)
+    total_desbloqueios = models.IntegerField(default=0, editable=False)
+
+    CAMPOS_CONTADORES = ('total_desbloqueios',)
+
     class Meta:
         verbose_name = 'Conquista'
         verbose_name_plural = 'Conquistas'
@@ -390,7 +478,7 @@ class Conquista(models.Model):
         return f'{self.icone} {self.nome}'
 
     def total_desbloqueadas(self):
-        return self.usuarioconquista_set.count()
+        return self.total_desbloqueios
 
 class UsuarioConquista(models.Model):
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conquistas')
@@ -406,3 +494,114 @@ class UsuarioConquista(models.Model):
         return f'{self.usuario.username} - {self.conquista.nome}'
 
 
+
+# ============================================
+# RANKING DE JARDINEIROS
+# ============================================
+
+class PontuacaoBase(models.Model):
+    pontos = models.IntegerField(default=0)
+    total_plantas = models.IntegerField(default=0)
+    total_likes = models.IntegerField(default=0)
+    total_comentarios = models.IntegerField(default=0)
+    total_seguidores = models.IntegerField(default=0)
+    pontos_badges = models.IntegerField(default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f'{self.usuario.username} - {self.pontos} pontos'
+
+class PontuacaoJardineiro(PontuacaoBase):
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, related_name='pontuacao')
+
+    class Meta:
+        verbose_name = 'Pontuação do Jardineiro'
+        verbose_name_plural = 'Pontuações dos Jardineiros'
+        ordering = ['-pontos', 'usuario_id']
+        indexes = [
+            models.Index(fields=['-pontos', 'usuario'], name='ranking_pontos_idx'),
+        ]
+
+class PontuacaoSemanal(PontuacaoBase):
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pontuacoes_semanais')
+    inicio = models.DateField(help_text='Segunda-feira da semana')
+
+    class Meta:
+        verbose_name = 'Pontuação Semanal'
+        verbose_name_plural = 'Pontuações Semanais'
+        unique_together = ('usuario', 'inicio')
+        indexes = [
+            models.Index(fields=['inicio', '-pontos', 'usuario'], name='ranking_semanal_idx'),
+        ]
+
+class PontuacaoMensal(PontuacaoBase):
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pontuacoes_mensais')
+    inicio = models.DateField(help_text='Primeiro dia do mês')
+
+    class Meta:
+        verbose_name = 'Pontuação Mensal'
+        verbose_name_plural = 'Pontuações Mensais'
+        unique_together = ('usuario', 'inicio')
+        indexes = [
+            models.Index(fields=['inicio', '-pontos', 'usuario'], name='ranking_mensal_idx'),
+        ]
+
+# ============================================
+# FEED (caixa de entrada materializada)
+# ============================================
+
+class ItemFeed(models.Model):
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='itens_feed')  # dono do feed
+    autor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    planta = models.ForeignKey(Planta, on_delete=models.CASCADE, related_name='+')
+    criado_em = models.DateTimeField()  # copiado da planta
+
+    class Meta:
+        verbose_name = 'Item do Feed'
+        verbose_name_plural = 'Itens do Feed'
+        indexes = [
+            models.Index(fields=['usuario', '-criado_em', '-planta'], name='feed_usuario_idx'),
+            models.Index(fields=['usuario', 'autor'], name='feed_usuario_autor_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.planta.nome} no feed de {self.usuario.username}'
+
+# ============================================
+# TAREFAS EM SEGUNDO PLANO (fila no banco)
+# ============================================
+
+class Tarefa(models.Model):
+    STATUS_CHOICES = [
+        ('PENDENTE', 'Pendente'),
+        ('EXECUTANDO', 'Executando'),
+        ('CONCLUIDA', 'Concluída'),
+        ('FALHOU', 'Falhou'),
+    ]
+
+    nome = models.CharField(max_length=100)  # registrada com @tarefa, ex.: "feed.distribuir"
+    argumentos = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDENTE')
+    tentativas = models.PositiveIntegerField(default=0)
+    max_tentativas = models.PositiveIntegerField(default=5)
+    executar_em = models.DateTimeField(default=timezone.now)  # adiada pelo backoff a cada falha
+    erro = models.TextField(blank=True)
+    trabalhador = models.CharField(max_length=100, blank=True)  # worker que pegou a tarefa
+    criada_em = models.DateTimeField(auto_now_add=True)
+    iniciada_em = models.DateTimeField(null=True, blank=True)
+    concluida_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['executar_em', 'id']
+        verbose_name = 'Tarefa'
+        verbose_name_plural = 'Tarefas'
+        indexes = [
+            # o worker só procura pendentes vencidas, na ordem
+            models.Index(fields=['status', 'executar_em', 'id'], name='tarefa_fila_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.nome} ({self.get_status_display()})'
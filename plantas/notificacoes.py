@@ -0,0 +1,196 @@
+"""
+Notificações: agrupamento de eventos repetidos e contagem de não lidas.
+
+Likes, comentários e novos seguidores no mesmo alvo, dentro da janela
+``settings.NOTIFICACOES_JANELA_AGRUPAMENTO``, atualizam uma única notificação
+não lida ("Ana e mais 12 pessoas curtiram...") em vez de inserir uma linha
+por evento. A notificação atualizada volta ao topo da lista.
+
+O contador do sino aparece em todas as páginas: ele é mantido na coluna
+``UserProfile.notificacoes_nao_lidas`` (ajustada com ``F()`` ao criar, excluir
+ou marcar como lidas) e espelhado no cache, então o caso comum não consulta
+o banco. O cache expira sozinho para limitar a divergência entre processos.
+Quando o cache é o próprio banco (``settings.CACHE_EM_MEMORIA`` falso), o
+total é lido direto do perfil: uma consulta em vez de uma ou três.
+
+Com o tempo real ligado, cada notificação nova (ou agrupada) e cada mudança do
+total é publicada depois do commit no canal do usuário (``pubsub``) para o
+stream SSE do sino.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .contadores import ajustar_contadores_perfil
+from .models import Notificacao, UserProfile
+from .pubsub import canal_usuario, publicar, publicar_depois_do_commit
+
+NAO_LIDAS_TIMEOUT = 5 * 60
+MAX_ATORES = 3  # nomes guardados em ``ultimos_atores``
+
+
+def _chave_nao_lidas(usuario_id):
+    return f'notificacoes:{usuario_id}:nao_lidas'
+
+
+def contar_nao_lidas(usuario):
+    """Total de notificações não lidas do usuário (sem consulta quando está no cache)"""
+    return _nao_lidas(usuario.pk)
+
+
+def _nao_lidas_do_perfil(usuario_id):
+    return UserProfile.objects.filter(user_id=usuario_id).values_list(
+        'notificacoes_nao_lidas', flat=True
+    ).first() or 0
+
+
+def _nao_lidas(usuario_id):
+    if not settings.CACHE_EM_MEMORIA:
+        return max(_nao_lidas_do_perfil(usuario_id), 0)
+    chave = _chave_nao_lidas(usuario_id)
+    total = cache.get(chave)
+    if total is None:
+        total = _nao_lidas_do_perfil(usuario_id)
+        cache.set(chave, total, NAO_LIDAS_TIMEOUT)
+    return max(total, 0)
+
+
+def invalidar_nao_lidas(usuario_id):
+    cache.delete(_chave_nao_lidas(usuario_id))
+
+
+def ajustar_nao_lidas(usuario_id, delta):
+    """Soma ``delta`` no contador do perfil e descarta o valor em cache"""
+    ajustar_contadores_perfil(usuario_id, notificacoes_nao_lidas=delta)
+    invalidar_nao_lidas(usuario_id)
+
+
+def ajustar_nao_lidas_em_lote(deltas):
+    """Soma ``{usuario_id: delta}`` nos contadores dos perfis com um único UPDATE"""
+    if not deltas:
+        return
+    UserProfile.objects.filter(user_id__in=deltas).update(notificacoes_nao_lidas=F('notificacoes_nao_lidas') + Case(
+        *(When(user_id=usuario_id, then=Value(delta)) for usuario_id, delta in deltas.items()),
+        default=Value(0), output_field=IntegerField(),
+    ))
+    cache.delete_many([_chave_nao_lidas(usuario_id) for usuario_id in deltas])
+
+
+def marcar_como_lidas(notificacoes):
+    """Marca como lidas as notificações do queryset e desconta dos contadores; retorna o total"""
+    with transaction.atomic():
+        # Trava as linhas antes de contar: num clique duplo, a segunda requisição
+        # espera a primeira e já não as encontra como não lidas
+        linhas = list(notificacoes.filter(lida=False).select_for_update().values_list('pk', 'usuario_id'))
+        por_usuario = {}
+        for _, usuario_id in linhas:
+            por_usuario[usuario_id] = por_usuario.get(usuario_id, 0) + 1
+        total = Notificacao.objects.filter(pk__in=[pk for pk, _ in linhas]).update(lida=True)
+        ajustar_nao_lidas_em_lote({usuario_id: -quantidade for usuario_id, quantidade in por_usuario.items()})
+    for usuario_id in por_usuario:
+        publicar_depois_do_commit(lambda usuario_id=usuario_id: publicar_nao_lidas(usuario_id))
+    return total
+
+
+def publicar_nao_lidas(usuario_id):
+    publicar(canal_usuario(usuario_id), {'evento': 'nao_lidas', 'nao_lidas': _nao_lidas(usuario_id)})
+
+
+def publicar_notificacao(notificacao):
+    """Envia a notificação e o total atualizado para as conexões do usuário"""
+    publicar(canal_usuario(notificacao.usuario_id), {
+        'evento': 'notificacao',
+        'id': notificacao.pk,
+        'tipo': notificacao.tipo,
+        'mensagem': notificacao.mensagem,
+        'total_atores': notificacao.total_atores,
+        'criada_em': notificacao.criada_em.isoformat(),
+        'nao_lidas': _nao_lidas(notificacao.usuario_id),
+    })
+
+
+def montar_mensagem(atores, total, singular, plural):
+    """Ex.: "Ana curtiu", "Ana e Bia curtiram", "Ana e mais 12 pessoas curtiram" """
+    if total <= 1:
+        return f'{atores[0]} {singular}'
+    if total == 2 and len(atores) == 2:
+        return f'{atores[0]} e {atores[1]} {plural}'
+    outros = total - 1
+    return f'{atores[0]} e mais {outros} {"pessoa" if outros == 1 else "pessoas"} {plural}'
+
+
+def notificar_agrupado(usuario_id, tipo, agrupamento, ator, singular, plural, dados_json=None):
+    """
+    Cria ou atualiza a notificação de ``agrupamento`` (ex.: ``LIKE:planta:12``).
+    ``singular``/``plural`` completam a frase depois dos nomes dos atores.
+    """
+    evento = (usuario_id, tipo, agrupamento, ator.username, singular, plural, dados_json)
+    return notificar_agrupados([evento])[0]
+
+
+def notificar_agrupados(eventos):
+    """
+    Versão em lote de ``notificar_agrupado`` (usada pelo coletor de efeitos):
+    ``eventos`` são tuplas ``(usuario_id, tipo, agrupamento, nome do ator,
+    singular, plural, dados_json)`` na ordem em que aconteceram. Uma consulta
+    às notificações abertas, um ``bulk_create`` e um ``bulk_update``.
+    """
+    if not eventos:
+        return []
+    janela = timedelta(minutes=getattr(settings, 'NOTIFICACOES_JANELA_AGRUPAMENTO', 60))
+    agora = timezone.now()
+
+    with transaction.atomic():
+        abertas = {}
+        for notificacao in Notificacao.objects.select_for_update().filter(
+            usuario_id__in={evento[0] for evento in eventos},
+            agrupamento__in={evento[2] for evento in eventos},
+            lida=False, criada_em__gte=agora - janela,
+        ).order_by('criada_em'):
+            abertas[notificacao.usuario_id, notificacao.agrupamento] = notificacao  # fica a mais recente
+
+        novas, alteradas = {}, {}
+        for usuario_id, tipo, agrupamento, ator, singular, plural, dados_json in eventos:
+            chave = (usuario_id, agrupamento)
+            notificacao = abertas.get(chave)
+            if notificacao is None:
+                abertas[chave] = novas[chave] = Notificacao(
+                    usuario_id=usuario_id, tipo=tipo, agrupamento=agrupamento,
+                    mensagem=montar_mensagem([ator], 1, singular, plural),
+                    ultimos_atores=[ator], dados_json=dados_json or {},
+                )
+                continue
+
+            # Só os últimos nomes, sem o conjunto completo: o custo de cada evento não
+            # cresce com o grupo. Curtidas e seguidores já são únicos por usuário;
+            # quem desfaz e refaz fora dos últimos nomes conta de novo.
+            if ator not in notificacao.ultimos_atores:
+                notificacao.total_atores += 1
+            notificacao.ultimos_atores = (
+                [ator] + [nome for nome in notificacao.ultimos_atores if nome != ator]
+            )[:MAX_ATORES]
+            notificacao.mensagem = montar_mensagem(
+                notificacao.ultimos_atores, notificacao.total_atores, singular, plural
+            )
+            notificacao.dados_json = dados_json or {}
+            notificacao.criada_em = agora
+            if chave not in novas:
+                alteradas[chave] = notificacao
+
+        # bulk_create/bulk_update não disparam sinais: contador e tempo real vão aqui
+        Notificacao.objects.bulk_create(novas.values())
+        Notificacao.objects.bulk_update(
+            alteradas.values(), ['total_atores', 'ultimos_atores', 'mensagem', 'dados_json', 'criada_em']
+        )
+        por_usuario = {}
+        for usuario_id, _ in novas:
+            por_usuario[usuario_id] = por_usuario.get(usuario_id, 0) + 1
+        ajustar_nao_lidas_em_lote(por_usuario)
+
+    for notificacao in [*novas.values(), *alteradas.values()]:
+        publicar_depois_do_commit(lambda notificacao=notificacao: publicar_notificacao(notificacao))
+    return [abertas[evento[0], evento[2]] for evento in eventos]
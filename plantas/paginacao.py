@@ -0,0 +1,117 @@
+"""
+Paginação por cursor (keyset).
+
+Em vez de ``OFFSET``, cada página filtra a partir dos valores de ordenação do
+último item da página anterior, ex.: ``(criado_em, id) < (cursor)``. Com um
+índice composto na mesma ordem, a página N custa o mesmo que a página 1.
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def codificar_cursor(valores):
+    """Lista de valores -> token opaco para a URL"""
+    valores = [valor.isoformat() if hasattr(valor, 'isoformat') else valor for valor in valores]
+    bruto = json.dumps(valores, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Token -> lista de valores (ainda como texto); ``None`` se inválido"""
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    return valores if isinstance(valores, list) else None
+
+
+class PaginaKeyset:
+    """Uma página de resultados; iterável como uma lista"""
+
+    def __init__(self, itens, cursor, valores_cursor, proximo_cursor):
+        self.itens = itens
+        self.cursor = cursor
+        self.valores_cursor = valores_cursor
+        self.proximo_cursor = proximo_cursor
+
+    @property
+    def tem_proxima(self):
+        return self.proximo_cursor is not None
+
+    @property
+    def primeira(self):
+        return self.cursor is None
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+    def __getitem__(self, indice):
+        return self.itens[indice]
+
+    def __bool__(self):
+        return bool(self.itens)
+
+
+class PaginadorKeyset:
+    """
+    Pagina ``queryset`` pela ``ordenacao`` informada (ex.: ``('-criado_em', '-id')``).
+    O último campo deve ser único (normalmente o id) para desempatar.
+    """
+
+    def __init__(self, queryset, ordenacao=('-criado_em', '-id'), por_pagina=20):
+        self.queryset = queryset
+        self.ordenacao = ordenacao
+        self.por_pagina = por_pagina
+        opts = queryset.model._meta
+        self.campos = [opts.get_field(nome.lstrip('-')) for nome in ordenacao]
+        self.descendente = [nome.startswith('-') for nome in ordenacao]
+
+    def codificar(self, item):
+        return codificar_cursor([getattr(item, campo.attname) for campo in self.campos])
+
+    def decodificar(self, cursor):
+        valores = decodificar_cursor(cursor)
+        if valores is None or len(valores) != len(self.campos):
+            return None
+        try:
+            return [campo.to_python(valor) for campo, valor in zip(self.campos, valores)]
+        except (ValueError, TypeError, ValidationError):
+            return None
+
+    def filtro_apos(self, valores):
+        """Linhas que vêm depois de ``valores`` na ordenação (comparação lexicográfica)"""
+        filtro = Q()
+        for i, (campo, descendente, valor) in enumerate(zip(self.campos, self.descendente, valores)):
+            condicao = Q(**{f'{campo.attname}__{"lt" if descendente else "gt"}': valor})
+            for campo_anterior, valor_anterior in zip(self.campos[:i], valores[:i]):
+                condicao &= Q(**{campo_anterior.attname: valor_anterior})
+            filtro |= condicao
+        return filtro
+
+    def pagina(self, cursor=None):
+        consulta = self.queryset.order_by(*self.ordenacao)
+        valores = self.decodificar(cursor) if cursor else None
+        if valores is None:
+            cursor = None
+        else:
+            consulta = consulta.filter(self.filtro_apos(valores))
+
+        # Busca um item a mais só para saber se existe próxima página
+        itens = list(consulta[:self.por_pagina + 1])
+        proximo = None
+        if len(itens) > self.por_pagina:
+            itens = itens[:self.por_pagina]
+            proximo = self.codificar(itens[-1])
+        return PaginaKeyset(itens, cursor, valores, proximo)
+
+
+def paginar(request, queryset, ordenacao=('-criado_em', '-id'), por_pagina=20):
+    """Atalho para as views: lê ``?cursor=`` da requisição"""
+    return PaginadorKeyset(queryset, ordenacao, por_pagina).pagina(request.GET.get('cursor'))
@@ -0,0 +1,155 @@
+"""
+Pub/sub dos eventos em tempo real (SSE das notificações, WebSocket das plantas).
+
+Os sinais publicam, depois do commit, num canal (``usuario:7``, ``planta:12``)
+e cada conexão aberta assina o seu canal com uma ``asyncio.Queue``: uma conexão
+parada custa uma fila e uma corrotina suspensa, sem thread nem consulta ao banco.
+
+Com ``settings.TEMPO_REAL_ATIVO`` desligado (padrão) nada é publicado: ninguém
+estaria assinando. O backend vem de ``settings.PUBSUB_BACKEND``. ``MemoriaBroker`` (padrão) só
+entrega para conexões do mesmo processo; com vários workers use ``RedisBroker``
+(``PUBSUB_REDIS_URL``), que precisa do pacote ``redis``.
+"""
+import asyncio
+import json
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+TAMANHO_FILA = 100  # eventos pendentes por conexão antes de descartar
+
+
+def canal_usuario(usuario_id):
+    return f'usuario:{usuario_id}'
+
+
+def canal_planta(planta_id):
+    return f'planta:{planta_id}'
+
+
+def _entregar(fila, dados):
+    # Cliente lento: descarta o evento em vez de deixar a fila crescer
+    if not fila.full():
+        fila.put_nowait(dados)
+
+
+class MemoriaBroker:
+    """Filas em memória do processo atual"""
+
+    def __init__(self):
+        self._assinantes = {}  # canal -> {fila: loop}
+        self._trava = threading.Lock()
+
+    def publicar(self, canal, dados):
+        with self._trava:
+            assinantes = list(self._assinantes.get(canal, {}).items())
+        for fila, loop in assinantes:
+            try:
+                loop.call_soon_threadsafe(_entregar, fila, dados)
+            except RuntimeError:
+                pass  # loop já encerrado; a assinatura é removida na saída do ``async with``
+
+    def assinar(self, canal):
+        return _AssinaturaMemoria(self, canal)
+
+    def _registrar(self, canal, fila, loop):
+        with self._trava:
+            self._assinantes.setdefault(canal, {})[fila] = loop
+
+    def _remover(self, canal, fila):
+        with self._trava:
+            filas = self._assinantes.get(canal, {})
+            filas.pop(fila, None)
+            if not filas:
+                self._assinantes.pop(canal, None)
+
+
+class RedisBroker:
+    """Redis PUBLISH/SUBSCRIBE: entrega entre workers e máquinas"""
+
+    def __init__(self, url=None):
+        try:
+            import redis
+        except ImportError as erro:
+            raise ImproperlyConfigured('RedisBroker precisa do pacote "redis" (pip install redis).') from erro
+        self._url = url or settings.PUBSUB_REDIS_URL
+        self._cliente = redis.Redis.from_url(self._url)
+
+    def publicar(self, canal, dados):
+        self._cliente.publish(canal, json.dumps(dados, cls=DjangoJSONEncoder))
+
+    def assinar(self, canal):
+        return _AssinaturaRedis(self._url, canal)
+
+
+# Assinaturas são classes (e não @asynccontextmanager) para que a saída rode
+# inteira mesmo quando o gerador da resposta é finalizado pelo coletor.
+
+class _AssinaturaMemoria:
+    def __init__(self, broker, canal):
+        self.broker = broker
+        self.canal = canal
+        self.fila = asyncio.Queue(maxsize=TAMANHO_FILA)
+
+    async def __aenter__(self):
+        self.broker._registrar(self.canal, self.fila, asyncio.get_running_loop())
+        return self.fila
+
+    async def __aexit__(self, *excecao):
+        self.broker._remover(self.canal, self.fila)
+
+
+class _AssinaturaRedis:
+    def __init__(self, url, canal):
+        self.url = url
+        self.canal = canal
+        self.fila = asyncio.Queue(maxsize=TAMANHO_FILA)
+
+    async def __aenter__(self):
+        import redis.asyncio
+
+        self.cliente = redis.asyncio.Redis.from_url(self.url)
+        self.pubsub = self.cliente.pubsub()
+        await self.pubsub.subscribe(self.canal)
+        self.tarefa = asyncio.create_task(self._repassar())
+        return self.fila
+
+    async def _repassar(self):
+        async for mensagem in self.pubsub.listen():
+            if mensagem['type'] == 'message':
+                _entregar(self.fila, json.loads(mensagem['data']))
+
+    async def __aexit__(self, *excecao):
+        self.tarefa.cancel()
+        await self.pubsub.unsubscribe(self.canal)
+        await self.pubsub.aclose()
+        await self.cliente.aclose()
+
+
+@lru_cache(maxsize=None)
+def obter_broker():
+    return import_string(settings.PUBSUB_BACKEND)()
+
+
+def publicar(canal, dados):
+    """Entrega ``dados`` (um dict serializável em JSON) a quem assina ``canal``"""
+    obter_broker().publicar(canal, dados)
+
+
+def publicar_depois_do_commit(publicacao):
+    """
+    Agenda ``publicacao()`` para depois do commit, só com o tempo real ligado.
+    Uma falha do broker vai para o log e não derruba a requisição que já gravou.
+    """
+    if settings.TEMPO_REAL_ATIVO:
+        transaction.on_commit(publicacao, robust=True)
+
+
+def assinar(canal):
+    """``async with assinar(canal) as fila``: ``await fila.get()`` devolve cada evento"""
+    return obter_broker().assinar(canal)
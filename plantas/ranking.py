@@ -0,0 +1,278 @@
+"""
+Ranking de jardineiros materializado.
+
+A pontuação de cada usuário fica persistida em ``PontuacaoJardineiro`` (geral)
+e em baldes por período (``PontuacaoSemanal`` / ``PontuacaoMensal``), todos
+atualizados de forma incremental pelos sinais (``plantas/signals.py``). A
+migração que cria cada tabela já a preenche; o comando ``reconstruir_ranking``
+fica para reparos manuais (recalcula o ranking geral do zero com consultas
+agrupadas) e ``virar_periodos_ranking`` descarta os baldes vencidos.
+"""
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, Value, When
+from django.utils import timezone
+
+from .models import (
+    Planta, LikePlanta, Comentario, Seguir, UserBadge,
+    PontuacaoJardineiro, PontuacaoSemanal, PontuacaoMensal
+)
+
+# Peso de cada componente na pontuação final
+PESOS = {
+    'total_plantas': 10,
+    'total_likes': 5,
+    'total_comentarios': 3,
+    'total_seguidores': 15,
+    'pontos_badges': 1,
+}
+
+# (componente, modelo, campo do usuário, campo de data, agregação)
+FONTES = (
+    ('total_plantas', Planta, 'autor', 'criado_em', Count('id')),
+    ('total_likes', LikePlanta, 'planta__autor', 'criado_em', Count('id')),
+    ('total_comentarios', Comentario, 'autor', 'criado_em', Count('id')),
+    ('total_seguidores', Seguir, 'seguindo', 'criado_em', Count('id')),
+    ('pontos_badges', UserBadge, 'usuario', 'concedida_em', Sum('badge__pontos')),
+)
+
+PERIODO_GERAL = 'geral'
+PERIODOS = {
+    'semana': PontuacaoSemanal,
+    'mes': PontuacaoMensal,
+}
+PERIODO_CHOICES = [
+    (PERIODO_GERAL, 'Geral'),
+    ('semana', 'Esta semana'),
+    ('mes', 'Este mês'),
+]
+
+
+def inicio_periodo(periodo, momento=None):
+    """Data de início do balde (segunda-feira ou dia 1) que contém o momento"""
+    data = timezone.localdate(momento or timezone.now())
+    if periodo == 'semana':
+        return data - timedelta(days=data.weekday())
+    return data.replace(day=1)
+
+
+def fim_periodo(periodo, inicio):
+    """Primeiro dia do balde seguinte"""
+    if periodo == 'semana':
+        return inicio + timedelta(days=7)
+    return (inicio + timedelta(days=32)).replace(day=1)
+
+
+def _inicio_do_dia(data):
+    return timezone.make_aware(datetime.combine(data, time.min))
+
+
+def ranking_queryset(periodo=PERIODO_GERAL):
+    """Pontuações do período, na ordem do ranking (servidas pelo índice da tabela)"""
+    if periodo in PERIODOS:
+        consulta = PERIODOS[periodo].objects.filter(inicio=inicio_periodo(periodo))
+    else:
+        consulta = PontuacaoJardineiro.objects.all()
+    return consulta.order_by('-pontos', 'usuario_id')
+
+
+def posicao_no_ranking(usuario, periodo=PERIODO_GERAL):
+    """
+    Posição do usuário no ranking sem carregar os demais jardineiros.
+
+    Conta, pelo índice ``(-pontos, usuario)``, quantas linhas ficam à frente
+    (mais pontos, ou mesmos pontos e id menor). Sempre 2 consultas.
+    Retorna ``None`` se o usuário não tiver pontuação no período.
+    """
+    ranking = ranking_queryset(periodo)
+    pontos = ranking.filter(usuario=usuario).values_list('pontos', flat=True).first()
+    if pontos is None:
+        return None
+
+    contagem = ranking.aggregate(
+        total=Count('pk'),
+        a_frente=Count('pk', filter=Q(pontos__gt=pontos) | Q(pontos=pontos, usuario_id__lt=usuario.pk)),
+    )
+    return {
+        'posicao': contagem['a_frente'] + 1,
+        'total': contagem['total'],
+        'pontos': pontos,
+    }
+
+
+def posicao_inicial(ranking, valores_cursor=None):
+    """
+    Posição da primeira linha de uma página do ranking paginada por cursor.
+
+    ``valores_cursor`` são os ``(pontos, usuario_id)`` da última linha da página
+    anterior; conta pelo índice quantas linhas vêm até ela (inclusive).
+    """
+    if not valores_cursor:
+        return 1
+    pontos, usuario_id = valores_cursor
+    return ranking.filter(Q(pontos__gt=pontos) | Q(pontos=pontos, usuario_id__lte=usuario_id)).count() + 1
+
+
+def calcular_pontos(componentes):
+    """Pontuação final a partir dos componentes"""
+    return sum(peso * (componentes.get(campo) or 0) for campo, peso in PESOS.items())
+
+
+def agregar_componentes(usuarios=None, desde=None, ate=None):
+    """Calcula os componentes de todos os usuários com uma consulta agrupada por fonte"""
+    componentes = {}
+    for campo, modelo, campo_usuario, campo_data, agregacao in FONTES:
+        consulta = modelo.objects.order_by()
+        if usuarios is not None:
+            consulta = consulta.filter(**{f'{campo_usuario}__in': usuarios})
+        if desde is not None:
+            consulta = consulta.filter(**{f'{campo_data}__gte': desde})
+        if ate is not None:
+            consulta = consulta.filter(**{f'{campo_data}__lt': ate})
+        linhas = consulta.values_list(campo_usuario).annotate(total=agregacao)
+        for usuario_id, total in linhas:
+            componentes.setdefault(usuario_id, {})[campo] = total or 0
+    return componentes
+
+
+def _nova_pontuacao(modelo, usuario_id, componentes, **extras):
+    valores = {campo: componentes.get(campo, 0) for campo in PESOS}
+    return modelo(usuario_id=usuario_id, pontos=calcular_pontos(valores), **valores, **extras)
+
+
+def recalcular_pontuacao(usuario_id):
+    """Recalcula a pontuação geral de um único usuário a partir das tabelas de origem"""
+    componentes = agregar_componentes([usuario_id]).get(usuario_id, {})
+    pontuacao = _nova_pontuacao(PontuacaoJardineiro, usuario_id, componentes)
+    valores = {campo: getattr(pontuacao, campo) for campo in ['pontos', *PESOS]}
+    PontuacaoJardineiro.objects.update_or_create(usuario_id=usuario_id, defaults=valores)
+
+
+def _atualizar_balde(modelo, usuario_id, inicio, deltas, valores):
+    if modelo.objects.filter(usuario_id=usuario_id, inicio=inicio).update(**valores):
+        return
+    if not any(delta > 0 for delta in deltas.values()):
+        # Evento desfeito de um balde que já foi descartado
+        return
+    try:
+        with transaction.atomic():
+            _nova_pontuacao(modelo, usuario_id, deltas, inicio=inicio).save()
+    except IntegrityError:
+        # Outra requisição criou o balde ao mesmo tempo
+        modelo.objects.filter(usuario_id=usuario_id, inicio=inicio).update(**valores)
+
+
+def atualizar_pontuacao(usuario_id, momento=None, **deltas):
+    """
+    Aplica deltas incrementais (ex.: total_likes=1) na pontuação geral do usuário
+    e nos baldes semanal/mensal do momento em que o evento aconteceu.
+    """
+    valores = {campo: F(campo) + delta for campo, delta in deltas.items()}
+    valores['pontos'] = F('pontos') + calcular_pontos(deltas)
+    valores['atualizado_em'] = timezone.now()
+
+    atualizadas = PontuacaoJardineiro.objects.filter(usuario_id=usuario_id).update(**valores)
+    if not atualizadas and any(delta > 0 for delta in deltas.values()):
+        # Usuário ainda sem linha materializada: calcula do zero (já inclui o evento atual)
+        if User.objects.filter(pk=usuario_id).exists():
+            recalcular_pontuacao(usuario_id)
+        else:
+            return
+
+    for periodo, modelo in PERIODOS.items():
+        _atualizar_balde(modelo, usuario_id, inicio_periodo(periodo, momento), deltas, valores)
+
+
+def _por_usuario(valores):
+    """``{usuario_id: valor}`` -> expressão com o valor de cada linha (0 para as demais)"""
+    return Case(
+        *(When(usuario_id=usuario_id, then=Value(valor)) for usuario_id, valor in valores.items()),
+        default=Value(0), output_field=IntegerField(),
+    )
+
+
+def atualizar_pontuacoes_em_lote(campo, deltas, momento=None):
+    """
+    Versão em lote de ``atualizar_pontuacao`` para um componente:
+    ``deltas`` é ``{usuario_id: delta}``, aplicado com um UPDATE por tabela.
+    """
+    if not deltas:
+        return
+    valores = {
+        campo: F(campo) + _por_usuario(deltas),
+        'pontos': F('pontos') + _por_usuario({u: d * PESOS[campo] for u, d in deltas.items()}),
+        'atualizado_em': timezone.now(),
+    }
+
+    com_linha = set(PontuacaoJardineiro.objects.filter(usuario_id__in=deltas).values_list('usuario_id', flat=True))
+    PontuacaoJardineiro.objects.filter(usuario_id__in=com_linha).update(**valores)
+    for usuario_id in deltas.keys() - com_linha:
+        if deltas[usuario_id] > 0:
+            recalcular_pontuacao(usuario_id)
+
+    for periodo, modelo in PERIODOS.items():
+        inicio = inicio_periodo(periodo, momento)
+        baldes = modelo.objects.filter(inicio=inicio)
+        com_balde = set(baldes.filter(usuario_id__in=deltas).values_list('usuario_id', flat=True))
+        baldes.filter(usuario_id__in=com_balde).update(**valores)
+        modelo.objects.bulk_create([
+            _nova_pontuacao(modelo, usuario_id, {campo: delta}, inicio=inicio)
+            for usuario_id, delta in deltas.items()
+            if usuario_id not in com_balde and delta > 0
+        ], ignore_conflicts=True)
+
+
+def _inserir_em_lotes(modelo, objetos, tamanho_lote):
+    lote = []
+    total = 0
+    for objeto in objetos:
+        lote.append(objeto)
+        if len(lote) >= tamanho_lote:
+            modelo.objects.bulk_create(lote)
+            total += len(lote)
+            lote = []
+    if lote:
+        modelo.objects.bulk_create(lote)
+        total += len(lote)
+    return total
+
+
+def reconstruir_ranking(tamanho_lote=1000):
+    """Reconstrói a tabela de pontuações geral inteira; retorna o total de linhas gravadas"""
+    componentes = agregar_componentes()
+    usuarios = User.objects.order_by('pk').values_list('pk', flat=True)
+
+    with transaction.atomic():
+        PontuacaoJardineiro.objects.all().delete()
+        return _inserir_em_lotes(PontuacaoJardineiro, (
+            _nova_pontuacao(PontuacaoJardineiro, usuario_id, componentes.get(usuario_id, {}))
+            for usuario_id in usuarios.iterator(chunk_size=tamanho_lote)
+        ), tamanho_lote)
+
+
+def reconstruir_periodo(periodo, inicio=None, tamanho_lote=1000):
+    """Reconstrói um balde de período a partir do ``criado_em`` das tabelas de origem"""
+    modelo = PERIODOS[periodo]
+    inicio = inicio or inicio_periodo(periodo)
+    fim = fim_periodo(periodo, inicio)
+    componentes = agregar_componentes(desde=_inicio_do_dia(inicio), ate=_inicio_do_dia(fim))
+
+    with transaction.atomic():
+        modelo.objects.filter(inicio=inicio).delete()
+        return _inserir_em_lotes(modelo, (
+            _nova_pontuacao(modelo, usuario_id, valores, inicio=inicio)
+            for usuario_id, valores in sorted(componentes.items())
+        ), tamanho_lote)
+
+
+def descartar_periodos_vencidos(manter=1):
+    """Remove os baldes anteriores aos ``manter`` períodos anteriores ao atual"""
+    removidos = {}
+    for periodo, modelo in PERIODOS.items():
+        limite = inicio_periodo(periodo)
+        for _ in range(manter):
+            limite = inicio_periodo(periodo, _inicio_do_dia(limite - timedelta(days=1)))
+        removidos[periodo], _ = modelo.objects.filter(inicio__lt=limite).delete()
+    return removidos
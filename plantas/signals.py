@@ -1,57 +1,36 @@
-from django.db.models.signals import post_save
+from contextvars import ContextVar
+
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from .models import Planta, Comentario, LikePlanta, Badge, UserBadge
 from .models import Notificacao, LikePlanta, Comentario, Seguir, UserBadge
-from .models import UserProfile
-
+from .models import UserProfile, PontuacaoJardineiro, FavoritoPlanta, Conquista, UsuarioConquista
+from .notificacoes import ajustar_nao_lidas, publicar_notificacao
+from .feed import podar_feed
+from .tarefas import enfileirar
+from .websocket import publicar_comentario, publicar_contadores
+from .badges import invalidar_indice
+from . import efeitos
 
-def conceder_badge(usuario, regra_nome):
-    """Função auxiliar para conceder badge"""
-    badge = Badge.objects.filter(regra=regra_nome).first()
-    if badge and not UserBadge.objects.filter(usuario=usuario, badge=badge).exists():
-        UserBadge.objects.create(usuario=usuario, badge=badge)
-        # Pode adicionar notificação aqui futuramente
-        print(f"🏆 Badge concedida: {badge.nome} para {usuario.username}")
-
-# BADGE: Primeira Planta
-@receiver(post_save, sender=Planta)
-def badge_primeira_planta(sender, instance, created, **kwargs):
-    if created and instance.autor.planta_set.count() == 1:
-        conceder_badge(instance.autor, 'primeira_planta')
+# Plantas sendo excluídas: o cascade dispara um post_delete por like e por
+# comentário, e cada um buscaria de novo a mesma planta só pelo autor
+_plantas_em_exclusao = ContextVar('plantas_em_exclusao', default={})
 
-# BADGE: 5 Plantas
-@receiver(post_save, sender=Planta)
-def badge_cinco_plantas(sender, instance, created, **kwargs):
-    if created and instance.autor.planta_set.count() == 5:
-        conceder_badge(instance.autor, '5_postagens')
-
-# BADGE: 10 Plantas
-@receiver(post_save, sender=Planta)
-def badge_dez_plantas(sender, instance, created, **kwargs):
-    if created and instance.autor.planta_set.count() == 10:
-        conceder_badge(instance.autor, '10_postagens')
 
-# BADGE: Primeiro Comentário
-@receiver(post_save, sender=Comentario)
-def badge_primeiro_comentario(sender, instance, created, **kwargs):
-    if created and instance.autor.comentario_set.count() == 1:
-        conceder_badge(instance.autor, 'primeiro_comentario')
+def _planta_de(instance):
+    """Planta do like/comentário, sem consulta quando ela está em exclusão ou já carregada"""
+    return _plantas_em_exclusao.get().get(instance.planta_id) or instance.planta
 
-# BADGE: 5 Comentários
-@receiver(post_save, sender=Comentario)
-def badge_cinco_comentarios(sender, instance, created, **kwargs):
-    if created and instance.autor.comentario_set.count() == 5:
-        conceder_badge(instance.autor, '5_comentarios')
+@receiver(pre_delete, sender=Planta)
+def planta_em_exclusao(sender, instance, **kwargs):
+    _plantas_em_exclusao.set({**_plantas_em_exclusao.get(), instance.pk: instance})
 
-# BADGE: 10 Likes Recebidos
-@receiver(post_save, sender=LikePlanta)
-def badge_dez_likes_recebidos(sender, instance, created, **kwargs):
-    if created:
-        autor = instance.planta.autor
-        total_likes = LikePlanta.objects.filter(planta__autor=autor).count()
-        if total_likes == 10:
-            conceder_badge(autor, '10_likes_recebidos')
+@receiver(post_delete, sender=Planta)
+def planta_excluida(sender, instance, **kwargs):
+    restantes = dict(_plantas_em_exclusao.get())
+    restantes.pop(instance.pk, None)
+    _plantas_em_exclusao.set(restantes)
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -63,49 +42,46 @@ def save_user_profile(sender, instance, **kwargs):
     if hasattr(instance, 'profile'):
         instance.profile.save()
 
-# Notificação: Nova curtida
+# Notificação: Nova curtida (agrupada por planta)
 @receiver(post_save, sender=LikePlanta)
 def notificar_like(sender, instance, created, **kwargs):
     if created:
-        Notificacao.objects.create(
-            usuario=instance.planta.autor,
-            tipo='LIKE',
-            mensagem=f"{instance.usuario.username} curtiu sua planta '{instance.planta.nome}'.",
-            dados_json={'planta_id': instance.planta.pk, 'usuario_id': instance.usuario.pk}
+        planta = _planta_de(instance)
+        efeitos.notificar_agrupado(
+            planta.autor_id, 'LIKE', f'LIKE:planta:{instance.planta_id}', instance.usuario,
+            singular=f"curtiu sua planta '{planta.nome}'.",
+            plural=f"curtiram sua planta '{planta.nome}'.",
+            dados_json={'planta_id': instance.planta_id, 'usuario_id': instance.usuario_id}
         )
 
-# Notificação: Novo comentário
+# Notificação: Novo comentário (agrupado por planta)
 @receiver(post_save, sender=Comentario)
 def notificar_comentario(sender, instance, created, **kwargs):
     if created:
-        Notificacao.objects.create(
-            usuario=instance.planta.autor,
-            tipo='COMENTARIO',
-            mensagem=f"{instance.autor.username} comentou em '{instance.planta.nome}'.",
-            dados_json={'planta_id': instance.planta.pk, 'usuario_id': instance.autor.pk}
+        planta = _planta_de(instance)
+        efeitos.notificar_agrupado(
+            planta.autor_id, 'COMENTARIO', f'COMENTARIO:planta:{instance.planta_id}', instance.autor,
+            singular=f"comentou em '{planta.nome}'.",
+            plural=f"comentaram em '{planta.nome}'.",
+            dados_json={'planta_id': instance.planta_id, 'usuario_id': instance.autor_id}
         )
 
-# Notificação: Novo seguidor
+# Notificação: Novo seguidor (agrupado)
 @receiver(post_save, sender=Seguir)
 def notificar_seguir(sender, instance, created, **kwargs):
     if created:
-        Notificacao.objects.create(
-            usuario=instance.seguindo,
-            tipo='SEGUIR',
-            mensagem=f"{instance.seguidor.username} começou a te seguir.",
-            dados_json={'usuario_id': instance.seguidor.pk}
+        efeitos.notificar_agrupado(
+            instance.seguindo_id, 'SEGUIR', 'SEGUIR', instance.seguidor,
+            singular="começou a te seguir.",
+            plural="começaram a te seguir.",
+            dados_json={'usuario_id': instance.seguidor_id}
         )
 
-# Notificação: Nova conquista (badge)
+# Nova conquista (badge) concedida uma a uma: notificação e ranking via registrar_concessoes
 @receiver(post_save, sender=UserBadge)
-def notificar_badge(sender, instance, created, **kwargs):
+def registrar_badge(sender, instance, created, **kwargs):
     if created:
-        Notificacao.objects.create(
-            usuario=instance.usuario,
-            tipo='BADGE',
-            mensagem=f"Você ganhou a conquista: {instance.badge.nome}!",
-            dados_json={'badge_id': instance.badge.pk}
-        )
+        efeitos.registrar_badge(instance)
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -118,4 +94,267 @@ def save_user_profile(sender, instance, **kwargs):
         instance.profile.save()
     else:
         # Se não existir, cria
-        UserProfile.objects.get_or_create(user=instance)
\ No newline at end of file
+        UserProfile.objects.get_or_create(user=instance)
+
+# ============================================
+# RANKING: atualização incremental das pontuações
+# ============================================
+
+@receiver(post_save, sender=User)
+def criar_pontuacao_usuario(sender, instance, created, **kwargs):
+    if created:
+        PontuacaoJardineiro.objects.get_or_create(usuario=instance)
+
+@receiver(post_save, sender=Planta)
+def ranking_planta_criada(sender, instance, created, **kwargs):
+    if created:
+        efeitos.pontuar(instance.autor_id, instance.criado_em, total_plantas=1)
+
+@receiver(post_delete, sender=Planta)
+def ranking_planta_excluida(sender, instance, **kwargs):
+    efeitos.pontuar(instance.autor_id, instance.criado_em, total_plantas=-1)
+
+@receiver(post_save, sender=LikePlanta)
+def ranking_like_criado(sender, instance, created, **kwargs):
+    if created:
+        efeitos.pontuar(_planta_de(instance).autor_id, instance.criado_em, total_likes=1)
+
+@receiver(post_delete, sender=LikePlanta)
+def ranking_like_excluido(sender, instance, **kwargs):
+    efeitos.pontuar(_planta_de(instance).autor_id, instance.criado_em, total_likes=-1)
+
+@receiver(post_save, sender=Comentario)
+def ranking_comentario_criado(sender, instance, created, **kwargs):
+    if created:
+        efeitos.pontuar(instance.autor_id, instance.criado_em, total_comentarios=1)
+
+@receiver(post_delete, sender=Comentario)
+def ranking_comentario_excluido(sender, instance, **kwargs):
+    efeitos.pontuar(instance.autor_id, instance.criado_em, total_comentarios=-1)
+
+@receiver(post_save, sender=Seguir)
+def ranking_seguidor_criado(sender, instance, created, **kwargs):
+    if created:
+        efeitos.pontuar(instance.seguindo_id, instance.criado_em, total_seguidores=1)
+
+@receiver(post_delete, sender=Seguir)
+def ranking_seguidor_excluido(sender, instance, **kwargs):
+    efeitos.pontuar(instance.seguindo_id, instance.criado_em, total_seguidores=-1)
+
+@receiver(post_delete, sender=UserBadge)
+def ranking_badge_removida(sender, instance, **kwargs):
+    efeitos.pontuar(instance.usuario_id, instance.concedida_em, pontos_badges=-instance.badge.pontos)
+
+# ============================================
+# CONTADORES DA PLANTA (likes, favoritos, comentários)
+# ============================================
+
+@receiver(post_save, sender=LikePlanta)
+def contar_like_criado(sender, instance, created, **kwargs):
+    if created:
+        efeitos.somar(Planta, instance.planta_id, total_likes=1)
+
+@receiver(post_delete, sender=LikePlanta)
+def contar_like_excluido(sender, instance, **kwargs):
+    efeitos.somar(Planta, instance.planta_id, total_likes=-1)
+
+@receiver(post_save, sender=FavoritoPlanta)
+def contar_favorito_criado(sender, instance, created, **kwargs):
+    if created:
+        efeitos.somar(Planta, instance.planta_id, total_favoritos=1)
+
+@receiver(post_delete, sender=FavoritoPlanta)
+def contar_favorito_excluido(sender, instance, **kwargs):
+    efeitos.somar(Planta, instance.planta_id, total_favoritos=-1)
+
+@receiver(post_save, sender=Comentario)
+def contar_comentario_criado(sender, instance, created, **kwargs):
+    if created:
+        efeitos.somar(Planta, instance.planta_id, total_comentarios=1)
+
+@receiver(post_delete, sender=Comentario)
+def contar_comentario_excluido(sender, instance, **kwargs):
+    efeitos.somar(Planta, instance.planta_id, total_comentarios=-1)
+
+# ============================================
+# ESTATÍSTICAS DO PERFIL (posts, seguidores, likes)
+# ============================================
+
+@receiver(post_save, sender=Planta)
+def perfil_planta_criada(sender, instance, created, **kwargs):
+    if created:
+        efeitos.somar_perfil(instance.autor_id, total_posts=1)
+
+@receiver(post_delete, sender=Planta)
+def perfil_planta_excluida(sender, instance, **kwargs):
+    efeitos.somar_perfil(instance.autor_id, total_posts=-1)
+
+@receiver(post_save, sender=Seguir)
+def perfil_seguir_criado(sender, instance, created, **kwargs):
+    if created:
+        efeitos.somar_perfil(instance.seguindo_id, total_seguidores=1)
+        efeitos.somar_perfil(instance.seguidor_id, total_seguindo=1)
+
+@receiver(post_delete, sender=Seguir)
+def perfil_seguir_excluido(sender, instance, **kwargs):
+    efeitos.somar_perfil(instance.seguindo_id, total_seguidores=-1)
+    efeitos.somar_perfil(instance.seguidor_id, total_seguindo=-1)
+
+@receiver(post_save, sender=LikePlanta)
+def perfil_like_criado(sender, instance, created, **kwargs):
+    if created:
+        efeitos.somar_perfil(_planta_de(instance).autor_id, total_likes_recebidos=1)
+        efeitos.somar_perfil(instance.usuario_id, total_likes_dados=1)
+
+@receiver(post_delete, sender=LikePlanta)
+def perfil_like_excluido(sender, instance, **kwargs):
+    efeitos.somar_perfil(_planta_de(instance).autor_id, total_likes_recebidos=-1)
+    efeitos.somar_perfil(instance.usuario_id, total_likes_dados=-1)
+
+@receiver(post_save, sender=Comentario)
+def perfil_comentario_criado(sender, instance, created, **kwargs):
+    if created:
+        efeitos.somar_perfil(instance.autor_id, total_comentarios=1)
+
+@receiver(post_delete, sender=Comentario)
+def perfil_comentario_excluido(sender, instance, **kwargs):
+    efeitos.somar_perfil(instance.autor_id, total_comentarios=-1)
+
+# ============================================
+# CACHE DOS CARDS (nova versão depois dos contadores)
+# ============================================
+
+@receiver(post_save, sender=Planta)
+def card_planta_salva(sender, instance, **kwargs):
+    efeitos.invalidar_card(instance.pk)
+
+@receiver(post_delete, sender=Planta)
+def card_planta_excluida(sender, instance, **kwargs):
+    efeitos.invalidar_card(instance.pk)
+
+@receiver(post_save, sender=LikePlanta)
+@receiver(post_save, sender=FavoritoPlanta)
+@receiver(post_save, sender=Comentario)
+def card_interacao_criada(sender, instance, created, **kwargs):
+    if created:
+        efeitos.invalidar_card(instance.planta_id)
+
+@receiver(post_delete, sender=LikePlanta)
+@receiver(post_delete, sender=FavoritoPlanta)
+@receiver(post_delete, sender=Comentario)
+def card_interacao_excluida(sender, instance, **kwargs):
+    efeitos.invalidar_card(instance.planta_id)
+
+# ============================================
+# FEED (fan-out na escrita)
+# ============================================
+
+@receiver(post_save, sender=Planta)
+def feed_planta_criada(sender, instance, created, **kwargs):
+    if created:
+        efeitos.distribuir(instance.autor_id, instance.pk, instance.criado_em)
+
+@receiver(post_save, sender=Seguir)
+def feed_seguir_criado(sender, instance, created, **kwargs):
+    if created:
+        # Copia até ITENS_AO_SEGUIR itens: vai para a fila em vez de segurar a requisição
+        enfileirar('feed.preencher', seguidor_id=instance.seguidor_id, seguindo_id=instance.seguindo_id)
+
+@receiver(post_delete, sender=Seguir)
+def feed_seguir_excluido(sender, instance, **kwargs):
+    podar_feed(instance.seguidor_id, instance.seguindo_id)
+
+# ============================================
+# BUSCA (índice de texto completo)
+# ============================================
+
+@receiver(post_save, sender=Planta)
+def busca_planta_salva(sender, instance, **kwargs):
+    efeitos.reindexar_busca(instance.pk)
+
+@receiver(post_delete, sender=Planta)
+def busca_planta_excluida(sender, instance, **kwargs):
+    efeitos.reindexar_busca(instance.pk)
+
+# ============================================
+# CONTADOR DE NÃO LIDAS (perfil + cache)
+# ============================================
+
+@receiver(post_save, sender=Notificacao)
+def nao_lidas_notificacao_criada(sender, instance, created, **kwargs):
+    # Atualizar uma notificação agrupada não muda o total
+    if created and not instance.lida:
+        ajustar_nao_lidas(instance.usuario_id, 1)
+
+@receiver(post_delete, sender=Notificacao)
+def nao_lidas_notificacao_excluida(sender, instance, **kwargs):
+    if not instance.lida:
+        ajustar_nao_lidas(instance.usuario_id, -1)
+
+# ============================================
+# TEMPO REAL (SSE do sino)
+# ============================================
+
+@receiver(post_save, sender=Notificacao)
+def tempo_real_notificacao_salva(sender, instance, **kwargs):
+    # Criada ou agrupada: o cliente troca a linha pelo id
+    if not instance.lida:
+        efeitos.publicar_tempo_real(lambda: publicar_notificacao(instance))
+
+# ============================================
+# TEMPO REAL (WebSocket das plantas)
+# ============================================
+
+CONTADOR_AO_VIVO = {LikePlanta: 'likes', FavoritoPlanta: 'favoritos'}
+
+@receiver(post_save, sender=LikePlanta)
+@receiver(post_save, sender=FavoritoPlanta)
+def ao_vivo_interacao_criada(sender, instance, created, **kwargs):
+    if created:
+        campo = CONTADOR_AO_VIVO[sender]
+        efeitos.publicar_tempo_real(lambda: publicar_contadores(instance.planta_id, **{campo: 1}))
+
+@receiver(post_delete, sender=LikePlanta)
+@receiver(post_delete, sender=FavoritoPlanta)
+def ao_vivo_interacao_excluida(sender, instance, **kwargs):
+    campo = CONTADOR_AO_VIVO[sender]
+    efeitos.publicar_tempo_real(lambda: publicar_contadores(instance.planta_id, **{campo: -1}))
+
+@receiver(post_save, sender=Comentario)
+def ao_vivo_comentario_criado(sender, instance, created, **kwargs):
+    if created:
+        efeitos.publicar_tempo_real(lambda: publicar_comentario(instance))
+
+@receiver(post_delete, sender=Comentario)
+def ao_vivo_comentario_excluido(sender, instance, **kwargs):
+    efeitos.publicar_tempo_real(lambda: publicar_contadores(instance.planta_id, comentarios=-1))
+
+# ============================================
+# BADGES (um despacho por evento, depois dos contadores do perfil)
+# ============================================
+
+@receiver(post_save, sender=Planta)
+@receiver(post_save, sender=Comentario)
+@receiver(post_save, sender=LikePlanta)
+@receiver(post_save, sender=Seguir)
+def badges_avaliar_evento(sender, instance, created, **kwargs):
+    if created:
+        efeitos.avaliar_badges(instance)
+
+@receiver(post_save, sender=Badge)
+@receiver(post_delete, sender=Badge)
+def badges_regras_alteradas(sender, **kwargs):
+    invalidar_indice()
+
+# ============================================
+# CONQUISTAS (contador de desbloqueios)
+# ============================================
+
+@receiver(post_save, sender=UsuarioConquista)
+def conquista_desbloqueada(sender, instance, created, **kwargs):
+    if created:
+        efeitos.somar(Conquista, instance.conquista_id, total_desbloqueios=1)
+
+@receiver(post_delete, sender=UsuarioConquista)
+def conquista_removida(sender, instance, **kwargs):
+    efeitos.somar(Conquista, instance.conquista_id, total_desbloqueios=-1)
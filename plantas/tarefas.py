@@ -0,0 +1,153 @@
+"""
+Fila de tarefas em segundo plano guardada no próprio banco (``Tarefa``).
+
+Funções registradas com ``@tarefa('nome')`` são agendadas com
+``enfileirar('nome', **argumentos)``. Os argumentos passam por JSON nos dois
+modos, então a tarefa recebe sempre os mesmos tipos:
+
+- ``TAREFAS_EM_SEGUNDO_PLANO`` desligado: roda na hora (como antes);
+- ligado: grava uma linha que o ``manage.py processar_tarefas`` executa.
+
+O worker reserva as tarefas vencidas com ``SELECT ... FOR UPDATE SKIP LOCKED``
+(PostgreSQL) ou, no SQLite, com um ``UPDATE`` condicionado ao status, de modo
+que dois workers nunca peguem a mesma linha. Falhas voltam para a fila com
+espera exponencial até ``max_tentativas``.
+"""
+import json
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .badges import avaliar_usuarios
+from .contadores import CONTADORES_CONQUISTA, CONTADORES_PERFIL, CONTADORES_PLANTA, reconciliar
+from .feed import distribuir_em_lote, preencher_feed
+from .models import Conquista, Planta, Seguir, Tarefa, UserProfile
+from .notificacoes import notificar_agrupados
+
+BACKOFF_MAXIMO = 60 * 60  # nunca espera mais de 1h entre tentativas
+
+REGISTRO = {}
+
+
+def tarefa(nome):
+    """Registra a função como tarefa ``nome``"""
+    def registrar(funcao):
+        REGISTRO[nome] = funcao
+        return funcao
+    return registrar
+
+
+def enfileirar(nome, **argumentos):
+    """Agenda a tarefa ``nome``; com a fila desligada, executa na hora"""
+    if nome not in REGISTRO:
+        raise ValueError(f'Tarefa desconhecida: {nome!r}')
+    argumentos = json.loads(json.dumps(argumentos, cls=DjangoJSONEncoder))
+    if not settings.TAREFAS_EM_SEGUNDO_PLANO:
+        REGISTRO[nome](**argumentos)
+        return None
+    # Dentro de um atomic, a linha só aparece para o worker no commit (e some num rollback)
+    return Tarefa.objects.create(
+        nome=nome, argumentos=argumentos, max_tentativas=settings.TAREFAS_MAX_TENTATIVAS
+    )
+
+
+# ===== Worker =====
+
+def reservar(trabalhador, limite):
+    """Marca até ``limite`` tarefas vencidas como executando para ``trabalhador`` e as retorna"""
+    agora = timezone.now()
+    vencidas = Tarefa.objects.filter(status='PENDENTE', executar_em__lte=agora).order_by('executar_em', 'id')
+    reserva = {
+        'status': 'EXECUTANDO', 'trabalhador': trabalhador,
+        'iniciada_em': agora, 'tentativas': F('tentativas') + 1,
+    }
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(vencidas.select_for_update(skip_locked=True).values_list('pk', flat=True)[:limite])
+            Tarefa.objects.filter(pk__in=ids).update(**reserva)
+    else:
+        # SQLite não tem SKIP LOCKED: leva a linha quem conseguir mudar o status primeiro
+        ids = [
+            pk for pk in vencidas.values_list('pk', flat=True)[:limite]
+            if Tarefa.objects.filter(pk=pk, status='PENDENTE').update(**reserva)
+        ]
+    return list(Tarefa.objects.filter(pk__in=ids).order_by('executar_em', 'id'))
+
+
+def executar(tarefa):
+    """Roda uma tarefa reservada; retorna ``True`` se deu certo"""
+    try:
+        with transaction.atomic():
+            REGISTRO[tarefa.nome](**tarefa.argumentos)
+    except Exception:
+        falhar(tarefa, traceback.format_exc())
+        return False
+    Tarefa.objects.filter(pk=tarefa.pk).update(status='CONCLUIDA', concluida_em=timezone.now(), erro='')
+    return True
+
+
+def falhar(tarefa, erro):
+    """Devolve a tarefa para a fila com espera exponencial, ou desiste dela"""
+    if tarefa.tentativas >= tarefa.max_tentativas:
+        Tarefa.objects.filter(pk=tarefa.pk).update(status='FALHOU', erro=erro, concluida_em=timezone.now())
+        return
+    espera = min(settings.TAREFAS_BACKOFF * 2 ** (tarefa.tentativas - 1), BACKOFF_MAXIMO)
+    Tarefa.objects.filter(pk=tarefa.pk).update(
+        status='PENDENTE', erro=erro, executar_em=timezone.now() + timedelta(seconds=espera),
+    )
+
+
+def recuperar_abandonadas():
+    """Tarefas presas em "executando" (worker morto) voltam para a fila; retorna quantas"""
+    limite = timezone.now() - timedelta(seconds=settings.TAREFAS_TIMEOUT)
+    presas = Tarefa.objects.filter(status='EXECUTANDO', iniciada_em__lt=limite)
+    erro = 'Worker interrompido durante a execução'
+    desistidas = presas.filter(tentativas__gte=F('max_tentativas')).update(status='FALHOU', erro=erro)
+    return desistidas + presas.update(status='PENDENTE', erro=erro)
+
+
+def limpar_concluidas(horas):
+    """Apaga as tarefas concluídas há mais de ``horas`` horas; retorna quantas"""
+    limite = timezone.now() - timedelta(hours=horas)
+    return Tarefa.objects.filter(status='CONCLUIDA', concluida_em__lt=limite).delete()[0]
+
+
+# ===== Tarefas registradas =====
+
+@tarefa('feed.distribuir')
+def distribuir_feed(publicacoes):
+    for publicacao in publicacoes:
+        publicacao['criado_em'] = parse_datetime(publicacao['criado_em'])
+    distribuir_em_lote(publicacoes)
+
+
+@tarefa('feed.preencher')
+def preencher_feed_seguidor(seguidor_id, seguindo_id):
+    # Se deixou de seguir antes de a tarefa rodar, não há o que copiar
+    if Seguir.objects.filter(seguidor_id=seguidor_id, seguindo_id=seguindo_id).exists():
+        preencher_feed(seguidor_id, seguindo_id)
+
+
+@tarefa('notificacoes.agrupar')
+def notificar(eventos):
+    notificar_agrupados(eventos)
+
+
+@tarefa('badges.avaliar')
+def avaliar_badges(campos_por_usuario):
+    # JSON não tem chave inteira: vem como [[usuario_id, [colunas]], ...]
+    avaliar_usuarios(dict(campos_por_usuario))
+
+
+@tarefa('contadores.reconciliar')
+def reconciliar_contadores(tamanho_lote=1000):
+    reconciliar(Planta, CONTADORES_PLANTA, tamanho_lote=tamanho_lote)
+    reconciliar(UserProfile, CONTADORES_PERFIL, chave='user_id', tamanho_lote=tamanho_lote)
+    reconciliar(Conquista, CONTADORES_CONQUISTA, tamanho_lote=tamanho_lote)
@@ -1,9 +1,53 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client
 from django.contrib.auth.models import User
 from django.urls import reverse
 from .models import Planta, Comentario, Categoria
 from .models import LikePlanta
 from django.utils import timezone
+from django.test import override_settings
+import asyncio
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from trabalho_final.asgi import application
+from .atividades import stream_atividades, topo_do_fluxo
+from .badges import conceder_em_lote, interpretar_regra
+from .busca import buscar_ids, limpar_indice, radical, termos
+from .caches import anotar_versoes_cards
+from .conquistas import (
+    CriterioInvalido, POSICAO, avaliar_lote, compilar_conquistas, compilar_criterio, desbloquear_em_lote,
+)
+from .efeitos import coletando
+from .feed import feed_hibrido, itens_do_feed
+from .interacoes import anotar_interacoes
+from .models import (
+    Badge, Conquista, DiarioPlanta, Enquete, FavoritoPlanta, ItemFeed, Lembrete, Mensagem, Notificacao,
+    PontuacaoJardineiro, PontuacaoMensal, PontuacaoSemanal, Seguir, Tarefa, UserBadge, UserProfile,
+    UsuarioConquista,
+)
+from .notificacoes import contar_nao_lidas, marcar_como_lidas
+from .paginacao import PaginadorKeyset
+from .ranking import inicio_periodo, posicao_inicial, ranking_queryset
+from .tarefas import REGISTRO, enfileirar, executar, reservar
+
+# Views renderizadas sem o redirecionamento HTTPS e sem o manifesto do collectstatic
+config_views = override_settings(
+    SECURE_SSL_REDIRECT=False,
+    STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+)
+
 
 class ModelTestCase(TestCase):
     def setUp(self):
@@ -197,4 +241,1094 @@ class LikeTestCase(TestCase):
         # Unlike
         response = self.client.post(reverse('toggle_like', args=[self.planta.pk]))
         self.assertEqual(response.status_code, 302)
-        self.assertFalse(LikePlanta.objects.filter(planta=self.planta, usuario=self.user2).exists())
\ No newline at end of file
+        self.assertFalse(LikePlanta.objects.filter(planta=self.planta, usuario=self.user2).exists())
+
+
+@config_views
+class RankingTestCase(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='ranking1', password='pass1')
+        self.user2 = User.objects.create_user(username='ranking2', password='pass2')
+        self.planta = Planta.objects.create(
+            nome="Teste", especie="Teste", dificuldade='F',
+            necessidade_agua="Teste", necessidade_luz="Teste",
+            descricao="Teste", autor=self.user1
+        )
+
+    def test_pontuacao_incremental(self):
+        """Testa se os sinais mantêm a pontuação materializada"""
+        like = LikePlanta.objects.create(planta=self.planta, usuario=self.user2)
+        Seguir.objects.create(seguidor=self.user2, seguindo=self.user1)
+        Comentario.objects.create(planta=self.planta, autor=self.user2, conteudo="Linda!")
+
+        pontuacao = PontuacaoJardineiro.objects.get(usuario=self.user1)
+        self.assertEqual(pontuacao.total_plantas, 1)
+        self.assertEqual(pontuacao.total_likes, 1)
+        self.assertEqual(pontuacao.total_seguidores, 1)
+        self.assertEqual(pontuacao.pontos, 10 + 5 + 15)
+        self.assertEqual(PontuacaoJardineiro.objects.get(usuario=self.user2).pontos, 3)
+
+        like.delete()
+        pontuacao.refresh_from_db()
+        self.assertEqual(pontuacao.total_likes, 0)
+        self.assertEqual(pontuacao.pontos, 10 + 15)
+
+    def test_reconstruir_ranking(self):
+        """Testa se o comando reconstrói as mesmas pontuações"""
+        LikePlanta.objects.create(planta=self.planta, usuario=self.user2)
+        esperado = dict(PontuacaoJardineiro.objects.values_list('usuario_id', 'pontos'))
+
+        PontuacaoJardineiro.objects.all().delete()
+        call_command('reconstruir_ranking', stdout=StringIO())
+        self.assertEqual(dict(PontuacaoJardineiro.objects.values_list('usuario_id', 'pontos')), esperado)
+
+    def test_ranking_view(self):
+        """Testa a página de ranking"""
+        self.client.login(username='ranking2', password='pass2')
+        response = self.client.get(reverse('ranking'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "ranking1")
+        self.assertEqual(response.context['minha_posicao']['posicao'], 2)
+
+    def test_minha_posicao_consultas_constantes(self):
+        """Testa a posição em JSON com número fixo de consultas"""
+        for i in range(5):
+            User.objects.create_user(username=f'extra{i}', password='x')
+        self.client.login(username='ranking1', password='pass1')
+        self.client.get(reverse('minha_posicao_ranking'))  # aquece a sessão
+        with self.assertNumQueries(4):  # sessão + usuário + pontos + contagem
+            response = self.client.get(reverse('minha_posicao_ranking'))
+        self.assertEqual(response.json()['posicao'], 1)
+        self.assertEqual(response.json()['total'], 7)
+
+    def test_ranking_por_periodo(self):
+        """Testa os baldes semanal/mensal e a virada de período"""
+        semana = inicio_periodo('semana')
+        self.assertEqual(PontuacaoSemanal.objects.get(usuario=self.user1, inicio=semana).pontos, 10)
+        self.assertEqual(PontuacaoMensal.objects.get(usuario=self.user1).total_plantas, 1)
+
+        PontuacaoSemanal.objects.create(usuario=self.user2, inicio=semana - timedelta(weeks=3), pontos=99)
+        call_command('virar_periodos_ranking', '--reconstruir', stdout=StringIO())
+        self.assertFalse(PontuacaoSemanal.objects.filter(usuario=self.user2).exists())
+        self.assertEqual(PontuacaoSemanal.objects.get(usuario=self.user1, inicio=semana).pontos, 10)
+
+        self.client.login(username='ranking1', password='pass1')
+        response = self.client.get(reverse('ranking'), {'periodo': 'semana'})
+        self.assertEqual(response.context['minha_posicao']['posicao'], 1)
+
+
+class ContadoresPlantaTestCase(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='contador1', password='pass1')
+        self.user2 = User.objects.create_user(username='contador2', password='pass2')
+        self.planta = Planta.objects.create(
+            nome="Teste", especie="Teste", dificuldade='F',
+            necessidade_agua="Teste", necessidade_luz="Teste",
+            descricao="Teste", autor=self.user1
+        )
+
+    def test_contadores_sincronizados(self):
+        """Testa se likes, favoritos e comentários atualizam os contadores"""
+        like = LikePlanta.objects.create(planta=self.planta, usuario=self.user2)
+        FavoritoPlanta.objects.create(planta=self.planta, usuario=self.user2)
+        Comentario.objects.create(planta=self.planta, autor=self.user2, conteudo="Oi")
+        self.planta.refresh_from_db()
+        self.assertEqual((self.planta.total_likes, self.planta.total_favoritos, self.planta.total_comentarios), (1, 1, 1))
+
+        like.delete()
+        self.planta.refresh_from_db()
+        self.assertEqual(self.planta.total_likes, 0)
+
+    def test_excluir_planta_nao_busca_a_planta_por_like(self):
+        """Testa se o cascade dos likes não consulta a planta uma vez por like"""
+        def consultas_a_planta(total_likes):
+            planta = Planta.objects.create(
+                nome="Efêmera", especie="X", dificuldade='F', necessidade_agua="X",
+                necessidade_luz="X", descricao="X", autor=self.user1
+            )
+            for i in range(total_likes):
+                fa = User.objects.create_user(username=f'efemero{total_likes}_{i}', password='pass')
+                LikePlanta.objects.create(planta=planta, usuario=fa)
+            with CaptureQueriesContext(connection) as consultas:
+                Planta.objects.get(pk=planta.pk).delete()
+            return sum(consulta['sql'].startswith('SELECT') and 'FROM "plantas_planta" ' in consulta['sql']
+                       for consulta in consultas)
+
+        self.assertEqual(consultas_a_planta(1), consultas_a_planta(3))
+
+    def test_editar_planta_preserva_contadores(self):
+        """Testa se salvar uma instância antiga não sobrescreve os contadores"""
+        antiga = Planta.objects.get(pk=self.planta.pk)
+        LikePlanta.objects.create(planta=self.planta, usuario=self.user2)
+        antiga.descricao = "Nova descrição"
+        antiga.save()
+        self.planta.refresh_from_db()
+        self.assertEqual(self.planta.total_likes, 1)
+
+    def test_reconciliar_contadores(self):
+        """Testa se o comando corrige contadores divergentes"""
+        LikePlanta.objects.create(planta=self.planta, usuario=self.user2)
+        Planta.objects.filter(pk=self.planta.pk).update(total_likes=42, total_comentarios=7)
+        call_command('reconciliar_contadores', '--lote', '1', stdout=StringIO())
+        self.planta.refresh_from_db()
+        self.assertEqual((self.planta.total_likes, self.planta.total_comentarios), (1, 0))
+
+
+class ContadoresPerfilTestCase(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='perfil1', password='pass1')
+        self.user2 = User.objects.create_user(username='perfil2', password='pass2')
+        self.planta = Planta.objects.create(
+            nome="Teste", especie="Teste", dificuldade='F',
+            necessidade_agua="Teste", necessidade_luz="Teste",
+            descricao="Teste", autor=self.user1
+        )
+
+    def test_estatisticas_do_perfil(self):
+        """Testa se os sinais mantêm as estatísticas do perfil"""
+        LikePlanta.objects.create(planta=self.planta, usuario=self.user2)
+        seguir = Seguir.objects.create(seguidor=self.user2, seguindo=self.user1)
+
+        perfil1 = UserProfile.objects.get(user=self.user1)
+        perfil2 = UserProfile.objects.get(user=self.user2)
+        self.assertEqual(perfil1.get_total_posts(), 1)
+        self.assertEqual(perfil1.get_total_likes_recebidos(), 1)
+        self.assertEqual(perfil1.total_seguidores, 1)
+        self.assertEqual((perfil2.total_likes_dados, perfil2.total_seguindo), (1, 1))
+
+        seguir.delete()
+        perfil1.refresh_from_db()
+        self.assertEqual(perfil1.total_seguidores, 0)
+
+    def test_salvar_usuario_preserva_contadores(self):
+        """Testa se salvar o usuário (ex.: login) não zera as estatísticas"""
+        usuario = User.objects.get(pk=self.user1.pk)
+        usuario.profile  # perfil carregado antes do novo like
+        LikePlanta.objects.create(planta=self.planta, usuario=self.user2)
+        usuario.save()
+        self.assertEqual(User.objects.get(pk=self.user1.pk).profile.total_likes_recebidos, 1)
+
+
+@config_views
+class InteracoesTestCase(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='interacao1', password='pass1')
+        self.user2 = User.objects.create_user(username='interacao2', password='pass2')
+        self.plantas = [
+            Planta.objects.create(
+                nome=f"Planta {i}", especie="Teste", dificuldade='F',
+                necessidade_agua="Teste", necessidade_luz="Teste",
+                descricao="Teste", autor=self.user1
+            )
+            for i in range(3)
+        ]
+        LikePlanta.objects.create(planta=self.plantas[0], usuario=self.user2)
+        LikePlanta.objects.create(planta=self.plantas[0], usuario=self.user1)
+
+    def test_estado_por_planta(self):
+        """Testa se curtida/favoritada refletem apenas o usuário logado"""
+        plantas = list(Planta.objects.order_by('pk'))
+        with self.assertNumQueries(2):
+            plantas = anotar_interacoes(plantas, self.user2)
+        self.assertEqual([p.curtida for p in plantas], [True, False, False])
+        self.assertFalse(any(p.favoritada for p in plantas))
+
+    def test_lista_plantas_logado(self):
+        """Testa o catálogo com o estado do botão de like"""
+        self.client.login(username='interacao2', password='pass2')
+        response = self.client.get(reverse('listar_plantas'))
+        self.assertEqual(response.status_code, 200)
+        curtidas = {p.pk: p.curtida for p in response.context['plantas']}
+        self.assertTrue(curtidas[self.plantas[0].pk])
+        self.assertFalse(curtidas[self.plantas[1].pk])
+
+
+@config_views
+class PaginacaoTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='paginador', password='pass')
+        agora = timezone.now()
+        for i in range(5):
+            planta = Planta.objects.create(
+                nome=f"Planta {i}", especie="Teste", dificuldade='F',
+                necessidade_agua="Teste", necessidade_luz="Teste",
+                descricao="Teste", autor=self.user
+            )
+            # Duas plantas com o mesmo criado_em para exercitar o desempate por id
+            Planta.objects.filter(pk=planta.pk).update(criado_em=agora - timezone.timedelta(minutes=i // 2))
+
+    def test_cursor_percorre_todas_as_linhas(self):
+        """Testa se as páginas por cursor não repetem nem pulam plantas"""
+        paginador = PaginadorKeyset(Planta.objects.all(), por_pagina=2)
+        vistos, cursor = [], None
+        while True:
+            pagina = paginador.pagina(cursor)
+            vistos.extend(p.pk for p in pagina)
+            if not pagina.tem_proxima:
+                break
+            cursor = pagina.proximo_cursor
+        esperado = list(Planta.objects.order_by('-criado_em', '-id').values_list('pk', flat=True))
+        self.assertEqual(vistos, esperado)
+
+    def test_cursor_invalido_volta_ao_inicio(self):
+        """Testa se um cursor adulterado é ignorado"""
+        response = self.client.get(reverse('listar_plantas'), {'cursor': 'nao-e-um-cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['pagina'].primeira)
+        self.assertEqual(len(response.context['plantas']), 5)
+
+    def _segunda_pagina(self, url):
+        """Segue o link "Próxima" da navegação e retorna a resposta"""
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        proximo = response.context['pagina'].proximo_cursor
+        link = f'?cursor={proximo}'
+        self.assertContains(response, link)
+        return self.client.get(url + link)
+
+    def test_navegacao_nas_listas_do_usuario(self):
+        """Testa se diário, lembretes, mensagens e enquetes mostram o link da página 2"""
+        self.client.login(username='paginador', password='pass')
+        planta = Planta.objects.first()
+        remetente = User.objects.create_user(username='remetente', password='pass')
+        for i in range(21):
+            DiarioPlanta.objects.create(
+                planta=planta, usuario=self.user, data=timezone.localdate() - timedelta(days=i), titulo=f'Dia {i}'
+            )
+            Lembrete.objects.create(
+                planta=planta, usuario=self.user, tipo='REGAR', titulo=f'Regar {i}',
+                proxima_data=timezone.localdate() + timedelta(days=i),
+            )
+            Mensagem.objects.create(remetente=remetente, destinatario=self.user, assunto=f'Oi {i}', conteudo='-')
+            Enquete.objects.create(pergunta=f'Pergunta {i}?', autor=remetente)
+
+        for url, chave in [
+            (reverse('diario_planta', args=[planta.pk]), 'entradas'),
+            (reverse('listar_lembretes'), 'lembretes'),
+            (reverse('listar_mensagens'), 'mensagens'),
+            (reverse('listar_enquetes'), 'enquetes'),
+        ]:
+            with self.subTest(url=url):
+                response = self._segunda_pagina(url)
+                self.assertEqual(len(response.context[chave]), 1)
+                self.assertFalse(response.context['pagina'].tem_proxima)
+
+    def test_ranking_posicoes_na_segunda_pagina(self):
+        """Testa se a posição continua correta após o cursor"""
+        for i in range(3):
+            User.objects.create_user(username=f'rank{i}', password='pass')
+        ranking = ranking_queryset()
+        primeira = PaginadorKeyset(ranking, ordenacao=('-pontos', 'usuario_id'), por_pagina=2).pagina()
+        segunda = PaginadorKeyset(ranking, ordenacao=('-pontos', 'usuario_id'), por_pagina=2).pagina(primeira.proximo_cursor)
+        self.assertEqual(posicao_inicial(ranking, segunda.valores_cursor), 3)
+        self.assertEqual(segunda[0].usuario_id, list(ranking.values_list('usuario_id', flat=True))[2])
+
+
+@config_views
+class CacheCardsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cardista', password='pass')
+        self.planta = Planta.objects.create(
+            nome="Samambaia", especie="Nephrolepis", dificuldade='F',
+            necessidade_agua="Média", necessidade_luz="Sombra",
+            descricao="Teste", autor=self.user
+        )
+
+    def test_versao_estavel_ate_alteracao(self):
+        """Testa se a versão do card só muda quando a planta muda"""
+        with self.captureOnCommitCallbacks(execute=True):
+            pass
+        versao = anotar_versoes_cards([self.planta])[0].versao_card
+        self.assertEqual(anotar_versoes_cards([self.planta])[0].versao_card, versao)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            LikePlanta.objects.create(planta=self.planta, usuario=self.user)
+        self.assertNotEqual(anotar_versoes_cards([self.planta])[0].versao_card, versao)
+
+    @override_settings(CACHE_EM_MEMORIA=False)
+    def test_cache_no_banco_desliga_fragmentos(self):
+        """Testa se, com o cache no banco, os cards não buscam versões no cache"""
+        with mock.patch('plantas.caches.cache') as cache_falso:
+            self.assertIsNone(anotar_versoes_cards([self.planta])[0].versao_card)
+        cache_falso.get_many.assert_not_called()
+
+    def test_catalogo_renova_fragmento_apos_alteracao(self):
+        """Testa se o fragmento em cache só é renovado quando a planta muda"""
+        self.client.login(username='cardista', password='pass')
+        self.assertContains(self.client.get(reverse('listar_plantas')), 'Samambaia')
+
+        # Alteração sem sinal não invalida: prova que o fragmento veio do cache
+        Planta.objects.filter(pk=self.planta.pk).update(nome="Outro nome")
+        self.assertContains(self.client.get(reverse('listar_plantas')), 'Samambaia')
+
+        self.planta.nome = "Avenca"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.planta.save()
+        self.assertContains(self.client.get(reverse('listar_plantas')), 'Avenca')
+
+    def test_contador_fora_do_fragmento(self):
+        """Testa se o contador do botão de like acompanha os likes"""
+        self.client.login(username='cardista', password='pass')
+        self.assertContains(self.client.get(reverse('listar_plantas')), '❤️ 0')
+        with self.captureOnCommitCallbacks(execute=True):
+            LikePlanta.objects.create(planta=self.planta, usuario=self.user)
+        self.assertContains(self.client.get(reverse('listar_plantas')), '❤️ 1')
+
+
+@config_views
+class CachePaginaAnonimaTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='visitado', password='pass')
+        self.planta = Planta.objects.create(
+            nome="Cacto", especie="Cereus", dificuldade='F',
+            necessidade_agua="Pouca", necessidade_luz="Sol",
+            descricao="Teste", autor=self.user
+        )
+
+    def test_anonimo_recebe_pagina_do_cache(self):
+        """Testa se a segunda visita anônima não consulta o banco"""
+        url = reverse('detalhe_planta', args=[self.planta.pk])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'Cacto')
+        self.assertIn('Cookie', response['Vary'])
+
+    def test_comentario_invalida_pagina(self):
+        """Testa se um novo comentário aparece imediatamente para anônimos"""
+        url = reverse('detalhe_planta', args=[self.planta.pk])
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comentario.objects.create(planta=self.planta, autor=self.user, conteudo="Lindo!")
+        self.assertContains(self.client.get(url), 'Lindo!')
+
+    def test_parametros_desconhecidos_nao_entram_no_cache(self):
+        """Testa se só os parâmetros lidos pela view geram páginas em cache"""
+        url = reverse('listar_plantas')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url, {'cursor': 'invalido'})  # primeira página, mesma chave
+        for valor in ('1', '2'):
+            with CaptureQueriesContext(connection) as consultas:
+                self.client.get(url, {'x': valor})
+            self.assertTrue(consultas.captured_queries)
+
+    def test_usuario_logado_nao_usa_cache(self):
+        """Testa se quem tem sessão sempre recebe a página renderizada"""
+        self.client.get(reverse('listar_plantas'))
+        self.client.login(username='visitado', password='pass')
+        response = self.client.get(reverse('listar_plantas'))
+        self.assertContains(response, reverse('toggle_like', args=[self.planta.pk]))
+
+
+@config_views
+class FeedTestCase(TestCase):
+    def setUp(self):
+        self.autor = User.objects.create_user(username='autorfeed', password='pass')
+        self.leitor = User.objects.create_user(username='leitorfeed', password='pass')
+        self.planta_antiga = self._planta("Antiga")
+        self.seguir = Seguir.objects.create(seguidor=self.leitor, seguindo=self.autor)
+
+    def _planta(self, nome):
+        return Planta.objects.create(
+            nome=nome, especie="Teste", dificuldade='F',
+            necessidade_agua="Teste", necessidade_luz="Teste",
+            descricao="Teste", autor=self.autor
+        )
+
+    def test_fan_out_e_preenchimento(self):
+        """Testa se seguir copia o histórico e novas plantas chegam ao seguidor"""
+        nova = self._planta("Nova")
+        Comentario.objects.create(planta=nova, autor=self.autor, conteudo="Brotou!")
+        self.assertEqual(
+            [item.planta_id for item in itens_do_feed(self.leitor)],
+            [nova.pk, self.planta_antiga.pk],
+        )
+        self.assertEqual(ItemFeed.objects.filter(usuario=self.leitor).count(), 2)  # comentários vão só para as atividades
+        self.assertEqual(itens_do_feed(self.autor).count(), 2)  # plantas próprias
+
+    def test_deixar_de_seguir_remove_itens(self):
+        """Testa se deixar de seguir limpa o feed"""
+        self.seguir.delete()
+        self.assertFalse(itens_do_feed(self.leitor).exists())
+
+    def test_feed_view(self):
+        """Testa a página do feed lendo a caixa de entrada"""
+        self.client.login(username='leitorfeed', password='pass')
+        response = self.client.get(reverse('feed'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p.pk for p in response.context['plantas_feed']], [self.planta_antiga.pk])
+
+    @override_settings(FEED_LIMITE_SEGUIDORES=1)
+    def test_autor_popular_lido_na_consulta(self):
+        """Testa se a planta de autor popular não é copiada mas aparece no feed"""
+        self.autor.profile.refresh_from_db()
+        nova = self._planta("Popular")
+        self.assertFalse(itens_do_feed(self.leitor).filter(planta=nova).exists())
+
+        pagina = feed_hibrido(self.leitor, por_pagina=1)
+        self.assertEqual([item.planta_id for item in pagina], [nova.pk])
+        # A planta antiga está na caixa e também é lida do autor: aparece uma vez só
+        seguinte = feed_hibrido(self.leitor, cursor=pagina.proximo_cursor, por_pagina=1)
+        self.assertEqual([item.planta_id for item in seguinte], [self.planta_antiga.pk])
+        self.assertFalse(seguinte.tem_proxima)
+
+
+@config_views
+class AtividadesTestCase(TestCase):
+    def setUp(self):
+        self.leitor = User.objects.create_user(username='leitoratv', password='pass')
+        self.ativo = User.objects.create_user(username='ativo', password='pass')
+        self.outro = User.objects.create_user(username='outroatv', password='pass')
+        Seguir.objects.create(seguidor=self.leitor, seguindo=self.ativo)
+        planta = Planta.objects.create(
+            nome="Hera", especie="Hedera", dificuldade='F',
+            necessidade_agua="Média", necessidade_luz="Sombra",
+            descricao="Teste", autor=self.ativo
+        )
+        Comentario.objects.create(planta=planta, autor=self.ativo, conteudo="Cresceu")
+        LikePlanta.objects.create(planta=planta, usuario=self.ativo)
+        Seguir.objects.create(seguidor=self.ativo, seguindo=self.outro)
+        Planta.objects.create(
+            nome="Alheia", especie="X", dificuldade='F', necessidade_agua="X",
+            necessidade_luz="X", descricao="X", autor=self.outro
+        )
+
+    def test_fluxo_intercalado_por_cursor(self):
+        """Testa se as páginas cobrem todas as fontes, em ordem, sem repetir"""
+        # Mesma data em todas as fontes: o desempate vem do cursor
+        momento = timezone.now()
+        for modelo in (Planta, Comentario, LikePlanta, Seguir):
+            modelo.objects.update(criado_em=momento)
+
+        tipos, cursor = [], None
+        while True:
+            pagina = stream_atividades(self.leitor, cursor=cursor, por_pagina=1)
+            tipos.extend(atividade['tipo'] for atividade in pagina)
+            if not pagina.tem_proxima:
+                break
+            cursor = pagina.proximo_cursor
+        self.assertEqual(tipos, ['SEGUIR', 'LIKE', 'COMENTARIO', 'PLANTA'])
+
+    def test_endpoint_json(self):
+        """Testa o endpoint JSON do fluxo de atividades"""
+        self.client.login(username='leitoratv', password='pass')
+        dados = self.client.get(reverse('atividades_feed')).json()
+        self.assertEqual([a['tipo'] for a in dados['atividades']], ['SEGUIR', 'LIKE', 'COMENTARIO', 'PLANTA'])
+        self.assertIsNone(dados['proximo_cursor'])
+        self.assertEqual(self.client.get(reverse('feed')).status_code, 200)
+
+    def test_novidades_desde_o_topo(self):
+        """Testa se o polling devolve só o que é mais novo que o topo do cliente"""
+        cache.clear()
+        topo = topo_do_fluxo(stream_atividades(self.leitor))
+        self.client.login(username='leitoratv', password='pass')
+
+        dados = self.client.get(reverse('novidades_feed'), {'desde': topo}).json()
+        self.assertEqual((dados['atividades'], dados['topo']), ([], topo))
+
+        Planta.objects.create(
+            nome="Recente", especie="X", dificuldade='F', necessidade_agua="X",
+            necessidade_luz="X", descricao="X", autor=self.ativo
+        )
+        Notificacao.objects.create(usuario=self.leitor, tipo='LIKE', mensagem='Oi')
+        cache.clear()  # descarta a resposta do intervalo anterior
+        dados = self.client.get(reverse('novidades_feed'), {'desde': topo}).json()
+        self.assertEqual([a['texto'] for a in dados['atividades']], ['publicou Recente'])
+        self.assertNotEqual(dados['topo'], topo)
+        self.assertEqual(dados['notificacoes_nao_lidas'], 1)
+
+
+class NotificacoesAgrupadasTestCase(TestCase):
+    def setUp(self):
+        self.autor = User.objects.create_user(username='viral', password='pass')
+        self.planta = Planta.objects.create(
+            nome="Orquídea", especie="Phalaenopsis", dificuldade='M',
+            necessidade_agua="Pouca", necessidade_luz="Indireta",
+            descricao="Teste", autor=self.autor
+        )
+        self.fas = [User.objects.create_user(username=f'fa{i}', password='pass') for i in range(4)]
+
+    def test_likes_na_mesma_planta_viram_uma_notificacao(self):
+        """Testa se likes repetidos atualizam a mesma notificação"""
+        for fa in self.fas[:3]:
+            LikePlanta.objects.create(planta=self.planta, usuario=fa)
+
+        notificacoes = self.autor.notificacoes.filter(tipo='LIKE')
+        self.assertEqual(notificacoes.count(), 1)
+        notificacao = notificacoes.get()
+        self.assertEqual(notificacao.total_atores, 3)
+        self.assertEqual(notificacao.ultimos_atores, ['fa2', 'fa1', 'fa0'])
+        self.assertEqual(notificacao.mensagem, "fa2 e mais 2 pessoas curtiram sua planta 'Orquídea'.")
+
+    def test_ator_repetido_nos_ultimos_nao_conta_de_novo(self):
+        """Testa se refazer o like sem sair dos últimos nomes não soma, e o JSON não cresce"""
+        for fa in self.fas:
+            LikePlanta.objects.create(planta=self.planta, usuario=fa)
+        LikePlanta.objects.filter(planta=self.planta, usuario=self.fas[2]).delete()
+        LikePlanta.objects.create(planta=self.planta, usuario=self.fas[2])
+
+        notificacao = self.autor.notificacoes.get(tipo='LIKE')
+        self.assertEqual(notificacao.total_atores, 4)
+        self.assertEqual(notificacao.ultimos_atores, ['fa2', 'fa3', 'fa1'])
+        self.assertEqual(notificacao.mensagem, "fa2 e mais 3 pessoas curtiram sua planta 'Orquídea'.")
+        self.assertNotIn('atores', notificacao.dados_json)
+
+    def test_notificacao_lida_fecha_o_grupo(self):
+        """Testa se um evento após a leitura abre uma nova notificação"""
+        LikePlanta.objects.create(planta=self.planta, usuario=self.fas[0])
+        self.autor.notificacoes.update(lida=True)
+        LikePlanta.objects.create(planta=self.planta, usuario=self.fas[1])
+        self.assertEqual(self.autor.notificacoes.filter(tipo='LIKE').count(), 2)
+
+    @override_settings(NOTIFICACOES_JANELA_AGRUPAMENTO=0)
+    def test_fora_da_janela_nao_agrupa(self):
+        """Testa se eventos fora da janela geram notificações separadas"""
+        Comentario.objects.create(planta=self.planta, autor=self.fas[0], conteudo="Linda")
+        Comentario.objects.create(planta=self.planta, autor=self.fas[1], conteudo="Demais")
+        self.assertEqual(self.autor.notificacoes.filter(tipo='COMENTARIO').count(), 2)
+
+    def test_contador_de_nao_lidas(self):
+        """Testa o contador mantido no perfil e o sino sem consulta"""
+        cache.clear()
+        LikePlanta.objects.create(planta=self.planta, usuario=self.fas[0])
+        LikePlanta.objects.create(planta=self.planta, usuario=self.fas[1])  # agrupada: não soma
+        Comentario.objects.create(planta=self.planta, autor=self.fas[0], conteudo="Bonita")
+        self.assertEqual(UserProfile.objects.get(user=self.autor).notificacoes_nao_lidas, 2)
+
+        self.assertEqual(contar_nao_lidas(self.autor), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(contar_nao_lidas(self.autor), 2)
+
+        marcar_como_lidas(self.autor.notificacoes.filter(tipo='LIKE'))
+        self.assertEqual(contar_nao_lidas(self.autor), 1)
+
+    @override_settings(CACHE_EM_MEMORIA=False)
+    def test_contador_sem_cache_em_memoria(self):
+        """Testa se, com o cache no banco, o sino lê o perfil numa consulta só"""
+        LikePlanta.objects.create(planta=self.planta, usuario=self.fas[0])
+        with self.assertNumQueries(1):
+            self.assertEqual(contar_nao_lidas(self.autor), 1)
+
+    def test_limpar_notificacoes_antigas(self):
+        """Testa se a limpeza remove só as notificações lidas fora da retenção"""
+        antiga = timezone.now() - timezone.timedelta(days=40)
+        lida_antiga = Notificacao.objects.create(usuario=self.autor, tipo='BADGE', mensagem='a', lida=True)
+        nao_lida_antiga = Notificacao.objects.create(usuario=self.autor, tipo='BADGE', mensagem='b')
+        lida_recente = Notificacao.objects.create(usuario=self.autor, tipo='BADGE', mensagem='c', lida=True)
+        Notificacao.objects.filter(pk__in=[lida_antiga.pk, nao_lida_antiga.pk]).update(criada_em=antiga)
+
+        call_command('limpar_notificacoes', '--dry-run', '--lote', '1', stdout=StringIO())
+        self.assertTrue(Notificacao.objects.filter(pk=lida_antiga.pk).exists())
+
+        saida = StringIO()
+        call_command('limpar_notificacoes', '--lote', '1', stdout=saida)
+        self.assertIn('1 notificações removidas', saida.getvalue())
+        self.assertEqual(
+            set(Notificacao.objects.values_list('pk', flat=True)),
+            {nao_lida_antiga.pk, lida_recente.pk},
+        )
+
+
+@config_views
+class CaixaNotificacoesTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user(username='caixa', password='pass')
+        self.notificacoes = [
+            Notificacao.objects.create(usuario=self.usuario, tipo=tipo, mensagem=f'n{i}')
+            for i, tipo in enumerate(['LIKE', 'SEGUIR', 'LIKE', 'COMENTARIO'])
+        ]
+        self.client.login(username='caixa', password='pass')
+
+    def test_abrir_a_caixa_nao_marca_como_lidas(self):
+        """Testa se o GET é somente leitura e filtra por tipo"""
+        resposta = self.client.get(reverse('listar_notificacoes'), {'tipo': 'LIKE'})
+        self.assertEqual([n.mensagem for n in resposta.context['pagina']], ['n2', 'n0'])
+        self.assertEqual(resposta.context['total_nao_lidas'], 4)
+        self.assertFalse(self.usuario.notificacoes.filter(lida=True).exists())
+
+    def test_marcar_pagina_como_lida(self):
+        """Testa se o POST marca só as notificações exibidas"""
+        n0, n1, n2, n3 = self.notificacoes
+        self.client.post(reverse('marcar_notificacoes_lidas'), {'ids': [n0.pk, n2.pk], 'tipo': 'LIKE'})
+        lidas = set(self.usuario.notificacoes.filter(lida=True).values_list('pk', flat=True))
+        self.assertEqual(lidas, {n0.pk, n2.pk})
+        self.assertEqual(contar_nao_lidas(self.usuario), 2)
+
+    def test_reagrupada_no_topo_nao_marca_o_resto(self):
+        """Testa se uma notificação antiga que voltou ao topo não faz marcar linhas nunca exibidas"""
+        for i in range(21):
+            Notificacao.objects.create(usuario=self.usuario, tipo='LIKE', mensagem=f'extra{i}')
+        # Reagrupada: sobe para o topo mantendo o id mais antigo
+        Notificacao.objects.filter(pk=self.notificacoes[0].pk).update(criada_em=timezone.now() + timezone.timedelta(minutes=1))
+
+        pagina = self.client.get(reverse('listar_notificacoes')).context['pagina']
+        ids = [notificacao.pk for notificacao in pagina]
+        self.assertEqual(ids[0], self.notificacoes[0].pk)
+        self.client.post(reverse('marcar_notificacoes_lidas'), {'ids': ids})
+        self.assertEqual(
+            set(self.usuario.notificacoes.filter(lida=True).values_list('pk', flat=True)), set(ids)
+        )
+        self.assertEqual(self.usuario.notificacoes.filter(lida=False).count(), 5)
+
+
+@config_views
+@override_settings(TEMPO_REAL_ATIVO=True)
+class TempoRealTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user(username='aovivo', password='pass')
+
+    @override_settings(TEMPO_REAL_ATIVO=False)
+    def test_desligado_nao_publica(self):
+        """Testa se, com o tempo real desligado, nada é publicado nem o total é lido"""
+        with mock.patch('plantas.pubsub.publicar') as publicar:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                Notificacao.objects.create(usuario=self.usuario, tipo='LIKE', mensagem='ana curtiu')
+        publicar.assert_not_called()
+        self.assertEqual(callbacks, [])
+
+    def test_stream_exige_asgi(self):
+        """Testa se o stream recusa o servidor WSGI em vez de prender o worker"""
+        self.client.login(username='aovivo', password='pass')
+        self.assertEqual(self.client.get(reverse('stream_notificacoes')).status_code, 503)
+
+    async def test_stream_envia_notificacoes(self):
+        """Testa se o stream SSE manda o total e depois cada notificação publicada"""
+
+        def notificar():
+            with self.captureOnCommitCallbacks(execute=True):
+                Notificacao.objects.create(usuario=self.usuario, tipo='LIKE', mensagem='ana curtiu')
+
+        await self.async_client.aforce_login(self.usuario)
+        resposta = await self.async_client.get(reverse('stream_notificacoes'))
+        self.assertEqual(resposta['Content-Type'], 'text/event-stream')
+        eventos = aiter(resposta.streaming_content)
+
+        primeiro = (await asyncio.wait_for(anext(eventos), 5)).decode()
+        self.assertIn('event: nao_lidas', primeiro)
+        self.assertIn('"nao_lidas": 0', primeiro)
+
+        await sync_to_async(notificar)()
+        segundo = (await asyncio.wait_for(anext(eventos), 5)).decode()
+        self.assertIn('event: notificacao', segundo)
+        self.assertIn('ana curtiu', segundo)
+        self.assertIn('"nao_lidas": 1', segundo)
+        await eventos.aclose()
+
+    def test_falha_do_broker_nao_derruba_a_interacao(self):
+        """Testa se um erro do broker depois do commit só vai para o log"""
+        planta = Planta.objects.create(
+            nome="Sem broker", especie="X", dificuldade='F', necessidade_agua="X",
+            necessidade_luz="X", descricao="X", autor=self.usuario
+        )
+        with mock.patch('plantas.websocket.publicar', side_effect=ConnectionError('broker fora do ar')):
+            with self.assertLogs('django', 'ERROR'):
+                with self.captureOnCommitCallbacks(execute=True):
+                    LikePlanta.objects.create(planta=planta, usuario=self.usuario)
+        self.assertEqual(Planta.objects.get(pk=planta.pk).total_likes, 1)
+
+    async def test_websocket_da_planta_recebe_deltas(self):
+        """Testa se o WebSocket da planta recebe o delta do like e o comentário novo"""
+
+        planta = await Planta.objects.acreate(
+            nome="Ao vivo", especie="X", dificuldade='F', necessidade_agua="X",
+            necessidade_luz="X", descricao="X", autor=self.usuario
+        )
+
+        def interagir():
+            with self.captureOnCommitCallbacks(execute=True):
+                LikePlanta.objects.create(planta=planta, usuario=self.usuario)
+                Comentario.objects.create(planta=planta, autor=self.usuario, conteudo="Que linda")
+
+        inexistente = ApplicationCommunicator(application, {'type': 'websocket', 'path': '/ws/plantas/0/'})
+        await inexistente.send_input({'type': 'websocket.connect'})
+        self.assertEqual((await inexistente.receive_output(5))['type'], 'websocket.close')
+
+        conexao = ApplicationCommunicator(application, {'type': 'websocket', 'path': f'/ws/plantas/{planta.pk}/'})
+        await conexao.send_input({'type': 'websocket.connect'})
+        self.assertEqual((await conexao.receive_output(5))['type'], 'websocket.accept')
+
+        await sync_to_async(interagir)()
+        like = json.loads((await conexao.receive_output(5))['text'])
+        comentario = json.loads((await conexao.receive_output(5))['text'])
+        self.assertEqual(like, {'evento': 'contadores', 'likes': 1})
+        self.assertEqual((comentario['evento'], comentario['conteudo']), ('comentario', 'Que linda'))
+
+        await conexao.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await conexao.wait(5)
+
+
+class BadgesTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user(username='colecionador', password='pass')
+        self.primeira = Badge.objects.create(nome='Primeira', descricao='-', regra='primeira_planta', pontos=10)
+        self.duas = Badge.objects.create(nome='Duas', descricao='-', regra='2_postagens', pontos=20)
+        Badge.objects.create(nome='Sem regra', descricao='-', regra='algo_desconhecido')
+
+    def _planta(self, nome):
+        return Planta.objects.create(
+            nome=nome, especie="X", dificuldade='F', necessidade_agua="X",
+            necessidade_luz="X", descricao="X", autor=self.usuario
+        )
+
+    def test_interpretar_regra(self):
+        """Testa a leitura de Badge.regra"""
+        self.assertEqual(interpretar_regra('5_postagens'), ('total_posts', 5))
+        self.assertEqual(interpretar_regra('primeiro_comentario'), ('total_comentarios', 1))
+        self.assertEqual(interpretar_regra('10_likes'), ('total_likes_recebidos', 10))
+        self.assertIsNone(interpretar_regra('algo_desconhecido'))
+
+    def test_concede_badges_com_efeitos(self):
+        """Testa a concessão pelo despacho único, com notificação e pontos"""
+        self._planta('Uma')
+        self._planta('Duas')
+        self._planta('Três')  # não concede de novo
+
+        self.assertEqual(
+            set(UserBadge.objects.filter(usuario=self.usuario).values_list('badge_id', flat=True)),
+            {self.primeira.pk, self.duas.pk},
+        )
+        self.assertEqual(self.usuario.notificacoes.filter(tipo='BADGE').count(), 2)
+        self.assertEqual(UserProfile.objects.get(user=self.usuario).notificacoes_nao_lidas, 2)
+        self.assertEqual(PontuacaoJardineiro.objects.get(usuario=self.usuario).pontos_badges, 30)
+
+    def test_concessao_avulsa_passa_pelo_registro(self):
+        """Testa se uma badge concedida com save() (ex.: pelo admin) notifica e pontua uma vez"""
+        with self.captureOnCommitCallbacks(execute=True):
+            with coletando():
+                UserBadge.objects.create(usuario=self.usuario, badge=self.duas)
+        notificacoes = self.usuario.notificacoes.filter(tipo='BADGE')
+        self.assertEqual(list(notificacoes.values_list('mensagem', flat=True)),
+                         [f"Você ganhou a conquista: {self.duas.nome}!"])
+        self.assertEqual(UserProfile.objects.get(user=self.usuario).notificacoes_nao_lidas, 1)
+        self.assertEqual(PontuacaoJardineiro.objects.get(usuario=self.usuario).pontos_badges, self.duas.pontos)
+
+    def test_regras_ficam_em_cache(self):
+        """Testa se avaliar um evento não consulta a tabela de badges"""
+        self._planta('Aquece o índice')
+        with CaptureQueriesContext(connection) as consultas:
+            self._planta('Outra')
+        self.assertFalse(any('FROM "plantas_badge"' in consulta['sql'] for consulta in consultas))
+
+    def test_concessao_concorrente_nao_duplica_efeitos(self):
+        """Testa se uma concessão que outra avaliação já gravou não notifica nem pontua de novo"""
+        self._planta('Uma')  # concede 'Primeira' pelos sinais
+        pontos = PontuacaoJardineiro.objects.get(usuario=self.usuario).pontos_badges
+
+        # Avaliação que leu os dados antes da concessão acima
+        atrasada = [(self.usuario.pk, self.primeira.pk, self.primeira.nome, self.primeira.pontos),
+                    (self.usuario.pk, self.duas.pk, self.duas.nome, self.duas.pontos)]
+        self.assertEqual(conceder_em_lote(atrasada), 1)
+        self.assertEqual(self.usuario.notificacoes.filter(tipo='BADGE').count(), 2)
+        self.assertEqual(
+            PontuacaoJardineiro.objects.get(usuario=self.usuario).pontos_badges, pontos + self.duas.pontos
+        )
+
+    def test_reavaliar_badges_em_lote(self):
+        """Testa se o comando concede o que a importação em massa deixou de fora"""
+        outro = User.objects.create_user(username='sem_plantas', password='pass')
+        Planta.objects.bulk_create([  # sem sinais, como numa importação
+            Planta(nome=f'Importada {i}', especie="X", dificuldade='F', necessidade_agua="X",
+                   necessidade_luz="X", descricao="X", autor=self.usuario)
+            for i in range(3)
+        ])
+
+        call_command('reavaliar_badges', '--dry-run', stdout=StringIO())
+        self.assertFalse(UserBadge.objects.exists())
+
+        saida = StringIO()
+        call_command('reavaliar_badges', '--lote', '1', stdout=saida)
+        self.assertIn('2 badges concedidas', saida.getvalue())
+        self.assertEqual(UserBadge.objects.filter(usuario=self.usuario).count(), 2)
+        self.assertFalse(UserBadge.objects.filter(usuario=outro).exists())
+        self.assertEqual(UserProfile.objects.get(user=self.usuario).notificacoes_nao_lidas, 2)
+        self.assertEqual(PontuacaoJardineiro.objects.get(usuario=self.usuario).pontos_badges, 30)
+
+        call_command('reavaliar_badges', stdout=saida)  # idempotente
+        self.assertEqual(UserBadge.objects.filter(usuario=self.usuario).count(), 2)
+
+
+class ConquistasTestCase(TestCase):
+    def setUp(self):
+        self.ativo = User.objects.create_user(username='ativo', password='pass')
+        self.novato = User.objects.create_user(username='novato', password='pass')
+        for i in range(3):
+            Planta.objects.create(
+                nome=f"Planta {i}", especie="X", dificuldade='F', necessidade_agua="X",
+                necessidade_luz="X", descricao="X", autor=self.ativo
+            )
+        self.postador = Conquista.objects.create(
+            nome='Postador', descricao='-', tipo='POSTAGENS', criterio='3_postagens e seguidores < 5'
+        )
+        self.popular = Conquista.objects.create(
+            nome='Popular', descricao='-', tipo='SEGUIDORES', criterio='seguidores >= 100 ou 50_likes'
+        )
+        self.quebrada = Conquista.objects.create(
+            nome='Quebrada', descricao='-', tipo='ESPECIAL', criterio='3_abacaxis'
+        )
+
+    def test_compilar_criterio(self):
+        """Testa a compilação dos critérios em predicados sobre o vetor de métricas"""
+        vetor = [0] * len(POSICAO)
+        vetor[POSICAO['postagens']] = 10
+        self.assertTrue(compilar_criterio('10_postagens')(vetor))
+        self.assertFalse(compilar_criterio('postagens > 10')(vetor))
+        self.assertTrue(compilar_criterio('5_likes ou plantas = 10')(vetor))
+        self.assertTrue(compilar_criterio('atividade >= 0 e 1_posts')(vetor))
+        with self.assertRaises(CriterioInvalido):
+            compilar_criterio('3_abacaxis')
+
+    def test_avaliar_conquistas_em_lote(self):
+        """Testa o comando: desbloqueia em lote e mantém o contador da conquista"""
+        saida = StringIO()
+        call_command('avaliar_conquistas', '--lote', '1', stdout=saida)
+        self.assertIn('Quebrada', saida.getvalue())
+        self.assertEqual(
+            list(UsuarioConquista.objects.values_list('usuario__username', 'conquista__nome')),
+            [('ativo', 'Postador')],
+        )
+        self.postador.refresh_from_db()
+        self.assertEqual(self.postador.total_desbloqueadas(), 1)
+
+        call_command('avaliar_conquistas', stdout=saida)  # idempotente
+        self.postador.refresh_from_db()
+        self.assertEqual(self.postador.total_desbloqueios, 1)
+        UsuarioConquista.objects.get().delete()
+        self.postador.refresh_from_db()
+        self.assertEqual(self.postador.total_desbloqueios, 0)
+
+    def test_salvar_conquista_antiga_preserva_contador(self):
+        """Testa se editar uma conquista carregada antes de um desbloqueio não zera o contador"""
+        antiga = Conquista.objects.get(pk=self.postador.pk)
+        compiladas, _ = compilar_conquistas()
+        desbloquear_em_lote(avaliar_lote([self.ativo.pk], compiladas))
+        antiga.descricao = 'Editada no admin'
+        antiga.save()
+        self.postador.refresh_from_db()
+        self.assertEqual((self.postador.descricao, self.postador.total_desbloqueios), ('Editada no admin', 1))
+
+    def test_desbloqueio_sobreposto_nao_conta_de_novo(self):
+        """Testa se uma execução sobreposta só conta as linhas que gravou"""
+        compiladas, _ = compilar_conquistas()
+        desbloqueios = avaliar_lote([self.ativo.pk], compiladas)
+        self.assertEqual(desbloquear_em_lote(desbloqueios), 1)
+        self.assertEqual(desbloquear_em_lote(desbloqueios), 0)  # avaliado antes da primeira gravar
+        self.postador.refresh_from_db()
+        self.assertEqual(UsuarioConquista.objects.count(), 1)
+        self.assertEqual(self.postador.total_desbloqueios, 1)
+
+
+class ColetorEfeitosTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.autor = User.objects.create_user(username='importador', password='pass')
+        self.fa = User.objects.create_user(username='fa', password='pass')
+        Seguir.objects.create(seguidor=self.fa, seguindo=self.autor)
+        self.badge = Badge.objects.create(nome='Cinco', descricao='-', regra='5_postagens', pontos=5)
+
+    def _importar(self, quantidade):
+        plantas = [
+            Planta.objects.create(
+                nome=f'Planta {i}', especie="X", dificuldade='F', necessidade_agua="X",
+                necessidade_luz="X", descricao="X", autor=self.autor
+            )
+            for i in range(quantidade)
+        ]
+        for planta in plantas:
+            LikePlanta.objects.create(usuario=self.fa, planta=planta)
+        return plantas
+
+    def test_importacao_em_lote(self):
+        """Testa se os efeitos de uma importação saem certos e em poucas escritas"""
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as consultas, coletando():
+                plantas = self._importar(30)
+
+        perfil = UserProfile.objects.get(user=self.autor)
+        self.assertEqual((perfil.total_posts, perfil.total_likes_recebidos), (30, 30))
+        self.assertEqual(UserProfile.objects.get(user=self.fa).total_likes_dados, 30)
+        self.assertEqual(
+            set(Planta.objects.filter(pk__in=[p.pk for p in plantas]).values_list('total_likes', flat=True)), {1}
+        )
+        pontuacao = PontuacaoJardineiro.objects.get(usuario=self.autor)
+        self.assertEqual((pontuacao.total_plantas, pontuacao.total_likes, pontuacao.pontos_badges), (30, 30, 5))
+        self.assertTrue(UserBadge.objects.filter(usuario=self.autor, badge=self.badge).exists())
+        self.assertEqual(ItemFeed.objects.filter(usuario=self.fa).count(), 30)
+        self.assertEqual(self.autor.notificacoes.filter(tipo='LIKE').count(), 30)
+
+        atualizacoes = [
+            q['sql'] for q in consultas.captured_queries
+            if q['sql'].startswith('UPDATE "plantas_userprofile"')
+        ]
+        self.assertLessEqual(len(atualizacoes), 3)
+
+    def test_sem_coletor_efeito_imediato(self):
+        """Testa se, fora de um coletor, os sinais continuam gravando na hora"""
+        self._importar(2)
+        self.assertEqual(UserProfile.objects.get(user=self.autor).total_posts, 2)
+
+
+@override_settings(TAREFAS_EM_SEGUNDO_PLANO=True)
+class TarefasTestCase(TestCase):
+    def setUp(self):
+        self.autor = User.objects.create_user(username='autor_fila', password='pass')
+        self.leitor = User.objects.create_user(username='leitor_fila', password='pass')
+        Planta.objects.create(
+            nome='Jiboia', especie="X", dificuldade='F', necessidade_agua="X",
+            necessidade_luz="X", descricao="X", autor=self.autor
+        )
+
+    def test_worker_executa_tarefa_enfileirada(self):
+        """Testa se seguir enfileira o preenchimento do feed e o worker o executa"""
+        Seguir.objects.create(seguidor=self.leitor, seguindo=self.autor)
+        tarefa = Tarefa.objects.get(nome='feed.preencher')
+        self.assertEqual(tarefa.status, 'PENDENTE')
+        self.assertFalse(ItemFeed.objects.filter(usuario=self.leitor).exists())
+
+        saida = StringIO()
+        call_command('processar_tarefas', '--uma-vez', '--threads', '1', stdout=saida)
+        self.assertIn('1 tarefas concluídas', saida.getvalue())
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.status, tarefa.tentativas), ('CONCLUIDA', 1))
+        self.assertEqual(ItemFeed.objects.filter(usuario=self.leitor).count(), 1)
+
+    def test_reserva_nao_repete_tarefa(self):
+        """Testa se uma tarefa reservada não é entregue a outro worker"""
+        enfileirar('feed.preencher', seguidor_id=self.leitor.pk, seguindo_id=self.autor.pk)
+        self.assertEqual(len(reservar('worker-a', 10)), 1)
+        self.assertEqual(reservar('worker-b', 10), [])
+
+    def test_falha_com_backoff(self):
+        """Testa as novas tentativas com espera exponencial e a desistência"""
+
+        def quebra(**kwargs):
+            raise RuntimeError('Cloudinary fora do ar')
+
+        with mock.patch.dict(REGISTRO, {'teste.quebra': quebra}):
+            tarefa = enfileirar('teste.quebra')
+            Tarefa.objects.filter(pk=tarefa.pk).update(max_tentativas=2)
+
+            self.assertFalse(executar(reservar('w', 1)[0]))
+            tarefa.refresh_from_db()
+            self.assertEqual(tarefa.status, 'PENDENTE')
+            self.assertGreater(tarefa.executar_em, timezone.now())
+            self.assertIn('Cloudinary fora do ar', tarefa.erro)
+            self.assertEqual(reservar('w', 1), [])  # ainda esperando o backoff
+
+            Tarefa.objects.filter(pk=tarefa.pk).update(executar_em=timezone.now())
+            self.assertFalse(executar(reservar('w', 1)[0]))
+            tarefa.refresh_from_db()
+            self.assertEqual((tarefa.status, tarefa.tentativas), ('FALHOU', 2))
+
+
+@config_views
+class BuscaTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.autor = User.objects.create_user(username='botanica', password='pass')
+
+    def _planta(self, nome, especie='X', descricao='X'):
+        return Planta.objects.create(
+            nome=nome, especie=especie, dificuldade='F', necessidade_agua="X",
+            necessidade_luz="X", descricao=descricao, autor=self.autor
+        )
+
+    def test_radical_e_acentos(self):
+        """Testa a normalização: sem acentos, plural e gênero"""
+        self.assertEqual(termos('Samambáia-Americana'), ['samambaia', 'americana'])
+        self.assertEqual(radical('samambaias'), radical('samambaia'))
+        self.assertEqual(radical('regar'), radical('regas'))
+        self.assertEqual(radical('sol'), 'sol')
+
+    def test_busca_por_relevancia(self):
+        """Testa se o nome pesa mais que a descrição e se o índice acompanha a planta"""
+        na_descricao = self._planta('Jiboia', descricao='Fica ótima ao lado de samambaias.')
+        no_nome = self._planta('Samambaia', especie='Nephrolepis exaltata')
+        self._planta('Cacto', descricao='Pouca rega')
+
+        self.assertEqual(buscar_ids('SAMAMBÁIA'), [no_nome.pk, na_descricao.pk])
+        self.assertEqual(buscar_ids('samambaia nephrolepis'), [no_nome.pk])
+        self.assertEqual(buscar_ids('botanica cacto'), [Planta.objects.get(nome='Cacto').pk])  # autor
+        self.assertEqual(buscar_ids('***'), [])
+
+        no_nome.nome = 'Avenca'
+        no_nome.save()
+        self.assertEqual(buscar_ids('samambaia'), [na_descricao.pk])
+        self.assertEqual(buscar_ids('avenca'), [no_nome.pk])
+        na_descricao.delete()
+        self.assertEqual(buscar_ids('jiboia'), [])
+
+    def test_coletor_reindexa_depois_do_commit(self):
+        """Testa se o coletor reindexa as plantas do bloco juntas, só no commit"""
+        antiga = self._planta('Bromélia antiga')
+        antiga_pk = antiga.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            with coletando():
+                plantas = [self._planta(f'Bromélia {i}') for i in range(2)]
+                antiga.delete()
+                self.assertEqual(buscar_ids('bromelia'), [antiga_pk])  # índice ainda não mudou
+        self.assertEqual(buscar_ids('bromelia'), [plantas[1].pk, plantas[0].pk])
+
+    def test_view_paginada(self):
+        """Testa a paginação da busca pelo cursor de deslocamento"""
+        for i in range(25):
+            self._planta(f'Suculenta {i}')
+        response = self.client.get(reverse('buscar'), {'q': 'suculentas'})
+        self.assertEqual(len(response.context['plantas']), 20)
+        proximo = response.context['pagina'].proximo_cursor
+        self.assertIsNotNone(proximo)
+
+        response = self.client.get(reverse('buscar'), {'q': 'suculentas', 'cursor': proximo})
+        self.assertEqual(len(response.context['plantas']), 5)
+        self.assertFalse(response.context['pagina'].tem_proxima)
+
+    def test_reindexar_busca(self):
+        """Testa a reconstrução do índice pelo comando"""
+        planta = self._planta('Orquídea')
+        limpar_indice()
+        self.assertEqual(buscar_ids('orquidea'), [])
+        saida = StringIO()
+        call_command('reindexar_busca', stdout=saida)
+        self.assertIn('1 plantas indexadas', saida.getvalue())
+        self.assertEqual(buscar_ids('orquidea'), [planta.pk])
+
+
+@config_views
+class LikeAjaxTestCase(TransactionTestCase):
+    """Sem o atomic do TestCase: o coletor do middleware grava de verdade no fim da requisição"""
+
+    def setUp(self):
+        cache.clear()
+        self.autor = User.objects.create_user(username='autor_ajax', password='pass')
+        self.fa = User.objects.create_user(username='fa_ajax', password='pass')
+        self.planta = Planta.objects.create(
+            nome="Teste", especie="Teste", dificuldade='F', necessidade_agua="Teste",
+            necessidade_luz="Teste", descricao="Teste", autor=self.autor
+        )
+        self.client.force_login(self.fa)
+
+    def _clicar(self, nome):
+        return self.client.post(
+            reverse(nome, args=[self.planta.pk]), HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        ).json()
+
+    def test_like_ajax_devolve_total_novo(self):
+        """Testa o total devolvido pelo like AJAX e o gravado pelo coletor"""
+        versao = anotar_versoes_cards([self.planta])[0].versao_card
+
+        self.assertEqual(self._clicar('toggle_like'), {'liked': True, 'total_likes': 1})
+        self.planta.refresh_from_db()
+        self.assertEqual(self.planta.total_likes, 1)
+        self.assertNotEqual(anotar_versoes_cards([self.planta])[0].versao_card, versao)
+
+        self.assertEqual(self._clicar('toggle_like'), {'liked': False, 'total_likes': 0})
+        self.assertEqual(self._clicar('toggle_favorito'), {'favoritado': True, 'total_favoritos': 1})
+        self.planta.refresh_from_db()
+        self.assertEqual((self.planta.total_likes, self.planta.total_favoritos), (0, 1))
@@ -78,16 +78,21 @@ urlpatterns = [
     # NOTIFICAÇÕES
     # =============================
     path('notificacoes/', views.listar_notificacoes, name='listar_notificacoes'),
+    path('notificacoes/marcar-lidas/', views.marcar_notificacoes_lidas, name='marcar_notificacoes_lidas'),
+    path('notificacoes/stream/', views.stream_notificacoes, name='stream_notificacoes'),
 
     # =============================
     # FEED ✅ (corrigido)
     # =============================
     path('feed/', views.feed_atividades, name='feed'),
+    path('feed/atividades/', views.atividades_feed, name='atividades_feed'),
+    path('feed/novidades/', views.novidades_feed, name='novidades_feed'),
 
     # =============================
     # RANKING ✅ (corrigido)
     # =============================
     path('ranking/', views.ranking_jardineiros, name='ranking'),
+    path('ranking/minha-posicao/', views.minha_posicao_ranking, name='minha_posicao_ranking'),
 
     # =============================
     # LEMBRETES
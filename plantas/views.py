@@ -1,14 +1,20 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import login
 from django.contrib import messages
-from django.http import JsonResponse, Http404
+from django.http import JsonResponse, Http404, HttpResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
 from django.db.models import Count, Q
 from django.utils import timezone
 from datetime import timedelta
-from django.core.paginator import Paginator
 from django.urls import reverse
 from django.db.models.functions import TruncMonth
 from django.template.loader import render_to_string
@@ -18,8 +24,17 @@ from django.contrib.auth.models import User
 from .models import (
     Planta, Comentario, LikePlanta, FavoritoPlanta, Seguir, 
     UserProfile, Denuncia, Colecao, DiarioPlanta, Lembrete, 
-    Mensagem, Enquete, OpcaoEnquete, VotoEnquete
+    Mensagem, Enquete, OpcaoEnquete, VotoEnquete, Notificacao
 )
+from .atividades import atividade_json, novidades_json, stream_atividades, topo_do_fluxo
+from .busca import indice_disponivel, paginar_busca
+from .caches import anotar_versoes_cards, cache_pagina_anonima, versao_catalogo, versao_planta
+from .feed import feed_hibrido
+from .interacoes import anotar_interacoes
+from .notificacoes import contar_nao_lidas, marcar_como_lidas
+from .paginacao import paginar
+from .pubsub import assinar, canal_usuario
+from .ranking import PERIODO_CHOICES, PERIODO_GERAL, posicao_inicial, posicao_no_ranking, ranking_queryset
 
 # Forms
 from .forms import (
@@ -38,14 +53,19 @@ def index(request):
     """Página inicial"""
     return render(request, 'plantas/index.html', {'nome': 'Jardineiro'})
 
+@cache_pagina_anonima(versao_catalogo, parametros=('cursor',))
 def listar_plantas(request):
     """Listar todas as plantas"""
-    plantas = Planta.objects.all().order_by('-criado_em').prefetch_related('comentarios', 'likes', 'favoritado_por')
-    return render(request, 'plantas/lista_plantas.html', {'plantas': plantas})
+    plantas = paginar(request, Planta.objects.select_related('autor'))
+    anotar_interacoes(plantas, request.user)
+    anotar_versoes_cards(plantas)
+    return render(request, 'plantas/lista_plantas.html', {'plantas': plantas, 'pagina': plantas})
 
+@cache_pagina_anonima(versao_planta)
 def detalhe_planta(request, pk):
     """Detalhes de uma planta específica"""
-    planta = get_object_or_404(Planta.objects.prefetch_related('comentarios', 'likes', 'favoritado_por'), pk=pk)
+    planta = get_object_or_404(Planta.objects.select_related('autor').prefetch_related('comentarios__autor'), pk=pk)
+    anotar_interacoes([planta], request.user)
     return render(request, 'plantas/detalhe_planta.html', {'planta': planta})
 
 # ===== CRUD DE PLANTAS =====
@@ -131,9 +151,10 @@ def toggle_like(request, planta_pk):
         liked = True
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        # O contador só é gravado no fim da requisição (plantas.efeitos): parte do valor lido antes do clique
         return JsonResponse({
             'liked': liked,
-            'total_likes': planta.likes.count()
+            'total_likes': max(planta.total_likes + (1 if liked else -1), 0)
         })
     
     return redirect(request.META.get('HTTP_REFERER', 'listar_plantas'))
@@ -154,7 +175,7 @@ def toggle_favorito(request, planta_pk):
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({
             'favoritado': favoritado,
-            'total_favoritos': planta.favoritado_por.count()
+            'total_favoritos': max(planta.total_favoritos + (1 if favoritado else -1), 0)
         })
     
     return redirect(request.META.get('HTTP_REFERER', 'listar_plantas'))
@@ -206,13 +227,16 @@ def criar_comentario(request, planta_pk):
 
 def ver_perfil(request, username):
     """Visualizar perfil de usuário"""
-    usuario = get_object_or_404(User, username=username)
-    plantas = usuario.planta_set.all().order_by('-criado_em')
-
-    # Estatísticas
-    total_postagens = usuario.planta_set.count()
-    total_seguidores = usuario.seguidores.count()
-    total_seguindo = usuario.seguindo.count()
+    usuario = get_object_or_404(User.objects.select_related('profile'), username=username)
+    plantas = paginar(request, usuario.planta_set.select_related('autor'))
+    anotar_interacoes(plantas, request.user)
+    anotar_versoes_cards(plantas)
+
+    # Estatísticas (contadores do perfil)
+    perfil = usuario.profile
+    total_postagens = perfil.total_posts
+    total_seguidores = perfil.total_seguidores
+    total_seguindo = perfil.total_seguindo
     esta_seguindo = False
     
     if request.user.is_authenticated:
@@ -221,6 +245,7 @@ def ver_perfil(request, username):
     context = {
         'usuario_perfil': usuario,
         'plantas': plantas,
+        'pagina': plantas,
         'esta_seguindo': esta_seguindo,
         'total_postagens': total_postagens,
         'total_seguidores': total_seguidores,
@@ -308,8 +333,12 @@ def ver_colecao(request, colecao_id):
         messages.error(request, 'Esta coleção é privada. 🔒')
         return redirect('colecoes_usuario')
     
+    plantas = anotar_interacoes(colecao.plantas.select_related('autor'), request.user)
+    anotar_versoes_cards(plantas)
+    
     context = {
         'colecao': colecao,
+        'plantas': plantas,
         'pode_editar': colecao.usuario == request.user
     }
     return render(request, 'plantas/ver_colecao.html', context)
@@ -324,15 +353,16 @@ def diario_planta(request, planta_pk):
         messages.error(request, 'Você não tem permissão para ver o diário desta planta. 🔒')
         return redirect('detalhe_planta', pk=planta.pk)
 
-    entradas = DiarioPlanta.objects.filter(planta=planta).order_by('-data')
-    lembretes = Lembrete.objects.filter(planta=planta, ativo=True).order_by('proxima_data')
+    entradas = paginar(request, DiarioPlanta.objects.filter(planta=planta), ordenacao=('-data', '-id'))
+    lembretes = Lembrete.objects.filter(planta=planta, ativo=True).order_by('proxima_data')[:20]
 
     context = {
         'planta': planta,
         'entradas': entradas,
+        'pagina': entradas,
         'lembretes': lembretes,
     }
-    return render(request, 'plantas/diario_planta.html', context)
+    return render(request, 'plantas/diario.html', context)
 
 @login_required
 def adicionar_entrada_diario(request, planta_pk):
@@ -365,11 +395,13 @@ def adicionar_entrada_diario(request, planta_pk):
 @login_required
 def listar_lembretes(request):
     """Listar lembretes do usuário"""
-    lembretes = Lembrete.objects.filter(usuario=request.user, ativo=True).order_by('proxima_data')
-    lembretes_vencidos = lembretes.filter(proxima_data__lt=timezone.now())
+    ativos = Lembrete.objects.filter(usuario=request.user, ativo=True).select_related('planta')
+    lembretes = paginar(request, ativos, ordenacao=('proxima_data', 'id'))
+    lembretes_vencidos = ativos.filter(proxima_data__lt=timezone.localdate()).order_by('proxima_data', 'id')[:20]
 
     context = {
         'lembretes': lembretes,
+        'pagina': lembretes,
         'lembretes_vencidos': lembretes_vencidos,
     }
     return render(request, 'plantas/lembretes.html', context)
@@ -419,12 +451,13 @@ def marcar_lembrete_feito(request, lembrete_pk):
 @login_required
 def listar_mensagens(request):
     """Listar mensagens recebidas"""
-    mensagens = Mensagem.objects.filter(destinatario=request.user).order_by('-criada_em')
-    nao_lidas = mensagens.filter(lida=False)
+    recebidas = Mensagem.objects.filter(destinatario=request.user).select_related('remetente')
+    mensagens = paginar(request, recebidas, ordenacao=('-criada_em', '-id'))
 
     context = {
         'mensagens': mensagens,
-        'total_nao_lidas': nao_lidas.count(),
+        'pagina': mensagens,
+        'total_nao_lidas': recebidas.filter(lida=False).count(),
     }
     return render(request, 'plantas/mensagens.html', context)
 
@@ -474,11 +507,16 @@ def ver_mensagem(request, mensagem_pk):
 @login_required
 def listar_enquetes(request):
     """Listar enquetes ativas"""
-    enquetes = Enquete.objects.filter(ativa=True).order_by('-criada_em')
-    enquetes_participadas = VotoEnquete.objects.filter(usuario=request.user).values_list('opcao__enquete', flat=True)
+    enquetes = paginar(
+        request, Enquete.objects.filter(ativa=True).prefetch_related('opcoes'), ordenacao=('-criada_em', '-id')
+    )
+    enquetes_participadas = VotoEnquete.objects.filter(
+        usuario=request.user, opcao__enquete__in=[enquete.pk for enquete in enquetes]
+    ).values_list('opcao__enquete', flat=True)
 
     context = {
         'enquetes': enquetes,
+        'pagina': enquetes,
         'enquetes_participadas': enquetes_participadas,
     }
     return render(request, 'plantas/enquetes.html', context)
@@ -539,96 +577,108 @@ def votar_enquete(request, enquete_pk):
 def feed_atividades(request):
     """Feed de atividades do usuário"""
     
-    # Usuários que o user segue
-    usuarios_seguindo = request.user.seguindo.values_list('seguindo', flat=True)
-    
-    # Plantas recentes de quem segue + próprias
-    plantas_feed = Planta.objects.filter(
-        Q(autor__in=usuarios_seguindo) | Q(autor=request.user)
-    ).select_related('autor', 'autor__profile').prefetch_related(
-        'likes', 'comentarios', 'favoritado_por'
-    ).order_by('-criado_em')[:20]
+    # Plantas recentes de quem segue + próprias: caixa de entrada materializada
+    # intercalada com os autores populares, lidos na hora
+    itens = feed_hibrido(request.user, cursor=request.GET.get('cursor'))
+    plantas_feed = anotar_interacoes([item.planta for item in itens], request.user)
+    anotar_versoes_cards(plantas_feed)
     
-    # Comentários recentes de quem segue
-    comentarios_recentes = Comentario.objects.filter(
-        autor__in=usuarios_seguindo
-    ).select_related('autor', 'planta', 'autor__profile').order_by('-criado_em')[:10]
+    # Atividades recentes de quem segue (plantas, comentários, likes, seguidores, conquistas)
+    atividades = stream_atividades(request.user, por_pagina=15)
     
-    # Estatísticas
+    # Estatísticas (contadores do perfil)
+    perfil = request.user.profile
     estatisticas = {
-        'total_seguindo': request.user.seguindo.count(),
-        'total_seguidores': request.user.seguidores.count(),
-        'total_plantas': request.user.planta_set.count(),
-        'total_likes_recebidos': LikePlanta.objects.filter(planta__autor=request.user).count(),
-        'nivel_experiencia': request.user.profile.get_nivel_experiencia_display(),
+        'total_seguindo': perfil.total_seguindo,
+        'total_seguidores': perfil.total_seguidores,
+        'total_plantas': perfil.total_posts,
+        'total_likes_recebidos': perfil.total_likes_recebidos,
+        'nivel_experiencia': perfil.get_nivel_experiencia_display(),
     }
     
     context = {
         'plantas_feed': plantas_feed,
-        'comentarios_recentes': comentarios_recentes,
+        'pagina': itens,
+        'atividades': atividades,
+        'topo_atividades': topo_do_fluxo(atividades),
         'estatisticas': estatisticas,
     }
     
     return render(request, 'plantas/feed.html', context)
 
+@login_required
+def atividades_feed(request):
+    """Fluxo de atividades de quem o usuário segue (JSON, paginado por cursor)"""
+    pagina = stream_atividades(request.user, cursor=request.GET.get('cursor'))
+    return JsonResponse({
+        'atividades': [atividade_json(atividade) for atividade in pagina],
+        'proximo_cursor': pagina.proximo_cursor,
+    })
+
+@login_required
+def novidades_feed(request):
+    """Polling do feed: atividades mais novas que o topo do cliente e total de não lidas (JSON)"""
+    dados = novidades_json(request.user, request.GET.get('desde', ''))
+    return JsonResponse({**dados, 'notificacoes_nao_lidas': contar_nao_lidas(request.user)})
+
 @login_required
 def ranking_jardineiros(request):
-    """Ranking de jardineiros por pontuação"""
+    """Ranking de jardineiros por pontuação (geral, semanal ou mensal)"""
     
-    usuarios_com_pontos = []
+    periodo = request.GET.get('periodo', PERIODO_GERAL)
+    if periodo not in dict(PERIODO_CHOICES):
+        periodo = PERIODO_GERAL
     
-    for usuario in User.objects.all():
-        pontos = 0
-        
-        # Pontuação
-        pontos += usuario.planta_set.count() * 10
-        pontos += LikePlanta.objects.filter(planta__autor=usuario).count() * 5
-        pontos += usuario.comentario_set.count() * 3
-        pontos += usuario.seguidores.count() * 15
-        pontos += sum([ub.badge.pontos for ub in usuario.badges.all()])
-        
-        usuarios_com_pontos.append({
-            'usuario': usuario,
-            'pontos': pontos,
-            'total_plantas': usuario.planta_set.count(),
-            'total_likes': LikePlanta.objects.filter(planta__autor=usuario).count(),
-            'total_seguidores': usuario.seguidores.count(),
-            'badges': usuario.badges.all()[:5]
-        })
+    # Pontuações materializadas (atualizadas pelos sinais)
+    ranking = ranking_queryset(periodo)
     
-    # Ordenar por pontos
-    usuarios_com_pontos.sort(key=lambda x: x['pontos'], reverse=True)
+    # Paginação por cursor sobre o índice (-pontos, usuario)
+    usuarios_paginados = paginar(
+        request,
+        ranking.select_related('usuario').prefetch_related('usuario__badges__badge'),
+        ordenacao=('-pontos', 'usuario_id'),
+    )
     
     # Adicionar posição
-    for idx, usuario_data in enumerate(usuarios_com_pontos, 1):
-        usuario_data['posicao'] = idx
+    inicio = posicao_inicial(ranking, usuarios_paginados.valores_cursor)
+    for idx, pontuacao in enumerate(usuarios_paginados, inicio):
+        pontuacao.posicao = idx
     
-    # Paginação
-    paginator = Paginator(usuarios_com_pontos, 20)
-    page = request.GET.get('page', 1)
-    usuarios_paginados = paginator.get_page(page)
+    # Posição do usuário logado (contagem pelo índice, sem carregar o ranking)
+    minha_posicao = posicao_no_ranking(request.user, periodo)
     
     context = {
         'usuarios_ranking': usuarios_paginados,
-        'minha_posicao': next(
-            (u['posicao'] for u in usuarios_com_pontos if u['usuario'] == request.user),
-            None
-        )
+        'pagina': usuarios_paginados,
+        'minha_posicao': minha_posicao,
+        'periodo': periodo,
+        'periodos': PERIODO_CHOICES,
     }
     
     return render(request, 'plantas/ranking.html', context)
 
+@login_required
+def minha_posicao_ranking(request):
+    """Posição do usuário logado no ranking (JSON)"""
+    periodo = request.GET.get('periodo', PERIODO_GERAL)
+    if periodo not in dict(PERIODO_CHOICES):
+        periodo = PERIODO_GERAL
+    
+    posicao = posicao_no_ranking(request.user, periodo) or {'posicao': None, 'total': None, 'pontos': 0}
+    return JsonResponse({'periodo': periodo, **posicao})
+
 # ===== DASHBOARD E ESTATÍSTICAS =====
 
 @login_required
 def dashboard_estatisticas(request):
     """Dashboard com estatísticas do usuário"""
     
-    # Estatísticas gerais
-    total_plantas = request.user.planta_set.count()
-    total_comentarios = request.user.comentario_set.count()
-    total_likes_recebidos = LikePlanta.objects.filter(planta__autor=request.user).count()
-    total_likes_dados = LikePlanta.objects.filter(usuario=request.user).count()
+    # Estatísticas gerais (contadores do perfil)
+    perfil = request.user.profile
+    total_plantas = perfil.total_posts
+    total_comentarios = perfil.total_comentarios
+    total_likes_recebidos = perfil.total_likes_recebidos
+    total_likes_dados = perfil.total_likes_dados
     
     # Plantas por dificuldade
     plantas_por_dificuldade = request.user.planta_set.values('dificuldade').annotate(
@@ -648,9 +698,7 @@ def dashboard_estatisticas(request):
     ).order_by('mes')
     
     # Top 5 plantas mais curtidas
-    plantas_mais_curtidas = request.user.planta_set.annotate(
-        total_likes=Count('likes')
-    ).order_by('-total_likes')[:5]
+    plantas_mais_curtidas = request.user.planta_set.order_by('-total_likes')[:5]
     
     # Badges conquistadas recentemente
     badges_recentes = request.user.badges.order_by('-concedida_em')[:8]
@@ -671,8 +719,8 @@ def dashboard_estatisticas(request):
         'plantas_mais_curtidas': plantas_mais_curtidas,
         'badges_recentes': badges_recentes,
         'taxa_engajamento': round(taxa_engajamento, 2),
-        'total_seguidores': request.user.seguidores.count(),
-        'total_seguindo': request.user.seguindo.count(),
+        'total_seguidores': perfil.total_seguidores,
+        'total_seguindo': perfil.total_seguindo,
     }
     
     return render(request, 'plantas/dashboard.html', context)
@@ -727,39 +775,119 @@ def buscar(request):
     resultado_usuarios = []
     
     if query:
-        resultado_plantas = Planta.objects.filter(
-            Q(nome__icontains=query) |
-            Q(especie__icontains=query) |
-            Q(descricao__icontains=query) |
-            Q(autor__username__icontains=query)
-        ).distinct().prefetch_related('likes')
+        if indice_disponivel():
+            # Índice de texto completo, ordenado por relevância
+            resultado_plantas = paginar_busca(request, Planta.objects.select_related('autor'), query)
+        else:
+            resultado_plantas = Planta.objects.filter(
+                Q(nome__icontains=query) |
+                Q(especie__icontains=query) |
+                Q(descricao__icontains=query) |
+                Q(autor__username__icontains=query)
+            ).distinct().select_related('autor')
+            resultado_plantas = paginar(request, resultado_plantas)
+        anotar_interacoes(resultado_plantas, request.user)
+        anotar_versoes_cards(resultado_plantas)
         
         resultado_usuarios = User.objects.filter(
             Q(username__icontains=query) |
             Q(profile__bio__icontains=query)
-        ).distinct()
+        ).distinct().select_related('profile').order_by('username')[:20]
     
     context = {
         'query': query,
         'plantas': resultado_plantas,
+        'pagina': resultado_plantas or None,
         'usuarios': resultado_usuarios,
     }
     return render(request, 'plantas/busca.html', context)
 
 # ===== NOTIFICAÇÕES =====
 
+MAX_IDS_MARCAR = 100  # mais que uma página; só limita POSTs forjados
+
+def _filtrar_notificacoes(usuario, tipo, somente_nao_lidas):
+    notificacoes = usuario.notificacoes.all()
+    if tipo:
+        notificacoes = notificacoes.filter(tipo=tipo)
+    if somente_nao_lidas:
+        notificacoes = notificacoes.filter(lida=False)
+    return notificacoes
+
 @login_required
 def listar_notificacoes(request):
-    """Listar notificações do usuário"""
-    notificacoes = request.user.notificacoes.all()
-    nao_lidas = notificacoes.filter(lida=False)
-
-    # Marcar como lida ao abrir
-    if nao_lidas.exists():
-        nao_lidas.update(lida=True)
+    """Listar notificações do usuário (somente leitura: marcar como lidas é um POST à parte)"""
+    tipos = dict(Notificacao.TIPO_CHOICES)
+    tipo = request.GET.get('tipo', '')
+    if tipo not in tipos:
+        tipo = ''
+    somente_nao_lidas = request.GET.get('nao_lidas') == '1'
+
+    notificacoes = paginar(
+        request, _filtrar_notificacoes(request.user, tipo, somente_nao_lidas),
+        ordenacao=('-criada_em', '-id'),
+    )
 
     return render(request, 'plantas/notificacoes.html', {
         'notificacoes': notificacoes,
-        'total_nao_lidas': nao_lidas.count()
+        'pagina': notificacoes,
+        'tipos': Notificacao.TIPO_CHOICES,
+        'tipo_atual': tipo,
+        'somente_nao_lidas': somente_nao_lidas,
+        'pagina_tem_nao_lidas': any(not notificacao.lida for notificacao in notificacoes),
+        'total_nao_lidas': contar_nao_lidas(request.user),
     })
 
+@login_required
+@require_POST
+def marcar_notificacoes_lidas(request):
+    """Marcar como lidas exatamente as notificações exibidas na página"""
+    # Os ids da página, e não uma faixa: notificações reagrupadas sobem para o
+    # topo com o id antigo, então uma faixa de ids pegaria linhas nunca exibidas
+    try:
+        ids = [int(pk) for pk in request.POST.getlist('ids')][:MAX_IDS_MARCAR]
+    except ValueError:
+        ids = []
+    if not ids:
+        messages.error(request, 'Nenhuma notificação selecionada. ❌')
+        return redirect('listar_notificacoes')
+
+    tipo = request.POST.get('tipo', '')
+    if tipo not in dict(Notificacao.TIPO_CHOICES):
+        tipo = ''
+    total = marcar_como_lidas(request.user.notificacoes.filter(pk__in=ids))
+    messages.success(request, f'{total} notificação(ões) marcada(s) como lida(s). ✅')
+
+    destino = reverse('listar_notificacoes')
+    if tipo:
+        destino += f'?tipo={tipo}'
+    return redirect(destino)
+
+def _evento_sse(evento, dados):
+    return f'event: {evento}\ndata: {json.dumps(dados, cls=DjangoJSONEncoder)}\n\n'
+
+@login_required
+async def stream_notificacoes(request):
+    """Server-Sent Events: notificações novas e total de não lidas do usuário"""
+    if not isinstance(request, ASGIRequest):
+        # Em WSGI a conexão prenderia um worker inteiro
+        return HttpResponse('Stream disponível apenas no servidor ASGI.', status=503)
+
+    usuario = await request.auser()
+
+    async def eventos():
+        async with assinar(canal_usuario(usuario.pk)) as fila:
+            nao_lidas = await sync_to_async(contar_nao_lidas)(usuario)
+            yield _evento_sse('nao_lidas', {'evento': 'nao_lidas', 'nao_lidas': nao_lidas})
+            while True:
+                try:
+                    dados = await asyncio.wait_for(fila.get(), settings.TEMPO_REAL_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ': ping\n\n'  # mantém proxies sem fechar a conexão parada
+                    continue
+                yield _evento_sse(dados['evento'], dados)
+
+    resposta = StreamingHttpResponse(eventos(), content_type='text/event-stream')
+    resposta['Cache-Control'] = 'no-cache'
+    resposta['X-Accel-Buffering'] = 'no'
+    return resposta
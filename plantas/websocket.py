@@ -0,0 +1,71 @@
+"""
+WebSocket ao vivo da página de detalhe: ``/ws/plantas/<pk>/``.
+
+Cada conexão assina o canal ``planta:<pk>`` do ``pubsub`` e recebe, em JSON,
+os deltas dos contadores (``{"evento": "contadores", "likes": 1}``) e os
+comentários novos, publicados pelos sinais depois do commit. A página aplica
+os deltas sobre o que já renderizou e nunca precisa buscar o detalhe de novo.
+
+É uma aplicação ASGI crua (sem Channels): ``trabalho_final.asgi`` encaminha
+para cá o tráfego ``websocket`` e o resto segue para o Django.
+"""
+import asyncio
+import json
+import re
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateformat import format as formatar_data
+
+from .models import Planta
+from .pubsub import assinar, canal_planta, publicar
+
+ROTA_PLANTA = re.compile(r'^/ws/plantas/(?P<pk>\d+)/$')
+CODIGO_NAO_ENCONTRADO = 4404
+
+
+def publicar_contadores(planta_id, **deltas):
+    """Ex.: ``publicar_contadores(12, likes=1)``"""
+    publicar(canal_planta(planta_id), {'evento': 'contadores', **deltas})
+
+
+def publicar_comentario(comentario):
+    publicar(canal_planta(comentario.planta_id), {
+        'evento': 'comentario',
+        'comentarios': 1,
+        'id': comentario.pk,
+        'autor': comentario.autor.username,
+        'conteudo': comentario.conteudo,
+        'criado_em': formatar_data(timezone.localtime(comentario.criado_em), 'd/m/Y H:i'),
+    })
+
+
+async def _aguardar_desconexao(receive):
+    # Mensagens do cliente são ignoradas: o canal é só de saída
+    while (await receive())['type'] != 'websocket.disconnect':
+        pass
+
+
+async def aplicacao_websocket(scope, receive, send):
+    rota = ROTA_PLANTA.match(scope['path'])
+    if (await receive())['type'] != 'websocket.connect':
+        return
+    existe = rota and await sync_to_async(Planta.objects.filter(pk=rota['pk']).exists)()
+    if not existe:
+        await send({'type': 'websocket.close', 'code': CODIGO_NAO_ENCONTRADO})
+        return
+
+    await send({'type': 'websocket.accept'})
+    async with assinar(canal_planta(int(rota['pk']))) as fila:
+        desconexao = asyncio.ensure_future(_aguardar_desconexao(receive))
+        try:
+            while True:
+                proximo = asyncio.ensure_future(fila.get())
+                await asyncio.wait({proximo, desconexao}, return_when=asyncio.FIRST_COMPLETED)
+                if desconexao.done():
+                    proximo.cancel()
+                    return
+                await send({'type': 'websocket.send', 'text': json.dumps(proximo.result(), cls=DjangoJSONEncoder)})
+        finally:
+            desconexao.cancel()
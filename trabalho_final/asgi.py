@@ -2,6 +2,7 @@
 ASGI config for pai_do_verde project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django; ``websocket`` connections go to ``plantas.websocket``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +14,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'trabalho_final.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Só depois do setup: o módulo importa os models
+from plantas.websocket import aplicacao_websocket  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await aplicacao_websocket(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
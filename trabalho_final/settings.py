@@ -62,6 +62,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'plantas.efeitos.ColetorEfeitosMiddleware',  # efeitos dos sinais gravados em lote no fim da requisição
 ]
 
 ROOT_URLCONF = 'trabalho_final.urls'
@@ -315,7 +316,33 @@ LOGGING = {
 # ============================================
 # CACHE - Para Performance em Produção
 # ============================================
-if not DEBUG:
+# As versões dos cards/páginas (plantas.caches) precisam ser vistas por todos os
+# workers: o LocMemCache é por processo, e com 2 workers do gunicorn a versão
+# apagada em um continuaria valendo no outro até expirar. Em produção use um
+# cache compartilhado em memória (Redis) com CACHE_URL=redis://...; sem ele, o
+# cache fica no próprio banco (tabela criada pelo `createcachetable` do build.sh).
+CACHE_URL = config('CACHE_URL', default=None)
+
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+elif DATABASE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cache_pai_do_verde',
+            'OPTIONS': {
+                'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=20000, cast=int),
+                'CULL_FREQUENCY': 4,
+            },
+        }
+    }
+else:
+    # Local: um processo só (runserver), então o cache em memória basta
     CACHES = {
         'default': {
             'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
@@ -323,6 +350,57 @@ if not DEBUG:
         }
     }
 
+# Os fragmentos dos cards ({% cache ... using="cards" %}) e o total do sino
+# fazem um GET no cache por card / por página. No DatabaseCache cada GET é uma
+# consulta SQL, mais cara que o que ela economiza: ali os fragmentos são
+# desligados (DummyCache) e o total é lido direto do perfil.
+CACHE_EM_MEMORIA = not CACHES['default']['BACKEND'].endswith('DatabaseCache')
+CACHES['cards'] = CACHES['default'] if CACHE_EM_MEMORIA else {
+    'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+}
+
+# ============================================
+# FEED - Estratégia híbrida (push/pull)
+# ============================================
+# Autores com pelo menos este número de seguidores não têm as publicações
+# copiadas para o feed de cada seguidor; elas são lidas na hora da consulta.
+# Veja `python manage.py benchmark_feed` para escolher o valor.
+FEED_LIMITE_SEGUIDORES = config('FEED_LIMITE_SEGUIDORES', default=1000, cast=int)
+
+# ============================================
+# NOTIFICAÇÕES - Agrupamento
+# ============================================
+# Likes/comentários/seguidores no mesmo alvo dentro desta janela (minutos)
+# atualizam a mesma notificação ("Ana e mais 12 pessoas curtiram...").
+NOTIFICACOES_JANELA_AGRUPAMENTO = config('NOTIFICACOES_JANELA_AGRUPAMENTO', default=60, cast=int)
+
+# ============================================
+# TEMPO REAL - SSE / WebSocket (requer servidor ASGI)
+# ============================================
+# Liga o stream do sino nas páginas. Só ative rodando trabalho_final.asgi
+# (ex.: gunicorn -k uvicorn.workers.UvicornWorker); em WSGI cada conexão
+# aberta prenderia um worker.
+TEMPO_REAL_ATIVO = config('TEMPO_REAL_ATIVO', default=False, cast=bool)
+# MemoriaBroker entrega só dentro do processo; com vários workers use
+# plantas.pubsub.RedisBroker + PUBSUB_REDIS_URL.
+PUBSUB_BACKEND = config('PUBSUB_BACKEND', default='plantas.pubsub.MemoriaBroker')
+PUBSUB_REDIS_URL = config('PUBSUB_REDIS_URL', default='redis://localhost:6379/0')
+# Intervalo (s) do comentário de keep-alive nas conexões paradas
+TEMPO_REAL_HEARTBEAT = config('TEMPO_REAL_HEARTBEAT', default=20, cast=int)
+
+# ============================================
+# TAREFAS EM SEGUNDO PLANO (fila no banco)
+# ============================================
+# Desligado, enfileirar() roda a tarefa na hora, dentro da requisição. Ligado,
+# a tarefa vira uma linha em plantas_tarefa e quem executa é o
+# `python manage.py processar_tarefas` (rodar como worker separado).
+TAREFAS_EM_SEGUNDO_PLANO = config('TAREFAS_EM_SEGUNDO_PLANO', default=False, cast=bool)
+TAREFAS_MAX_TENTATIVAS = config('TAREFAS_MAX_TENTATIVAS', default=5, cast=int)
+# Espera (s) antes da 1ª nova tentativa; dobra a cada falha
+TAREFAS_BACKOFF = config('TAREFAS_BACKOFF', default=10, cast=int)
+# Tarefa "executando" há mais que isso (s) é de um worker que morreu e volta para a fila
+TAREFAS_TIMEOUT = config('TAREFAS_TIMEOUT', default=600, cast=int)
+
 # ============================================
 # EMAIL - Configuração para Notificações (Opcional)
 # ============================================